@@ -11,7 +11,9 @@ interface Context {
   id: string;
   type: 'NOTE' | 'DOCUMENT' | 'RESOURCE';
   title: string;
-  content: string;
+  size?: number;
+  tokens?: number;
+  content?: string;
 }
 
 interface Message {
@@ -142,10 +144,11 @@ export default function ChatAssistant({ projectId }: ChatAssistantProps) {
     setError(null);
 
     try {
+      // Only ids are sent; the server loads the content of each context
       const data = await api.chat(inputMessage, selectedContexts.map(context => ({
+        id: context.id,
         type: context.type,
-        title: context.title,
-        content: context.content
+        title: context.title
       })));
       
       if (!data || !data.content) {
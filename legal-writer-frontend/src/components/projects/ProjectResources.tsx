@@ -12,6 +12,7 @@ interface Resource {
   id: number;
   title: string;
   file: string;
+  download_url: string;
   file_type: string;
   description: string;
   file_size: number;
@@ -92,6 +93,8 @@ export default function ProjectResources({ projectId }: ProjectResourcesProps) {
         return 'DOC';
       case 'txt':
         return 'TXT';
+      case 'rtf':
+        return 'RTF';
       default:
         return 'OTHER';
     }
@@ -109,6 +112,16 @@ export default function ProjectResources({ projectId }: ProjectResourcesProps) {
     setExpandedResourceId(expandedResourceId === resourceId ? null : resourceId);
   };
 
+  const handleDownload = async (resource: Resource) => {
+    try {
+      const filename = decodeURIComponent(resource.file.split('/').pop() || resource.title);
+      await api.downloadResource(resource.download_url, filename);
+    } catch (err) {
+      console.error('Download failed:', err);
+      setError('Failed to download file');
+    }
+  };
+
   const handleDelete = async (resourceId: number) => {
     try {
       await api.deleteResource(resourceId);
@@ -279,17 +292,15 @@ export default function ProjectResources({ projectId }: ProjectResourcesProps) {
                     <div className="p-8 max-h-[calc(100vh-8rem)] overflow-y-auto">
                       <div className="space-y-4">
                         <div className="flex justify-end">
-                          <a 
-                            href={resource.file}
-                            target="_blank"
-                            rel="noopener noreferrer"
+                          <button
+                            onClick={() => handleDownload(resource)}
                             className="text-sm text-blue-600 hover:text-blue-800"
                           >
                             Download File
-                          </a>
+                          </button>
                         </div>
                         
-                        {resource.file_type === 'PDF' && (
+                        {resource.file_type !== 'OTHER' && (
                           <>
                             <ExtractedContent
                               resourceId={resource.id}
@@ -20,7 +20,8 @@ export default function ResourceUpload({ onUpload, isUploading = false }: Resour
       'application/pdf': ['.pdf'],
       'application/msword': ['.doc'],
       'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx'],
-      'text/plain': ['.txt']
+      'text/plain': ['.txt'],
+      'application/rtf': ['.rtf']
     },
     disabled: isUploading
   });
@@ -44,7 +45,7 @@ export default function ResourceUpload({ onUpload, isUploading = false }: Resour
         }
         </p>
         <p className="mt-1 text-xs text-gray-500">
-          Supported formats: PDF, DOC, DOCX, TXT
+          Supported formats: PDF, DOC, DOCX, RTF, TXT
         </p>
         {isUploading && (
           <div className="mt-4">
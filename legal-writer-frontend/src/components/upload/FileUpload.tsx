@@ -32,7 +32,8 @@ export default function FileUpload({ onUpload, maxSize = 10485760, className = '
       'application/pdf': ['.pdf'],
       'application/msword': ['.doc'],
       'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx'],
-      'text/plain': ['.txt']
+      'text/plain': ['.txt'],
+      'application/rtf': ['.rtf']
     },
     maxSize,
   });
@@ -50,7 +51,7 @@ export default function FileUpload({ onUpload, maxSize = 10485760, className = '
         
         <div className="text-gray-600">
           <span className="font-medium text-blue-600">Click to upload</span> or drag and drop
-          <p className="text-sm mt-1">PDF, DOC, DOCX, TXT files only (max {Math.round(maxSize / 1024 / 1024)}MB)</p>
+          <p className="text-sm mt-1">PDF, DOC, DOCX, RTF, TXT files only (max {Math.round(maxSize / 1024 / 1024)}MB)</p>
         </div>
       </div>
 
@@ -12,6 +12,29 @@ interface APIError extends Error {
   data?: any;
 }
 
+async function getValidAccessToken() {
+  let accessToken = getAccessToken();
+  
+  if (!accessToken) {
+    console.error('No access token found');
+    throw new Error('Authentication required');
+  }
+
+  if (isTokenExpired(accessToken)) {
+    console.log('Access token expired, attempting refresh...');
+    try {
+      accessToken = await refreshAccessToken();
+      console.log('Token refresh successful');
+    } catch (refreshError) {
+      console.error('Token refresh failed:', refreshError);
+      clearTokens();
+      throw new Error('Session expired. Please log in again.');
+    }
+  }
+
+  return accessToken;
+}
+
 async function fetchWithAuth(endpoint: string, config: RequestConfig = {}) {
   const { requiresAuth = true, skipContentType = false, ...fetchConfig } = config;
   const url = `${API_BASE_URL}${endpoint}`;
@@ -29,25 +52,7 @@ async function fetchWithAuth(endpoint: string, config: RequestConfig = {}) {
     }
 
     if (requiresAuth) {
-      let accessToken = getAccessToken();
-      
-      if (!accessToken) {
-        console.error('No access token found');
-        throw new Error('Authentication required');
-      }
-
-      if (isTokenExpired(accessToken)) {
-        console.log('Access token expired, attempting refresh...');
-        try {
-          accessToken = await refreshAccessToken();
-          console.log('Token refresh successful');
-        } catch (refreshError) {
-          console.error('Token refresh failed:', refreshError);
-          clearTokens();
-          throw new Error('Session expired. Please log in again.');
-        }
-      }
-
+      const accessToken = await getValidAccessToken();
       headers = {
         ...headers,
         'Authorization': `Bearer ${accessToken}`,
@@ -250,6 +255,28 @@ export const api = {
     return response;
   },
 
+  // Files are served by an authenticated endpoint, so a plain link can't
+  // fetch them: download with the token and hand the browser a blob
+  downloadResource: async (downloadUrl: string, filename: string) => {
+    const accessToken = await getValidAccessToken();
+    const response = await fetch(downloadUrl, {
+      headers: { 'Authorization': `Bearer ${accessToken}` },
+      credentials: 'include',
+    });
+    if (!response.ok) {
+      throw new Error(`Download failed: ${response.status} ${response.statusText}`);
+    }
+    const blob = await response.blob();
+    const objectUrl = URL.createObjectURL(blob);
+    const link = document.createElement('a');
+    link.href = objectUrl;
+    link.download = filename;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    URL.revokeObjectURL(objectUrl);
+  },
+
   deleteResource: async (resourceId: number) => {
     return await fetchWithAuth(`/resources/${resourceId}/`, {
       method: 'DELETE'
@@ -261,8 +288,12 @@ export const api = {
     return fetchWithAuth(`/projects/${projectId}/available_contexts/`);
   },
 
+  getContextContent: async (projectId: string, ids: string[]) => {
+    return fetchWithAuth(`/projects/${projectId}/context_content/?ids=${encodeURIComponent(ids.join(','))}`);
+  },
+
   // Chat
-  chat: async (message: string, contexts: Array<{ type: string; title: string; content: string }>) => {
+  chat: async (message: string, contexts: Array<{ id?: string; type: string; title: string; content?: string }>) => {
     return fetchWithAuth('/chat/', {
       method: 'POST',
       body: JSON.stringify({
@@ -2,6 +2,20 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server so the async LLM views can share one event loop:
+
+    uvicorn config.asgi:application --workers 1
+
+Set FILE_DOWNLOAD_BACKEND to 'nginx' (or 'sendfile') behind the proxy, so
+resource downloads are sent by the web server rather than the event loop.
+
+WebSocket connections go to the document collaboration rooms in
+``core.collab``. Rooms live in the process that serves them, and REST
+updates of a document are only refused while its room is open in the same
+process, so keep to one worker. To scale out, run more single-worker
+servers and have the proxy route ``/ws/documents/<id>/`` and
+``/api/documents/<id>/`` to the same one for a given document. On
+shutdown, the lifespan handler writes the edits of any rooms still open.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +27,27 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it uses the models
+from core.collab import close_rooms, websocket_application  # noqa: E402
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_rooms()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -86,6 +87,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "config.wsgi.application"
+ASGI_APPLICATION = "config.asgi.application"
 
 
 # Database
@@ -95,6 +97,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Scratch database for tests and the load test; SQLite keeps it in memory unless set
+        "TEST": {"NAME": os.getenv("TEST_DATABASE_NAME")},
     }
 }
 
@@ -140,6 +144,15 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# How resource downloads are delivered: 'nginx' hands off with
+# X-Accel-Redirect and 'sendfile' with X-Sendfile; 'python' streams the file
+# through the app and is meant for development. Deployments, and ASGI ones
+# in particular, should use 'nginx' (or 'sendfile'), so no worker spends a
+# download copying bytes. For nginx, FILE_DOWNLOAD_INTERNAL_URL must be an
+# `internal` location aliased to MEDIA_ROOT.
+FILE_DOWNLOAD_BACKEND = os.getenv('FILE_DOWNLOAD_BACKEND', 'python')
+FILE_DOWNLOAD_INTERNAL_URL = os.getenv('FILE_DOWNLOAD_INTERNAL_URL', '/protected-media/')
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -188,9 +201,29 @@ SIMPLE_JWT = {
 }
 
 # Logging Configuration
+# DJANGO_ENV selects sensible defaults; each can be overridden individually.
+# Console output stays synchronous and human readable; the file handler writes
+# JSON lines from a background thread, sampling records below WARNING and
+# truncating/redacting message payloads.
+DJANGO_ENV = os.getenv('DJANGO_ENV', 'development')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DJANGO_ENV == 'development' else 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0' if DJANGO_ENV == 'development' else '0.1'))
+LOG_MAX_PAYLOAD = int(os.getenv('LOG_MAX_PAYLOAD', '2000'))
+LOG_FILE = os.getenv('LOG_FILE', str(BASE_DIR / 'debug.log'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sample': {
+            '()': 'core.log.SamplingFilter',
+            'rate': LOG_SAMPLE_RATE,
+        },
+        'redact': {
+            '()': 'core.log.RedactingFilter',
+            'max_length': LOG_MAX_PAYLOAD,
+        },
+    },
     'formatters': {
         'verbose': {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
@@ -200,18 +233,23 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log.JSONFormatter',
+        },
     },
     'handlers': {
         'console': {
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'verbose'
+            'formatter': 'verbose',
+            'filters': ['redact'],
         },
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'debug.log',
-            'formatter': 'verbose'
+            'level': LOG_LEVEL,
+            'class': 'core.log.BackgroundFileHandler',
+            'filename': LOG_FILE,
+            'formatter': 'json',
+            'filters': ['sample', 'redact'],
         },
     },
     'loggers': {
@@ -221,17 +259,126 @@ LOGGING = {
         },
         'core': {  # Your app's logger
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': True,
         },
         'django.request': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': False,
         },
     },
 }
 
+# Shared cache. With more than one process, set REDIS_URL (needs the redis
+# package): the per-process fallback can't see invalidations made elsewhere
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Seconds a user's set of accessible project ids is cached between requests;
+# off (0) unless the cache is shared, so access changes reach every process
+PROJECT_ACCESS_CACHE_TIMEOUT = int(os.getenv('PROJECT_ACCESS_CACHE_TIMEOUT', '30' if REDIS_URL else '0'))
+
+# Days a soft-deleted project is kept (and restorable from the admin) before
+# purge_projects removes its rows and files
+PROJECT_PURGE_AFTER_DAYS = int(os.getenv('PROJECT_PURGE_AFTER_DAYS', '30'))
+
+# OCR of scanned PDF pages (needs the tesseract binary and language data)
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'True') == 'True'
+OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+OCR_DPI = int(os.getenv('OCR_DPI', '300'))
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(max((os.cpu_count() or 2) - 1, 1))))
+# Pages with fewer characters of text than this (and an image) are OCR'd
+OCR_MIN_TEXT_CHARS = int(os.getenv('OCR_MIN_TEXT_CHARS', '20'))
+
+# Semantic search: embedder class (or {'class': ..., 'options': {...}}), where
+# per-project vector indexes are stored, and IVF clusters probed per query
+# (more probes trade latency for recall)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'core.embeddings.HashedTfidfEmbedder')
+EMBEDDING_INDEX_ROOT = os.getenv('EMBEDDING_INDEX_ROOT', str(BASE_DIR / 'indexes'))
+EMBEDDING_NPROBE = int(os.getenv('EMBEDDING_NPROBE', '32'))
+
+# Tiered storage for resource files (see core.tiering): the cold backend
+# (class, or {'class': ..., 'options': {...}}) and its settings, how long a
+# file goes unread before tier_resources moves it to cold storage, and how
+# often (seconds) a read is recorded per resource
+COLD_STORAGE_BACKEND = os.getenv('COLD_STORAGE_BACKEND', 'core.tiering.CompressedDirectoryStorage')
+COLD_STORAGE_ROOT = os.getenv('COLD_STORAGE_ROOT', str(BASE_DIR / 'cold'))
+COLD_STORAGE_BUCKET = os.getenv('COLD_STORAGE_BUCKET', '')
+COLD_STORAGE_PREFIX = os.getenv('COLD_STORAGE_PREFIX', '')
+# Set for S3-compatible stores other than AWS, e.g. a local MinIO
+COLD_STORAGE_ENDPOINT_URL = os.getenv('COLD_STORAGE_ENDPOINT_URL', '')
+TIERING_COLD_AFTER_DAYS = int(os.getenv('TIERING_COLD_AFTER_DAYS', '90'))
+TIERING_ACCESS_RESOLUTION = int(os.getenv('TIERING_ACCESS_RESOLUTION', '3600'))
+
+# Real-time collaboration (see core.collab): seconds of quiet before a
+# document's edits are saved, the longest edits wait while they keep coming,
+# and how many past edits a room keeps to transform late operations against
+COLLAB_SAVE_DELAY = float(os.getenv('COLLAB_SAVE_DELAY', '2'))
+COLLAB_SAVE_MAX_DELAY = float(os.getenv('COLLAB_SAVE_MAX_DELAY', '10'))
+COLLAB_HISTORY = int(os.getenv('COLLAB_HISTORY', '500'))
+# Seconds a new connection has to send its auth message
+COLLAB_AUTH_TIMEOUT = float(os.getenv('COLLAB_AUTH_TIMEOUT', '10'))
+
+# LLM model routing (see core.llm): the models of each tier, tried in order,
+# and the largest prompt (estimated tokens) each tier takes; the tiers each
+# task may use, smallest first; how long a throttled model is skipped
+# (seconds); and whether calls with a local fallback (extractive summaries)
+# use it once every model is throttled
+LLM_FAST_MODELS = os.getenv('LLM_FAST_MODELS', 'gpt-4o-mini').split(',')
+LLM_FAST_MAX_INPUT_TOKENS = int(os.getenv('LLM_FAST_MAX_INPUT_TOKENS', '100000'))
+LLM_LONG_CONTEXT_MODELS = os.getenv('LLM_LONG_CONTEXT_MODELS', 'gpt-4.1-mini').split(',')
+LLM_LONG_CONTEXT_MAX_INPUT_TOKENS = int(os.getenv('LLM_LONG_CONTEXT_MAX_INPUT_TOKENS', '900000'))
+LLM_TIERS = {
+    'fast': {'models': LLM_FAST_MODELS, 'max_input_tokens': LLM_FAST_MAX_INPUT_TOKENS},
+    'long_context': {'models': LLM_LONG_CONTEXT_MODELS, 'max_input_tokens': LLM_LONG_CONTEXT_MAX_INPUT_TOKENS},
+}
+LLM_ROUTES = {
+    'chat': ['fast', 'long_context'],
+    'summarize': ['fast', 'long_context'],
+    # Suggestions must be quick, and their prompts are small
+    'suggest': ['fast'],
+}
+LLM_THROTTLE_COOLDOWN = int(os.getenv('LLM_THROTTLE_COOLDOWN', '30'))
+LLM_LOCAL_FALLBACK = os.getenv('LLM_LOCAL_FALLBACK', 'True') == 'True'
+
+# Inline writing suggestions (see core.suggestions): the longest suggestion
+# in tokens, how much text before and after the cursor is sent,
+# how long completions are cached (seconds), whether the suggestion after an
+# accepted one is prefetched, and how long an idle editor's state is kept
+SUGGEST_MAX_TOKENS = int(os.getenv('SUGGEST_MAX_TOKENS', '32'))
+SUGGEST_CONTEXT_CHARS = int(os.getenv('SUGGEST_CONTEXT_CHARS', '2000'))
+SUGGEST_SUFFIX_CHARS = int(os.getenv('SUGGEST_SUFFIX_CHARS', '400'))
+SUGGEST_CACHE_TTL = int(os.getenv('SUGGEST_CACHE_TTL', '3600'))
+SUGGEST_PREFETCH_ACCEPTED = os.getenv('SUGGEST_PREFETCH_ACCEPTED', 'True') == 'True'
+SUGGEST_EDITOR_TTL = int(os.getenv('SUGGEST_EDITOR_TTL', '600'))
+
+# Chat context text is cached per context and version (see
+# core.contexts.assemble_contexts): for how long (seconds), and the largest
+# context (characters) worth keeping; larger ones are read from the database
+# each turn. A local-memory cache keeps up to 300 entries per process
+CONTEXT_CACHE_TTL = int(os.getenv('CONTEXT_CACHE_TTL', '900'))
+CONTEXT_CACHE_MAX_CHARS = int(os.getenv('CONTEXT_CACHE_MAX_CHARS', '100000'))
+
+# Resources processed at once by the project-wide re-extract/summarize actions
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+
+# Project archive imports (see core.archives): the most files an archive may
+# hold, and the most bytes they may add up to once decompressed
+ARCHIVE_IMPORT_MAX_MEMBERS = int(os.getenv('ARCHIVE_IMPORT_MAX_MEMBERS', '100000'))
+ARCHIVE_IMPORT_MAX_BYTES = int(os.getenv('ARCHIVE_IMPORT_MAX_BYTES', str(10 * 1024 ** 3)))
+
+# Performance instrumentation
+# Per-phase timings are sent in a Server-Timing header and aggregated into
+# histograms served at /metrics/ to staff users, and to scrapers that send
+# "Authorization: Bearer <METRICS_TOKEN>" (unset: staff only). Access is never
+# granted by address, since behind a proxy every request comes from it.
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -3,10 +3,12 @@ URL configuration for config project.
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework import routers
-from core.views import ProjectViewSet, DocumentViewSet, NoteViewSet, ResourceViewSet, ChatView
+from core.views import (
+    ProjectViewSet, DocumentViewSet, NoteViewSet, ResourceViewSet, ChatView,
+    DocumentSuggestView, ResourceExtractView, ResourceSummarizeView, ProjectReextractView, ProjectSummarizeView,
+    metrics_view,
+)
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -20,12 +22,15 @@ router.register(r'resources', ResourceViewSet, basename='resource')
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/documents/<int:pk>/suggest/", DocumentSuggestView.as_view(), name='document-suggest'),
+    path("api/resources/<int:pk>/extract/", ResourceExtractView.as_view(), name='resource-extract'),
+    path("api/resources/<int:pk>/summarize/", ResourceSummarizeView.as_view(), name='resource-summarize'),
+    path("api/projects/<int:pk>/reextract_all/", ProjectReextractView.as_view(), name='project-reextract-all'),
+    path("api/projects/<int:pk>/summarize_all/", ProjectSummarizeView.as_view(), name='project-summarize-all'),
     path("api/", include(router.urls)),
     path("api-auth/", include("rest_framework.urls")),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/chat/', ChatView.as_view(), name='chat'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
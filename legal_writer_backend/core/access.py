@@ -0,0 +1,105 @@
+"""
+Project membership resolution.
+
+Every query in ``core`` is scoped to the projects the requesting user may
+access. Rather than joining through ``project__owner`` in each query, the
+set of accessible project ids is resolved once per request (and cached
+briefly across requests) and queries filter on ``project_id IN (...)``.
+
+Soft-deleted projects are never accessible. Archived ones can be read
+through their id but are left out of the default, unscoped listings, so a
+user with many archived matters doesn't pay for them in daily queries.
+
+The cache is invalidated for the owner, and on a change of owner for the
+previous owner too, when a project is saved or deleted. Invalidation only
+reaches other processes through a shared cache (``REDIS_URL``), so without
+one the cross-request layer is off (``PROJECT_ACCESS_CACHE_TIMEOUT`` is 0)
+and the ids are resolved once per request. A project missing from a cached
+set is always re-checked against the database before access is denied.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Project
+
+REQUEST_ATTR = '_accessible_project_ids'
+
+
+def _cache_key(user_id):
+    return f'project-access:v2:{user_id}'
+
+
+def _http_request(request):
+    # DRF wraps the HttpRequest; memoize on the underlying one so sync and
+    # async views share it
+    return getattr(request, '_request', request)
+
+
+def _load_project_ids(user):
+    """Return ``(active ids, all accessible ids)`` for a user and cache them"""
+    projects = list(Project.objects.filter(owner=user).values_list('id', 'status'))
+    project_ids = (
+        frozenset(pk for pk, status in projects if status == Project.ACTIVE),
+        frozenset(pk for pk, _ in projects),
+    )
+    if settings.PROJECT_ACCESS_CACHE_TIMEOUT:
+        cache.set(_cache_key(user.pk), project_ids, settings.PROJECT_ACCESS_CACHE_TIMEOUT)
+    return project_ids
+
+
+def _project_ids(request):
+    http_request = _http_request(request)
+    project_ids = getattr(http_request, REQUEST_ATTR, None)
+    if project_ids is not None:
+        return project_ids
+
+    user = request.user
+    if not user.is_authenticated:
+        project_ids = (frozenset(), frozenset())
+    else:
+        project_ids = cache.get(_cache_key(user.pk)) if settings.PROJECT_ACCESS_CACHE_TIMEOUT else None
+        if project_ids is None:
+            project_ids = _load_project_ids(user)
+
+    setattr(http_request, REQUEST_ATTR, project_ids)
+    return project_ids
+
+
+def accessible_project_ids(request, include_archived=False):
+    """Return the ids of the active projects, or with ``include_archived`` all projects, the request's user can access"""
+    active, accessible = _project_ids(request)
+    return accessible if include_archived else active
+
+
+def can_access_project(request, project_id):
+    """Whether the request's user can access the given project id"""
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return False
+
+    if project_id in accessible_project_ids(request, include_archived=True):
+        return True
+    if not request.user.is_authenticated:
+        return False
+
+    # The cached set may predate a project created in another process
+    project_ids = _load_project_ids(request.user)
+    setattr(_http_request(request), REQUEST_ATTR, project_ids)
+    return project_id in project_ids[1]
+
+
+def remember_project_owner(sender, instance, **kwargs):
+    """pre_save receiver for Project: note the owner before the save, in case it changes"""
+    if instance.pk is not None and settings.PROJECT_ACCESS_CACHE_TIMEOUT:
+        instance._previous_owner_id = (
+            Project.all_objects.filter(pk=instance.pk).values_list('owner_id', flat=True).first()
+        )
+
+
+def invalidate_project_access(sender, instance, **kwargs):
+    """post_save/post_delete receiver for Project"""
+    if not settings.PROJECT_ACCESS_CACHE_TIMEOUT:
+        return
+    owners = {instance.owner_id, getattr(instance, '_previous_owner_id', None)} - {None}
+    cache.delete_many([_cache_key(owner_id) for owner_id in owners])
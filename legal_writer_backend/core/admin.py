@@ -1,14 +1,26 @@
 from django.contrib import admin
-from .models import Project, Document, Note, Resource
+from .models import Project, Document, Note, Resource, Chunk, Citation
 
 # Register your models here.
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
-    list_display = ('title', 'owner', 'created_at', 'updated_at')
-    list_filter = ('owner', 'created_at')
+    list_display = ('title', 'owner', 'status', 'created_at', 'updated_at')
+    list_filter = ('status', 'owner', 'created_at')
     search_fields = ('title', 'description')
     ordering = ('-created_at',)
+    actions = ['restore']
+
+    def get_queryset(self, request):
+        # Include soft-deleted projects so they can be restored before the purge
+        return Project.all_objects.all()
+
+    @admin.action(description='Restore selected projects')
+    def restore(self, request, queryset):
+        for project in queryset.filter(status=Project.DELETED):
+            project.status = Project.ACTIVE
+            project.deleted_at = None
+            project.save(update_fields=['status', 'deleted_at', 'updated_at'])
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
@@ -30,3 +42,17 @@ class ResourceAdmin(admin.ModelAdmin):
     list_filter = ('project', 'file_type', 'uploaded_at')
     search_fields = ('title', 'description')
     ordering = ('-uploaded_at',)
+
+@admin.register(Chunk)
+class ChunkAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'position', 'heading_path', 'page_start', 'page_end', 'token_count')
+    list_filter = ('resource__project',)
+    search_fields = ('heading_path',)
+    ordering = ('resource', 'position')
+
+@admin.register(Citation)
+class CitationAdmin(admin.ModelAdmin):
+    list_display = ('text', 'kind', 'key', 'resource', 'start_offset')
+    list_filter = ('kind', 'project')
+    search_fields = ('key', 'text')
+    ordering = ('resource', 'start_offset')
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save, pre_save
+        from .access import invalidate_project_access, remember_project_owner
+        from .embeddings import delete_index
+        from .metrics import install_db_instrumentation
+
+        connection_created.connect(install_db_instrumentation, dispatch_uid='core.metrics.db')
+        pre_save.connect(remember_project_owner, sender='core.Project', dispatch_uid='core.access.owner')
+        post_save.connect(invalidate_project_access, sender='core.Project', dispatch_uid='core.access.save')
+        post_delete.connect(invalidate_project_access, sender='core.Project', dispatch_uid='core.access.delete')
+        post_delete.connect(delete_index, sender='core.Project', dispatch_uid='core.embeddings.delete')
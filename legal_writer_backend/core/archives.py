@@ -0,0 +1,460 @@
+"""
+Project export and import as zip or tar archives.
+
+An archive holds ``manifest.json`` followed by one JSON-lines file per
+table and the resource files under ``files/``:
+
+    manifest.json
+    documents.jsonl
+    notes.jsonl
+    files/<resource id>/<file name>
+    resources.jsonl
+    chunks.jsonl
+    chat_sessions.jsonl
+    chat_contexts.jsonl
+
+Files come before the rows that point at them, so an archive can be read
+in one forward pass and tar archives are never seeked. Export reads rows
+with ``.iterator()`` and hands out archive bytes as they are produced;
+import inserts with ``bulk_create`` a batch at a time. Either way memory
+stays flat however large the project is. Citations are not exported, they
+are rebuilt from the imported text and chunks.
+
+Imports are capped at ``ARCHIVE_IMPORT_MAX_MEMBERS`` files and
+``ARCHIVE_IMPORT_MAX_BYTES`` decompressed bytes, counted as each member is
+reached, so a crafted archive can't fill the disk or the database.
+"""
+import datetime
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.text import get_valid_filename, slugify
+
+from .citations import rebuild_citations
+from .http import FILE_CHUNK_SIZE
+from .models import Project, Document, Note, Resource, Chunk, ChatSession, ChatContext
+from .tiering import open_file
+
+FORMAT_VERSION = 1
+
+# Content types of the supported archive formats
+ARCHIVE_FORMATS = {
+    'zip': 'application/zip',
+    'tar': 'application/x-tar',
+    'tar.gz': 'application/gzip',
+}
+
+BATCH_SIZE = 500
+
+# JSON-lines members above this size are spooled to disk while a tar is written
+SPOOL_SIZE = 8 * 1024 * 1024
+
+PROJECT_FIELDS = ('title', 'description', 'status', 'created_at', 'updated_at')
+# Statuses an imported project may keep; anything else comes in active
+IMPORT_STATUSES = (Project.ACTIVE, Project.ARCHIVED)
+DOCUMENT_FIELDS = ('id', 'title', 'content', 'created_at', 'updated_at')
+NOTE_FIELDS = ('id', 'title', 'name_identifier', 'content', 'created_at', 'updated_at')
+RESOURCE_FIELDS = (
+    'id', 'title', 'file', 'file_type', 'uploaded_at', 'updated_at', 'description', 'file_size',
+    'content_extracted', 'extraction_error', 'last_extracted', 'summary', 'summary_error',
+    'last_summarized', 'file_hash', 'summary_hash',
+)
+CHUNK_FIELDS = (
+    'resource_id', 'position', 'heading_path', 'page_start', 'page_end', 'start_offset',
+    'end_offset', 'token_count', 'content',
+)
+CHAT_SESSION_FIELDS = ('id', 'title', 'created_at', 'updated_at')
+CHAT_CONTEXT_FIELDS = ('chat_session_id', 'context_type', 'note_id', 'document_id', 'resource_id', 'added_at')
+
+
+class _Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds; keep timestamps exact
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class ArchiveError(ValueError):
+    """Raised when an uploaded archive can't be imported"""
+
+
+def archive_filename(project, archive_format):
+    return f"{slugify(project.title) or 'project'}-{project.pk}.{archive_format}"
+
+
+def file_member(resource_id, name):
+    return f'files/{resource_id}/{os.path.basename(name)}'
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are handed out as they're written"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _ZipWriter:
+    def __init__(self, fileobj):
+        # The buffer can't seek, so zipfile writes sizes after each member
+        self.archive = zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def add_lines(self, name, batches):
+        with self.archive.open(name, 'w', force_zip64=True) as member:
+            for batch in batches:
+                member.write(batch)
+                yield
+
+    def add_file(self, name, f, size):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        # Uploads are mostly PDFs and Office files, which are compressed already
+        info.compress_type = zipfile.ZIP_STORED
+        with self.archive.open(info, 'w', force_zip64=True) as member:
+            while chunk := f.read(FILE_CHUNK_SIZE):
+                member.write(chunk)
+                yield
+
+    def close(self):
+        self.archive.close()
+
+
+class _TarWriter:
+    def __init__(self, fileobj, compression=''):
+        self.archive = tarfile.open(fileobj=fileobj, mode=f'w|{compression}')
+
+    def add_lines(self, name, batches):
+        # Tar headers carry the size, so the member is spooled before it's written
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            for batch in batches:
+                spool.write(batch)
+            size = spool.tell()
+            spool.seek(0)
+            yield from self.add_file(name, spool, size)
+
+    def add_file(self, name, f, size):
+        # TarFile.addfile copies a member in one call; write it in steps so
+        # the output can be drained in between
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        header = info.tobuf(self.archive.format, self.archive.encoding, self.archive.errors)
+        out = self.archive.fileobj
+        out.write(header)
+        remaining = size
+        while remaining:
+            chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"{name} is shorter than its recorded size")
+            out.write(chunk)
+            remaining -= len(chunk)
+            yield
+        padding = -size % tarfile.BLOCKSIZE
+        out.write(tarfile.NUL * padding)
+        self.archive.offset += len(header) + size + padding
+
+    def close(self):
+        self.archive.close()
+
+
+def _json_lines(queryset, fields, transform=None):
+    """Encode rows as JSON lines, a batch of lines per yielded bytes"""
+    encoder = _Encoder(ensure_ascii=False)
+    batch = []
+    for row in queryset.values(*fields).iterator(chunk_size=BATCH_SIZE):
+        if transform:
+            row = transform(row)
+        batch.append(encoder.encode(row))
+        if len(batch) >= BATCH_SIZE:
+            yield ('\n'.join(batch) + '\n').encode('utf-8')
+            batch = []
+    if batch:
+        yield ('\n'.join(batch) + '\n').encode('utf-8')
+
+
+def iter_export(project, archive_format='zip'):
+    """Yield the bytes of a project archive as they are produced"""
+    buffer = _StreamBuffer()
+    if archive_format == 'zip':
+        writer = _ZipWriter(buffer)
+    else:
+        writer = _TarWriter(buffer, 'gz' if archive_format == 'tar.gz' else '')
+
+    def drain(steps):
+        for _ in steps:
+            data = buffer.drain()
+            if data:
+                yield data
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'project': {field: getattr(project, field) for field in PROJECT_FIELDS},
+    }
+    yield from drain(writer.add_lines('manifest.json', [json.dumps(manifest, cls=_Encoder).encode('utf-8')]))
+    yield from drain(writer.add_lines('documents.jsonl', _json_lines(project.documents.order_by('pk'), DOCUMENT_FIELDS)))
+    yield from drain(writer.add_lines('notes.jsonl', _json_lines(project.notes.order_by('pk'), NOTE_FIELDS)))
+
+    resources = project.resources.order_by('pk')
+    stored = set()
+    for resource in resources.only('pk', 'file', 'file_size', 'storage_tier').iterator(chunk_size=BATCH_SIZE):
+        if not resource.file:
+            continue
+        try:
+            # Read from whichever tier holds the file, without fetching it back
+            f, size = open_file(resource)
+        except FileNotFoundError:
+            continue
+        with f:
+            yield from drain(writer.add_file(file_member(resource.pk, resource.file.name), f, size))
+        stored.add(resource.pk)
+
+    def resource_row(row):
+        row['file'] = file_member(row['id'], row['file']) if row['id'] in stored else ''
+        return row
+
+    yield from drain(writer.add_lines('resources.jsonl', _json_lines(resources, RESOURCE_FIELDS, resource_row)))
+    chunks = Chunk.objects.filter(resource__project=project).order_by('resource_id', 'position')
+    yield from drain(writer.add_lines('chunks.jsonl', _json_lines(chunks, CHUNK_FIELDS)))
+    yield from drain(writer.add_lines('chat_sessions.jsonl', _json_lines(project.chat_sessions.order_by('pk'), CHAT_SESSION_FIELDS)))
+    contexts = ChatContext.objects.filter(chat_session__project=project).order_by('pk')
+    yield from drain(writer.add_lines('chat_contexts.jsonl', _json_lines(contexts, CHAT_CONTEXT_FIELDS)))
+
+    writer.close()
+    data = buffer.drain()
+    if data:
+        yield data
+
+
+class _Unseekable(io.RawIOBase):
+    """
+    Read-only view of a streamed tar member. Its own ``seekable()`` fails
+    with AttributeError instead of returning False, which trips up
+    TextIOWrapper and File.chunks().
+    """
+
+    def __init__(self, member):
+        self.member = member
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.member.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _ImportLimits:
+    """Counts the members and decompressed bytes of an archive being imported"""
+
+    def __init__(self, max_members, max_bytes):
+        self.members = max_members
+        self.bytes = max_bytes
+
+    def charge(self, size):
+        # Sizes come from the member headers, and neither format reads past them
+        self.members -= 1
+        self.bytes -= size
+        if self.members < 0:
+            raise ArchiveError("The archive has too many files")
+        if self.bytes < 0:
+            raise ArchiveError("The archive is too large once decompressed")
+
+
+def iter_members(fileobj):
+    """Yield ``(name, size, file)`` for the regular files of a zip or tar archive, in archive order"""
+    # Sniffed rather than zipfile.is_zipfile, which also says yes to a tar
+    # that ends with a zip-based file such as a .docx
+    fileobj.seek(0)
+    is_zip = fileobj.read(4) == b'PK\x03\x04'
+    if is_zip:
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, info.file_size, member
+        return
+
+    fileobj.seek(0)
+    try:
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, info.size, io.BufferedReader(_Unseekable(archive.extractfile(info)))
+    except tarfile.TarError as e:
+        raise ArchiveError(f"Not a zip or tar archive: {str(e)}")
+
+
+def _timestamp_fields(model):
+    return [
+        field.name for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+
+
+class _Importer:
+    """Inserts the members of an archive into a new project as they are read"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.project = None
+        # Old primary keys to new ones, for rows that others point at
+        self.ids = {Document: {}, Note: {}, Resource: {}, ChatSession: {}}
+        # Archive member names to the storage names they were saved under
+        self.files = {}
+
+    def handle(self, name, member):
+        if name == 'manifest.json':
+            return self.create_project(json.load(member))
+        if self.project is None:
+            raise ArchiveError("The archive must start with manifest.json")
+        if name.startswith('files/'):
+            return self.save_file(name, member)
+
+        handlers = {
+            'documents.jsonl': lambda row: self.build(Document, row, DOCUMENT_FIELDS),
+            'notes.jsonl': lambda row: self.build(Note, row, NOTE_FIELDS),
+            'resources.jsonl': self.build_resource,
+            'chunks.jsonl': self.build_chunk,
+            'chat_sessions.jsonl': lambda row: self.build(ChatSession, row, CHAT_SESSION_FIELDS),
+            'chat_contexts.jsonl': self.build_chat_context,
+        }
+        if name in handlers:
+            self.insert(handlers[name], member)
+
+    def create_project(self, manifest):
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ArchiveError(f"Unsupported archive format: {manifest.get('format')}")
+        fields = {field: value for field, value in manifest.get('project', {}).items() if field in PROJECT_FIELDS}
+        if fields.get('status') not in IMPORT_STATUSES:
+            fields.pop('status', None)
+        timestamps = {field: fields.pop(field) for field in ('created_at', 'updated_at') if field in fields}
+        self.project = Project.objects.create(owner=self.owner, **fields)
+        if timestamps:
+            Project.objects.filter(pk=self.project.pk).update(**timestamps)
+
+    def save_file(self, name, member):
+        storage = Resource._meta.get_field('file').storage
+        upload_to = Resource._meta.get_field('file').upload_to
+        filename = get_valid_filename(os.path.basename(name)) or 'file'
+        self.files[name] = storage.save(os.path.join(upload_to, filename), File(member, name=filename))
+
+    def build(self, model, row, fields):
+        obj = model(project=self.project, **{field: row[field] for field in fields if field in row and field != 'id'})
+        return obj, row.get('id')
+
+    def build_resource(self, row):
+        obj, old_id = self.build(Resource, row, RESOURCE_FIELDS)
+        obj.file = self.files.get(row.get('file'), '')
+        return obj, old_id
+
+    def build_chunk(self, row):
+        resource_id = self.ids[Resource].get(row.get('resource_id'))
+        if resource_id is None:
+            return None, None
+        fields = {field: row[field] for field in CHUNK_FIELDS if field in row and field != 'resource_id'}
+        return Chunk(resource_id=resource_id, **fields), None
+
+    def build_chat_context(self, row):
+        chat_session_id = self.ids[ChatSession].get(row.get('chat_session_id'))
+        if chat_session_id is None:
+            return None, None
+        return ChatContext(
+            chat_session_id=chat_session_id,
+            context_type=row.get('context_type', ''),
+            note_id=self.ids[Note].get(row.get('note_id')),
+            document_id=self.ids[Document].get(row.get('document_id')),
+            resource_id=self.ids[Resource].get(row.get('resource_id')),
+            added_at=row.get('added_at'),
+        ), None
+
+    def insert(self, build, member):
+        batch = []
+        for line in io.TextIOWrapper(member, encoding='utf-8'):
+            if not line.strip():
+                continue
+            try:
+                obj, old_id = build(json.loads(line))
+            except (ValueError, TypeError) as e:
+                raise ArchiveError(f"Invalid row: {str(e)}")
+            if obj is not None:
+                batch.append((obj, old_id))
+            if len(batch) >= BATCH_SIZE:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch):
+        model = type(batch[0][0])
+        objs = [obj for obj, _ in batch]
+        # bulk_create stamps auto_now fields, so keep the archived values aside
+        timestamps = _timestamp_fields(model)
+        archived = [{field: getattr(obj, field) for field in timestamps} for obj in objs]
+        model.objects.bulk_create(objs)
+        if timestamps:
+            for obj, values in zip(objs, archived):
+                for field, value in values.items():
+                    if value:
+                        setattr(obj, field, value)
+            model.objects.bulk_update(objs, timestamps)
+        if model in self.ids:
+            self.ids[model].update((old_id, obj.pk) for obj, old_id in batch if old_id is not None)
+
+    def finish(self):
+        if self.project is None:
+            raise ArchiveError("The archive has no manifest.json")
+        resources = Resource.objects.filter(pk__in=self.ids[Resource].values())
+        for resource in resources.only('pk', 'project_id', 'content_extracted').iterator(chunk_size=100):
+            rebuild_citations(resource)
+
+    def discard_files(self):
+        storage = Resource._meta.get_field('file').storage
+        for name in self.files.values():
+            storage.delete(name)
+
+
+def import_project(fileobj, owner):
+    """
+    Create a project owned by ``owner`` from a zip or tar archive made by
+    ``iter_export``. ``fileobj`` must be seekable for zip archives; tar
+    archives are read as a stream. Raises ``ArchiveError`` for archives that
+    can't be read or are over the import limits, and leaves nothing behind
+    when the import fails.
+    """
+    importer = _Importer(owner)
+    limits = _ImportLimits(settings.ARCHIVE_IMPORT_MAX_MEMBERS, settings.ARCHIVE_IMPORT_MAX_BYTES)
+    try:
+        with transaction.atomic():
+            for name, size, member in iter_members(fileobj):
+                limits.charge(size)
+                importer.handle(name, member)
+            importer.finish()
+    except (zipfile.BadZipFile, json.JSONDecodeError, UnicodeDecodeError) as e:
+        importer.discard_files()
+        raise ArchiveError(str(e))
+    except Exception:
+        importer.discard_files()
+        raise
+    return importer.project
@@ -0,0 +1,155 @@
+"""Synthetic legal PDFs for benchmarking extraction, generated offline with PyMuPDF."""
+import os
+import random
+
+import pymupdf
+
+PAGE_WIDTH, PAGE_HEIGHT = pymupdf.paper_size('a4')
+MARGIN = 72
+LINE_HEIGHT = 14
+
+KINDS = ('judgment', 'tables', 'footnotes', 'scanned')
+SIZES = {'small': 5, 'medium': 50, 'large': 250}
+
+WORDS = (
+    'applicant respondent court order appeal judgment held that the in of and to '
+    'contract breach damages evidence witness counsel honourable section act '
+    'statute regulation constitution right duty obligation reasonable party '
+    'claim defence plea application notice motion affidavit founding replying '
+    'interdict relief costs scale attorney client submission authority precedent'
+).split()
+
+
+def _sentence(rng, min_words=8, max_words=24):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def _paragraph(rng, sentences=4):
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+
+def _write_lines(page, text, y, fontsize=11, width=80):
+    """Insert word-wrapped text from y downwards and return the next free y"""
+    line = ''
+    for word in text.split():
+        if len(line) + len(word) + 1 > width:
+            page.insert_text((MARGIN, y), line, fontsize=fontsize)
+            y += LINE_HEIGHT * fontsize / 11
+            line = ''
+        line = f'{line} {word}'.strip()
+    if line:
+        page.insert_text((MARGIN, y), line, fontsize=fontsize)
+        y += LINE_HEIGHT * fontsize / 11
+    return y
+
+
+def _judgment_page(doc, rng, number):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    y = MARGIN
+    if number % 10 == 0:
+        page.insert_text((MARGIN, y), f'PART {number // 10 + 1}: {_sentence(rng, 2, 4).upper()}', fontsize=16)
+        y += 30
+    paragraph = number * 6
+    while y < PAGE_HEIGHT - MARGIN * 2:
+        paragraph += 1
+        y = _write_lines(page, f'[{paragraph}] {_paragraph(rng)}', y) + 8
+    page.insert_text((PAGE_WIDTH / 2, PAGE_HEIGHT - MARGIN / 2), str(number + 1), fontsize=9)
+    return page
+
+
+def _tables_page(doc, rng, number):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((MARGIN, MARGIN), f'Schedule {number + 1}: Particulars of claim', fontsize=14)
+    columns = ['Item', 'Date', 'Description', 'Amount']
+    column_width = (PAGE_WIDTH - 2 * MARGIN) / len(columns)
+    row_height = 20
+    top = MARGIN + 20
+    for row in range(25):
+        cells = columns if row == 0 else [
+            str(row),
+            f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            ' '.join(rng.choice(WORDS) for _ in range(3)),
+            f'R {rng.randint(100, 99999):,}.00',
+        ]
+        for col, cell in enumerate(cells):
+            rect = pymupdf.Rect(
+                MARGIN + col * column_width, top + row * row_height,
+                MARGIN + (col + 1) * column_width, top + (row + 1) * row_height,
+            )
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            page.insert_text((rect.x0 + 3, rect.y1 - 6), cell, fontsize=8)
+    return page
+
+
+def _footnotes_page(doc, rng, number):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    y = MARGIN
+    notes = []
+    while y < PAGE_HEIGHT * 0.65:
+        marker = number * 5 + len(notes) + 1
+        notes.append(marker)
+        y = _write_lines(page, f'{_paragraph(rng, 3)} [{marker}]', y) + 8
+    y = PAGE_HEIGHT * 0.75
+    page.draw_line((MARGIN, y - 10), (MARGIN + 150, y - 10), width=0.5)
+    for marker in notes:
+        citation = f'{rng.choice(WORDS).title()} v {rng.choice(WORDS).title()} {rng.randint(1990, 2024)} ({rng.randint(1, 5)}) SA {rng.randint(1, 900)} (SCA)'
+        y = _write_lines(page, f'{marker} {citation} at para {rng.randint(1, 80)}.', y, fontsize=8, width=110)
+    return page
+
+
+def _scanned_page(doc, rng, number):
+    # Render a text page to an image and embed only the image, so the page
+    # looks like a scan and has no text layer
+    source = pymupdf.open()
+    _judgment_page(source, rng, number)
+    pixmap = source[0].get_pixmap(dpi=100, colorspace=pymupdf.csGRAY)
+    source.close()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_image(page.rect, stream=pixmap.tobytes('png'))
+    return page
+
+
+PAGE_BUILDERS = {
+    'judgment': _judgment_page,
+    'tables': _tables_page,
+    'footnotes': _footnotes_page,
+    'scanned': _scanned_page,
+}
+
+
+def build_pdf(path, kind, pages, seed=0):
+    """Write a synthetic PDF of the given kind and page count to path"""
+    rng = random.Random(f'{kind}:{pages}:{seed}')
+    doc = pymupdf.open()
+    builder = PAGE_BUILDERS[kind]
+    for number in range(pages):
+        builder(doc, rng, number)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+def build_corpus(directory, kinds=KINDS, sizes=SIZES, seed=0):
+    """
+    Generate (or reuse) one PDF per kind and size in directory.
+
+    Returns a list of dicts describing each file. Files are deterministic
+    for a given seed, so an existing file is reused rather than rebuilt.
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for kind in kinds:
+        for size, pages in sizes.items():
+            path = os.path.join(directory, f'{kind}-{size}-{seed}.pdf')
+            if not os.path.exists(path):
+                build_pdf(path, kind, pages, seed)
+            corpus.append({
+                'name': f'{kind}-{size}',
+                'kind': kind,
+                'size': size,
+                'pages': pages,
+                'path': path,
+                'bytes': os.path.getsize(path),
+            })
+    return corpus
@@ -0,0 +1,126 @@
+"""An in-process stand-in for the OpenAI chat completions API, for load testing."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        self.server.record_request(request)
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+            return
+
+        if config.rng.random() < config.rate_limit_ratio:
+            self._send_json(429, {'error': {
+                'message': 'Rate limit reached for requests',
+                'type': 'requests',
+                'code': 'rate_limit_exceeded',
+            }})
+            return
+
+        time.sleep(max(config.latency + config.rng.uniform(-config.jitter, config.jitter), 0))
+        model = request.get('model', 'gpt-4o-mini')
+        words = config.reply.split()
+
+        if request.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for index, word in enumerate(words):
+                chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}],
+                }
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+                if index < len(words) - 1:
+                    time.sleep(config.stream_chunk_delay)
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.close_connection = True
+            return
+
+        prompt_tokens = sum(len(str(message.get('content', ''))) for message in request.get('messages', [])) // 4
+        self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': config.reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(words),
+                'total_tokens': prompt_tokens + len(words),
+            },
+        })
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency=0.5, jitter=0.1, rate_limit_ratio=0.0, stream_chunk_delay=0.02,
+                 reply='This is a canned response from the fake OpenAI server.', seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.stream_chunk_delay = stream_chunk_delay
+        self.reply = reply
+        self.rng = random.Random(seed)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Serve ``/v1/chat/completions`` on localhost with configurable latency,
+    SSE streaming and injected 429s. Point ``openai.api_base`` at ``url``.
+    """
+    daemon_threads = True
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.config = config or FakeOpenAIConfig()
+        self.requests_seen = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def record_request(self, request):
+        with self._lock:
+            self.requests_seen += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,155 @@
+"""
+Structure-aware chunking of extracted text.
+
+Text is split along markdown headings first, then paragraphs, then
+sentences, so a chunk never straddles two sections and stays under
+``MAX_CHUNK_TOKENS``. Each chunk records where it came from (heading path,
+pages and character offsets into the source text), so consumers can load
+just the parts they need.
+"""
+import bisect
+import re
+
+from django.db import transaction
+
+from .contexts import CHARS_PER_TOKEN, estimate_tokens
+from .models import Chunk
+
+MAX_CHUNK_TOKENS = 400
+
+HEADING_SEPARATOR = ' > '
+
+HEADING = re.compile(r'^(#{1,6})[ \t]+(.+?)[ \t#]*$', re.MULTILINE)
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?;:])\s+')
+
+
+def iter_sections(text):
+    """Yield ``(start, end, headings)`` for each heading and the text under it"""
+    headings = []
+    start = 0
+    for match in HEADING.finditer(text):
+        if text[start:match.start()].strip():
+            yield start, match.start(), [title for _, title in headings]
+        level = len(match.group(1))
+        headings = [(lvl, title) for lvl, title in headings if lvl < level]
+        headings.append((level, match.group(2).strip().strip('*_ ')))
+        start = match.start()
+    if text[start:].strip():
+        yield start, len(text), [title for _, title in headings]
+
+
+def _split_at(text, start, end, pattern):
+    position = start
+    for match in pattern.finditer(text, start, end):
+        yield position, match.start()
+        position = match.end()
+    yield position, end
+
+
+def _pieces(text, start, end, max_chars):
+    """Paragraphs of a span, with oversized ones split by sentence and then by word"""
+    for paragraph_start, paragraph_end in _split_at(text, start, end, PARAGRAPH_BREAK):
+        if paragraph_end - paragraph_start <= max_chars:
+            yield paragraph_start, paragraph_end
+            continue
+        for sentence_start, sentence_end in _split_at(text, paragraph_start, paragraph_end, SENTENCE_BREAK):
+            while sentence_end - sentence_start > max_chars:
+                cut = text.rfind(' ', sentence_start, sentence_start + max_chars)
+                if cut <= sentence_start:
+                    cut = sentence_start + max_chars
+                yield sentence_start, cut
+                sentence_start = cut
+            yield sentence_start, sentence_end
+
+
+def _strip(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _page(page_offsets, offset):
+    return bisect.bisect_right(page_offsets, offset) if page_offsets else None
+
+
+def iter_chunks(text, page_offsets=(), max_tokens=MAX_CHUNK_TOKENS):
+    """
+    Yield chunk fields for ``text``.
+
+    ``page_offsets`` holds the offset each page starts at, as returned by
+    ``extractors.extract_file``; without it pages are left empty.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    page_offsets = list(page_offsets)
+
+    def chunk(start, end, headings):
+        return {
+            'heading_path': HEADING_SEPARATOR.join(headings),
+            'page_start': _page(page_offsets, start),
+            'page_end': _page(page_offsets, end - 1),
+            'start_offset': start,
+            'end_offset': end,
+            'token_count': estimate_tokens(end - start),
+            'content': text[start:end],
+        }
+
+    for section_start, section_end, headings in iter_sections(text):
+        current = None
+        for start, end in _pieces(text, section_start, section_end, max_chars):
+            start, end = _strip(text, start, end)
+            if start >= end:
+                continue
+            if current is not None and end - current[0] <= max_chars:
+                current = (current[0], end)
+                continue
+            if current is not None:
+                yield chunk(*current, headings)
+            current = (start, end)
+        if current is not None:
+            yield chunk(*current, headings)
+
+
+def rebuild_chunks(resource, page_offsets=()):
+    """Replace a resource's chunks with ones built from its extracted content"""
+    with transaction.atomic():
+        resource.chunks.all().delete()
+        Chunk.objects.bulk_create(
+            (
+                Chunk(resource=resource, position=position, **fields)
+                for position, fields in enumerate(iter_chunks(resource.content_extracted or '', page_offsets))
+            ),
+            batch_size=500,
+        )
+
+
+def parse_range(value):
+    """Parse ``a-b`` or ``a`` into an inclusive ``(a, b)`` pair of ints"""
+    first, _, last = value.partition('-')
+    first, last = int(first), int(last or first)
+    if first < 0 or last < first:
+        raise ValueError(f"Invalid range: {value}")
+    return first, last
+
+
+def filter_chunks(queryset, params):
+    """
+    Narrow a chunk queryset by request parameters:
+    ``positions``, ``pages`` and ``chars`` take ``a-b`` ranges and
+    ``heading`` matches anywhere in the heading path.
+    Raises ``ValueError`` for malformed ranges.
+    """
+    if params.get('positions'):
+        first, last = parse_range(params['positions'])
+        queryset = queryset.filter(position__gte=first, position__lte=last)
+    if params.get('pages'):
+        first, last = parse_range(params['pages'])
+        queryset = queryset.filter(page_start__lte=last, page_end__gte=first)
+    if params.get('chars'):
+        first, last = parse_range(params['chars'])
+        queryset = queryset.filter(start_offset__lte=last, end_offset__gt=first)
+    if params.get('heading'):
+        queryset = queryset.filter(heading_path__icontains=params['heading'])
+    return queryset
@@ -0,0 +1,193 @@
+"""
+Citation extraction.
+
+Extracted text is scanned for case citations (neutral citations, law
+report references and ``X v Y`` case names), statute references (sections,
+rules, regulations and Acts) and paragraph pinpoints. Each one is stored as
+a ``Citation`` row with a normalized ``key`` and a link to the chunk it
+occurs in, so "where is X cited" is an index lookup rather than a scan of
+every resource's text.
+"""
+import bisect
+import re
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+
+from .models import Citation
+
+# Law reports and courts, as they appear in citations
+_REPORTS = (
+    r"AC|QB|KB|Ch|Fam|WLR|All\s?ER|All\s?SA|Lloyd's\s?Rep|SLT|SC|SA|SACR|BCLR|ILJ|BLLR|CLR|DLR|SCR|NZLR|FCR|ALR"
+)
+_US_REPORTERS = (
+    r"U\.\s?S\.|S\.\s?Ct\.|L\.\s?Ed\.(?:\s?2d)?|F\.\s?Supp\.(?:\s?[23]d)?|F\.(?:\s?[234]d|\s?4th)?|"
+    r"A\.(?:\s?[23]d)?|P\.(?:\s?[23]d)?|N\.[EW]\.(?:\s?[23]d)?|So\.(?:\s?[23]d)?"
+)
+_NAME_WORD = r"(?:[A-Z][\w'&.-]*|of|the|and|de|van|der|du|von|(?:\([A-Z][\w ]*\)))"
+_PARTY = rf"[A-Z][\w'&.-]*(?:\s+{_NAME_WORD}){{0,5}}"
+# Bounded, like _PARTY: an unbounded run is retried from every capitalized
+# word, which is quadratic on headings, tables and text in capitals
+_ACT = r"(?:the\s+)?[A-Z][\w'-]*(?:\s+(?:[A-Z][\w'-]*|of|and|on|for|the|\(\w+\))){0,8}?\s+Act(?:\s+\d+\s+of\s+\d{4}|,?\s+\d{4})?"
+
+PATTERNS = (
+    # [2019] ZASCA 12, [2020] UKSC 5, [2015] EWCA Civ 123
+    (Citation.CASE, re.compile(
+        r"\[(?:19|20)\d{2}\]\s+[A-Z]{2,8}(?:\s+(?:Civ|Crim|Admin|Ch|QB|KB|Fam|Comm|Pat|TCC|IPEC))?\s+\d{1,5}\b"
+    )),
+    # 2019 (3) SA 123 (SCA), [1932] AC 562, [2001] 1 WLR 123
+    (Citation.CASE, re.compile(
+        rf"(?:\[(?:18|19|20)\d{{2}}\]|\b(?:18|19|20)\d{{2}})\s+(?:\(?\d{{1,2}}\)?\s+)?(?:{_REPORTS})\s+\d{{1,5}}"
+        rf"(?:\s+\([A-Z][A-Za-z]{{0,5}}\))?"
+    )),
+    # 347 U.S. 483, 123 F.3d 456
+    (Citation.CASE, re.compile(rf"\b\d{{1,4}}\s+(?:{_US_REPORTERS})\s+\d{{1,5}}\b")),
+    # Donoghue v Stevenson, S v Makwanyane
+    (Citation.CASE, re.compile(rf"\b{_PARTY}\s+v\.?\s+{_PARTY}")),
+    # section 12(3)(a) of the Companies Act 71 of 2008, s 12, rule 53, reg 4
+    (Citation.STATUTE, re.compile(
+        rf"(?<!['’])\b(?:[Ss]ections?|[Ss]ecs?\.|ss?\.?|[Rr]ules?|[Rr]egulations?|[Rr]egs?\.?|[Aa]rticles?|[Aa]rts?\.)"
+        rf"\s+\d+[A-Z]?(?:\(\w{{1,4}}\))*(?:\s+of\s+{_ACT})?"
+    )),
+    # The Labour Relations Act 66 of 1995
+    (Citation.STATUTE, re.compile(rf"\b{_ACT}")),
+    # para 12, paras 12-15, paragraph [23], at [45]
+    (Citation.PARAGRAPH, re.compile(
+        r"\b(?:paras?\.?|paragraphs?)\s*\[?\d{1,4}\]?(?:\s*(?:-|–|to|and)\s*\[?\d{1,4}\]?)?|\bat\s+\[\d{1,4}\]"
+    )),
+)
+
+# Longer words first, so "sections" isn't read as "s"
+_STATUTE_PREFIXES = (
+    ('sections', 's'), ('section', 's'), ('secs.', 's'), ('sec.', 's'), ('ss.', 's'), ('ss', 's'),
+    ('s.', 's'), ('s', 's'), ('regulations', 'reg'), ('regulation', 'reg'), ('regs.', 'reg'),
+    ('regs', 'reg'), ('reg.', 'reg'), ('reg', 'reg'), ('rules', 'rule'), ('rule', 'rule'),
+    ('articles', 'art'), ('article', 'art'), ('arts.', 'art'), ('art.', 'art'),
+)
+
+# Pinpoints this close after a citation refer to it
+PINPOINT_GAP = re.compile(r"^[\s,;:]*(?:at\s+)?$")
+
+# Words a case name match can pick up from the sentence around it
+LEADING_WORDS = re.compile(r"^(?:(?:In|See|Also|Cf\.?|Compare|And|But|As|Following|Per|Applying|Unlike|Like)\s+)+")
+
+
+def normalize_key(kind, text):
+    """Lower-cased, whitespace- and punctuation-normalized form used for lookups"""
+    key = ' '.join(text.replace('–', '-').split()).lower()
+    key = re.sub(r'\s+v\.\s+', ' v ', key)
+    if key.startswith('the ') and kind == Citation.STATUTE:
+        key = key[4:]
+    if kind == Citation.STATUTE:
+        for prefix, short in _STATUTE_PREFIXES:
+            if key.startswith(prefix + ' '):
+                key = f'{short} {key[len(prefix) + 1:]}'
+                break
+        key = key.replace(' of the ', ' ')
+    elif kind == Citation.PARAGRAPH:
+        numbers = re.findall(r'\d+', key)
+        key = f"para {'-'.join(numbers)}"
+    elif kind == Citation.CASE:
+        # "U. S." and "S. Ct." are written with and without spaces
+        key = re.sub(r'(?<=\.)\s+(?=[a-z]+\.)', '', key)
+    return key[:255]
+
+
+def query_keys(query, kind=None):
+    """The keys a free-text query could normalize to"""
+    keys = set()
+    for candidate in ([kind] if kind else [Citation.CASE, Citation.STATUTE, Citation.PARAGRAPH]):
+        if candidate == Citation.PARAGRAPH and not re.search(r'\d', query):
+            continue
+        keys.add(normalize_key(candidate, query))
+    return keys
+
+
+def iter_citations(text):
+    """Yield ``(kind, text, key, start, end, authority)`` for citations in order of appearance"""
+    found = []
+    for kind, pattern in PATTERNS:
+        for match in pattern.finditer(text):
+            start, raw = match.start(), match.group().rstrip()
+            leading = LEADING_WORDS.match(raw)
+            if leading and kind == Citation.CASE:
+                start, raw = start + leading.end(), raw[leading.end():]
+            found.append((start, -(start + len(raw)), kind, raw))
+    found.sort()
+
+    last_end = -1
+    previous = None
+    for start, negative_end, kind, raw in found:
+        end = -negative_end
+        if start < last_end:
+            # Overlaps a longer or earlier citation, e.g. "s 12" inside a section of an Act
+            continue
+        key = normalize_key(kind, raw)
+        authority = ''
+        if kind == Citation.PARAGRAPH and previous and PINPOINT_GAP.match(text[previous[1]:start]):
+            authority = previous[0]
+        yield kind, raw[:500], key, start, end, authority
+        if kind != Citation.PARAGRAPH:
+            previous = (key, end)
+        last_end = end
+
+
+def rebuild_citations(resource):
+    """Replace a resource's citations with ones found in its extracted content"""
+    chunks = list(resource.chunks.order_by('start_offset').values_list('start_offset', 'id'))
+    starts = [start for start, _ in chunks]
+
+    def chunk_id(offset):
+        position = bisect.bisect_right(starts, offset) - 1
+        return chunks[position][1] if position >= 0 else None
+
+    with transaction.atomic():
+        resource.citations.all().delete()
+        Citation.objects.bulk_create(
+            (
+                Citation(
+                    project_id=resource.project_id, resource=resource, chunk_id=chunk_id(start),
+                    kind=kind, text=raw, key=key, authority=authority,
+                    start_offset=start, end_offset=end,
+                )
+                for kind, raw, key, start, end, authority in iter_citations(resource.content_extracted or '')
+            ),
+            batch_size=1000,
+        )
+
+
+def lookup(project_id, query, kind=None, limit=50):
+    """
+    Citations in a project whose key starts with the normalized query,
+    grouped by key and most cited first. Pinpoints are also matched by the
+    authority they refer to.
+    """
+    queryset = Citation.objects.filter(project_id=project_id)
+    if kind:
+        queryset = queryset.filter(kind=kind)
+    if query:
+        # Ranges rather than startswith, so every database can use the index
+        matches = Q()
+        for prefix in query_keys(query, kind):
+            matches |= Q(key__gte=prefix, key__lt=prefix + '\uffff')
+            matches |= Q(authority__gte=prefix, authority__lt=prefix + '\uffff')
+        queryset = queryset.filter(matches)
+
+    groups = (
+        queryset.values('key', 'kind')
+        .annotate(count=Count('id'), text=Min('text'))
+        .order_by('-count', 'key')[:limit]
+    )
+    return list(groups)
+
+
+def occurrences(project_id, key, limit=500):
+    """Where a citation key occurs in a project, in resource and offset order"""
+    return list(
+        Citation.objects.filter(project_id=project_id, key=key)
+        .order_by('resource_id', 'start_offset')
+        .values(
+            'resource_id', 'resource__title', 'text', 'authority', 'start_offset', 'end_offset',
+            'chunk__position', 'chunk__page_start',
+        )[:limit]
+    )
@@ -0,0 +1,341 @@
+"""
+Real-time collaborative editing of documents over WebSockets.
+
+Clients connect to ``/ws/documents/<id>/`` and share a room per document.
+Their first message must be ``{"type": "auth", "token": "<JWT access
+token>"}``, sent within ``COLLAB_AUTH_TIMEOUT`` seconds; the token is kept
+out of the URL, where proxies and servers would log it.
+
+The protocol follows ot.js: a client sends ``{"type": "op", "revision": n,
+"op": [...]}`` (see ``core.ot``) based on the last revision it has seen;
+the server transforms it past any edits it hasn't seen, applies it,
+acknowledges it with ``{"type": "ack"}`` and broadcasts it to the other
+clients. Cursor and selection changes are sent as ``{"type": "presence",
+"cursor": {...}}`` and relayed as they are.
+
+Rooms keep the document in memory. Edits are written to the database
+once the document has been quiet for ``COLLAB_SAVE_DELAY`` seconds (and
+at least every ``COLLAB_SAVE_MAX_DELAY`` seconds while edits keep coming),
+when the last client leaves, and when the server shuts down (see
+``close_rooms``). While a room is open, REST updates that change the
+document's content are refused (see ``open_room_content``), since the
+room's next save would overwrite them. Rooms live in the process that
+serves them, so run collaboration, and the REST API it guards, on one
+ASGI worker.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from . import ot
+from .metrics import registry
+from .models import Document, Project
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_PATH = re.compile(r'^/ws/documents/(?P<pk>\d+)/?$')
+
+# Messages waiting for a client before it counts as too slow and is dropped
+SEND_QUEUE_SIZE = 1000
+
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_TOO_SLOW = 4008
+CLOSE_SERVICE_RESTART = 1012
+
+collab_duration = registry.histogram(
+    'legal_writer_collab_duration_seconds',
+    'Time spent applying edits and saving documents in collaboration rooms',
+    ('event',),
+)
+
+_CLOSE = object()
+
+
+class Client:
+    def __init__(self, user):
+        self.id = uuid.uuid4().hex[:12]
+        self.user = {'id': user.pk, 'username': user.get_username()}
+        self.cursor = None
+        self.queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+
+    def describe(self):
+        return {'client_id': self.id, 'user': self.user, 'cursor': self.cursor}
+
+    def send(self, message):
+        """Queue a message (a dict, or JSON already encoded) without waiting for the socket"""
+        if self.queue.full():
+            # A client this far behind can't catch up; it reconnects and resyncs
+            self.close(CLOSE_TOO_SLOW)
+            return
+        self.queue.put_nowait(message if isinstance(message, str) else json.dumps(message))
+
+    def close(self, code=1000):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait((_CLOSE, code))
+
+    async def run_sender(self, send):
+        while True:
+            message = await self.queue.get()
+            if isinstance(message, tuple) and message[0] is _CLOSE:
+                await send({'type': 'websocket.close', 'code': message[1]})
+                return
+            await send({'type': 'websocket.send', 'text': message})
+
+
+class Room:
+    """The shared state of one document being edited"""
+
+    def __init__(self, document_id, content):
+        self.document_id = document_id
+        self.content = content
+        self.revision = 0
+        # The operations that produced the last len(history) revisions
+        self.history = deque(maxlen=settings.COLLAB_HISTORY)
+        self.clients = {}
+        self.dirty = False
+        self.first_edit = self.last_edit = None
+        self._saver = None
+
+    def broadcast(self, message, exclude=None):
+        encoded = json.dumps(message)
+        for client in list(self.clients.values()):
+            if client is not exclude:
+                client.send(encoded)
+
+    def join(self, client):
+        self.clients[client.id] = client
+        client.send({
+            'type': 'init',
+            'client_id': client.id,
+            'revision': self.revision,
+            'content': self.content,
+            'clients': [other.describe() for other in self.clients.values() if other is not client],
+        })
+        self.broadcast({'type': 'join', **client.describe()}, exclude=client)
+
+    def leave(self, client):
+        self.clients.pop(client.id, None)
+        self.broadcast({'type': 'leave', 'client_id': client.id})
+
+    def handle(self, client, text):
+        """Handle one message from a client"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            client.send({'type': 'error', 'error': 'Messages must be JSON'})
+            return
+
+        kind = message.get('type') if isinstance(message, dict) else None
+        if kind == 'op':
+            self.receive_operation(client, message)
+        elif kind == 'presence':
+            cursor = message.get('cursor')
+            client.cursor = cursor if isinstance(cursor, dict) else None
+            self.broadcast({'type': 'presence', 'client_id': client.id, 'cursor': client.cursor}, exclude=client)
+        else:
+            client.send({'type': 'error', 'error': f'Unknown message type: {kind}'})
+
+    def receive_operation(self, client, message):
+        started = time.perf_counter()
+        revision = message.get('revision')
+        oldest = self.revision - len(self.history)
+        if not isinstance(revision, int) or revision > self.revision:
+            client.send({'type': 'error', 'error': 'Invalid revision'})
+            return
+        if revision < oldest:
+            # Too far behind to transform: the client has to reload the document
+            client.send({'type': 'resync', 'revision': self.revision, 'content': self.content})
+            return
+
+        try:
+            op = ot.parse(message.get('op'))
+            for concurrent in list(self.history)[revision - oldest:]:
+                op, _ = ot.transform(op, concurrent)
+            self.content = ot.apply(op, self.content)
+        except ot.OperationError as e:
+            client.send({'type': 'error', 'error': str(e), 'revision': revision})
+            return
+
+        self.history.append(op)
+        self.revision += 1
+        for other in self.clients.values():
+            if other.cursor:
+                other.cursor = {
+                    key: ot.transform_index(op, value) if isinstance(value, int) else value
+                    for key, value in other.cursor.items()
+                }
+        client.send({'type': 'ack', 'revision': self.revision})
+        self.broadcast({'type': 'op', 'revision': self.revision, 'op': op, 'client_id': client.id}, exclude=client)
+        self.mark_dirty()
+        collab_duration.observe(time.perf_counter() - started, event='op')
+
+    def mark_dirty(self):
+        now = time.monotonic()
+        self.last_edit = now
+        if not self.dirty:
+            self.dirty = True
+            self.first_edit = now
+        if self._saver is None or self._saver.done():
+            self._saver = asyncio.create_task(self._save_when_due())
+
+    async def _save_when_due(self):
+        """Coalesce edits: save after a quiet spell, or after the maximum delay"""
+        while self.dirty:
+            due = min(self.last_edit + settings.COLLAB_SAVE_DELAY, self.first_edit + settings.COLLAB_SAVE_MAX_DELAY)
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            await self.save()
+
+    async def save(self):
+        if not self.dirty:
+            return
+        started = time.perf_counter()
+        content = self.content
+        self.dirty = False
+        try:
+            # update() so only the content and its timestamp are written
+            await Document.objects.filter(pk=self.document_id).aupdate(content=content, updated_at=timezone.now())
+        except Exception:
+            logger.exception(f"Saving document {self.document_id} failed, will retry")
+            if not self.dirty:
+                self.dirty = True
+                self.first_edit = self.last_edit = time.monotonic()
+            return
+        collab_duration.observe(time.perf_counter() - started, event='save')
+
+    async def close(self):
+        """Write any pending edits and stop the saver"""
+        if self._saver is not None:
+            self._saver.cancel()
+        await self.save()
+
+
+_rooms = {}
+_rooms_lock = asyncio.Lock()
+
+
+async def join_room(document, client):
+    async with _rooms_lock:
+        room = _rooms.get(document.pk)
+        if room is None:
+            room = _rooms[document.pk] = Room(document.pk, document.content)
+        room.join(client)
+        return room
+
+
+def open_room_content(document_id):
+    """The current content of the document's room in this process, ``None`` if it has none"""
+    room = _rooms.get(document_id)
+    return room.content if room is not None else None
+
+
+async def close_rooms():
+    """Disconnect every client and write any pending edits, e.g. when the server shuts down"""
+    async with _rooms_lock:
+        rooms = list(_rooms.values())
+    for room in rooms:
+        for client in list(room.clients.values()):
+            # Clients reconnect, to this server once it's back or to another
+            client.close(CLOSE_SERVICE_RESTART)
+    await asyncio.gather(*(room.close() for room in rooms))
+
+
+async def leave_room(room, client):
+    room.leave(client)
+    if room.clients:
+        return
+    # Stays registered while saving, so anyone joining meanwhile gets the
+    # in-memory content instead of reading the row before it's written
+    await room.close()
+    async with _rooms_lock:
+        if not room.clients and _rooms.get(room.document_id) is room:
+            del _rooms[room.document_id]
+
+
+def _authenticate(raw_token):
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def _editable_document(user, pk):
+    projects = Project.objects.filter(owner=user)
+    return Document.objects.filter(pk=pk, project__in=projects).only('pk', 'content').first()
+
+
+async def _receive_token(receive):
+    """
+    The token of the connection's first message, ``None`` if it's not an
+    auth message or doesn't come in time, or ``False`` on disconnect
+    """
+    try:
+        message = await asyncio.wait_for(receive(), settings.COLLAB_AUTH_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if message['type'] == 'websocket.disconnect':
+        return False
+    try:
+        data = json.loads(message.get('text') or message.get('bytes') or '')
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get('type') != 'auth' or not isinstance(data.get('token'), str):
+        return None
+    return data['token']
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for ``websocket`` connections"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    match = DOCUMENT_PATH.match(scope['path'])
+    if not match:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    # Browsers can't set headers on a WebSocket, so the token comes in the first message
+    await send({'type': 'websocket.accept'})
+    token = await _receive_token(receive)
+    if token is False:
+        return
+    user = await sync_to_async(_authenticate)(token) if token else None
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    document = await sync_to_async(_editable_document)(user, int(match.group('pk')))
+    if document is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    client = Client(user)
+    room = await join_room(document, client)
+    sender = asyncio.create_task(client.run_sender(send))
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] == 'websocket.receive':
+                room.handle(client, message.get('text') or (message.get('bytes') or b'').decode('utf-8', 'replace'))
+    finally:
+        sender.cancel()
+        await leave_room(room, client)
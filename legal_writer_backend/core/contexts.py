@@ -0,0 +1,150 @@
+"""
+Chat context lookup.
+
+Contexts are addressed by ids like ``note_3``, ``doc_7`` and
+``resource_12``. Listings only carry metadata; content is loaded on demand
+for the ids a client actually selected.
+
+Chat turns usually reuse the same selection, so each context's text is
+cached, keyed by its id and ``updated_at``: a repeated turn checks versions
+with one small query per type and loads only the contexts that changed, or
+are too large to cache (``CONTEXT_CACHE_MAX_CHARS``).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Length
+
+from .models import Document, Note, Resource
+
+# id prefix -> (model, context type, content field)
+CONTEXT_SOURCES = {
+    'note': (Note, 'NOTE', 'content'),
+    'doc': (Document, 'DOCUMENT', 'content'),
+    'resource': (Resource, 'RESOURCE', 'content_extracted'),
+}
+
+# Rough characters per token for English prose, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+ITERATOR_CHUNK_SIZE = 500
+
+
+def context_id(prefix, pk):
+    return f'{prefix}_{pk}'
+
+
+def estimate_tokens(size):
+    return -(-size // CHARS_PER_TOKEN)
+
+
+def parse_context_ids(ids):
+    """Group ``prefix_pk`` ids by prefix, ignoring anything malformed"""
+    grouped = {}
+    for value in ids:
+        prefix, _, pk = str(value).rpartition('_')
+        if prefix in CONTEXT_SOURCES and pk.isdigit():
+            grouped.setdefault(prefix, set()).add(int(pk))
+    return grouped
+
+
+def iter_available_contexts(project):
+    """
+    Yield metadata for every note, document and resource in a project.
+
+    Sizes are computed by the database, so no content leaves it.
+    """
+    for prefix, (model, context_type, field) in CONTEXT_SOURCES.items():
+        rows = (
+            model.objects.filter(project=project)
+            .annotate(size=Length(field))
+            .values('id', 'title', 'size', 'updated_at')
+            .order_by()
+            .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        )
+        for row in rows:
+            size = row['size'] or 0
+            yield {
+                'id': context_id(prefix, row['id']),
+                'type': context_type,
+                'title': row['title'],
+                'size': size,
+                'tokens': estimate_tokens(size),
+                'updated_at': row['updated_at'],
+            }
+
+
+def load_context_contents(ids, **filters):
+    """
+    Load full contexts for the given ids, in the order requested.
+
+    ``filters`` scope the lookup (e.g. ``project_id__in=ids``); ids that
+    don't match are left out.
+    """
+    found = {}
+    for prefix, pks in parse_context_ids(ids).items():
+        model, context_type, field = CONTEXT_SOURCES[prefix]
+        rows = (
+            model.objects.filter(pk__in=pks, **filters)
+            .values('id', 'title', 'updated_at', field)
+            .order_by()
+            .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        )
+        for row in rows:
+            key = context_id(prefix, row['id'])
+            found[key] = {
+                'id': key,
+                'type': context_type,
+                'title': row['title'],
+                'content': row[field],
+                'updated_at': row['updated_at'],
+            }
+    return [found[key] for key in dict.fromkeys(str(value) for value in ids) if key in found]
+
+
+def format_context(ctx):
+    return f"\nContext ({ctx['type']} - {ctx['title']}):\n{ctx['content']}\n"
+
+
+def context_versions(ids, **filters):
+    """``{id: updated_at}`` for the given ids that exist, without loading content"""
+    versions = {}
+    for prefix, pks in parse_context_ids(ids).items():
+        model = CONTEXT_SOURCES[prefix][0]
+        rows = model.objects.filter(pk__in=pks, **filters).values_list('id', 'updated_at').order_by()
+        for pk, updated_at in rows:
+            versions[context_id(prefix, pk)] = updated_at
+    return versions
+
+
+def _text_cache_key(key, updated_at):
+    return f'context-text:v2:{key}@{updated_at.isoformat()}'
+
+
+def assemble_contexts(ids, **filters):
+    """
+    The context text for a selection of ids, and whether all of it came
+    from the cache.
+
+    Contexts are put in id order rather than the order they were selected,
+    so the same selection always gives the same text, and the prompt prefix
+    a provider has cached stays valid.
+    """
+    versions = context_versions(ids, **filters)
+    if not versions:
+        return '', False
+    ordered = sorted(versions)
+    cache_keys = {key: _text_cache_key(key, versions[key]) for key in ordered}
+
+    cached = cache.get_many(list(cache_keys.values()))
+    texts = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+    missing = [key for key in ordered if key not in texts]
+    if missing:
+        fresh = {}
+        for ctx in load_context_contents(missing, **filters):
+            texts[ctx['id']] = text = format_context(ctx)
+            if len(text) <= settings.CONTEXT_CACHE_MAX_CHARS:
+                fresh[_text_cache_key(ctx['id'], ctx['updated_at'])] = text
+        cache.set_many(fresh, settings.CONTEXT_CACHE_TTL)
+    return ''.join(texts[key] for key in ordered if key in texts), not missing
@@ -0,0 +1,621 @@
+"""
+Per-project semantic search over chunks of resources, documents and notes.
+
+Each project's vectors live in a memory-mapped NumPy array under
+``EMBEDDING_INDEX_ROOT``, quantized to int8 with a scale per row (a
+quarter of the size of float32, and much faster to score than float16),
+next to a small array describing each row. Once a
+project has enough rows, an inverted-file (IVF) index over spherical
+k-means centroids narrows a search to the few clusters nearest the query.
+
+Indexes are synced in the background: after a resource is extracted, and
+when a search finds that a source's version (``updated_at``, or
+``last_extracted`` for resources) changed, the project is queued for a
+sync that re-embeds the changed sources and tombstones the rows of their
+previous versions. Searches never wait for a sync; they read the index as
+last committed, so edits show up in results once their sync finishes.
+``manage.py build_embeddings`` syncs ahead of time, e.g. after a bulk
+import. Embedders are pluggable through ``EMBEDDING_BACKEND``; the default
+hashed TF-IDF embedder needs no network or model files.
+"""
+import abc
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .chunks import HEADING_SEPARATOR, iter_chunks
+from .contexts import CONTEXT_SOURCES, context_id
+from .metrics import timed, timed_function
+from .models import Chunk, Document, Note, Resource
+
+logger = logging.getLogger(__name__)
+
+# Row kinds, in the order of their codes in the row array
+KINDS = ('resource', 'doc', 'note')
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+ROW_DTYPE = np.dtype([
+    ('kind', 'u1'),
+    ('source_id', 'i8'),
+    ('position', 'i4'),
+    ('start', 'i4'),
+    ('end', 'i4'),
+    ('cluster', 'i4'),
+    ('scale', 'f4'),
+    ('live', '?'),
+])
+
+# Below this many rows a search scans every vector
+IVF_MIN_ROWS = 4096
+# Rows sampled to train centroids
+IVF_TRAIN_SAMPLE = 20000
+KMEANS_ITERATIONS = 10
+# Compact once this share of rows are tombstones
+MAX_DEAD_RATIO = 0.5
+EMBED_BATCH_SIZE = 256
+INITIAL_CAPACITY = 1024
+
+
+class Embedder(abc.ABC):
+    """Turns texts into L2-normalized float32 vectors of ``dim`` dimensions"""
+    name = None
+    dim = None
+    # Whether searches should weight query terms by inverse document frequency
+    uses_idf = False
+
+    @abc.abstractmethod
+    def embed(self, texts):
+        """A ``(len(texts), dim)`` float32 array with one normalized vector per text"""
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were which with'.split()
+)
+
+
+class HashedTfidfEmbedder(Embedder):
+    """
+    Unigrams and bigrams hashed into a fixed number of signed buckets, with
+    sublinear term frequencies. Document frequencies per bucket are kept by
+    the index and applied to queries, giving TF-IDF ranking without a
+    vocabulary.
+    """
+    uses_idf = True
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f'hashed-tfidf-{dim}'
+
+    @staticmethod
+    @lru_cache(maxsize=1 << 18)
+    def _bucket(term, dim):
+        digest = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+        return digest % dim, 1.0 if digest >> 63 else -1.0
+
+    def _terms(self, text):
+        words = [word for word in TOKEN.findall(text.lower()) if word not in STOPWORDS]
+        return words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, count in Counter(self._terms(text)).items():
+                bucket, sign = self._bucket(term, self.dim)
+                vectors[row, bucket] += sign * (1.0 + np.log(count))
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI's embeddings endpoint; needs network access and an API key"""
+
+    def __init__(self, model='text-embedding-3-small', dim=1536):
+        self.model = model
+        self.dim = dim
+        self.name = f'openai-{model}-{dim}'
+
+    def embed(self, texts):
+        import openai
+
+        response = openai.Embedding.create(model=self.model, input=list(texts))
+        data = sorted(response['data'], key=lambda item: item['index'])
+        return _normalize(np.array([item['embedding'] for item in data], dtype=np.float32))
+
+
+@lru_cache(maxsize=None)
+def get_embedder():
+    backend = settings.EMBEDDING_BACKEND
+    if isinstance(backend, str):
+        return import_string(backend)()
+    return import_string(backend['class'])(**backend.get('options', {}))
+
+
+def _spherical_kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        members = np.zeros((clusters, len(vectors)), dtype=np.float32)
+        members[assignments, np.arange(len(vectors))] = 1
+        sums = members @ vectors
+        empty = members.sum(axis=1) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def source_versions(project_id):
+    """``{source key: version}`` for everything in a project that can be searched"""
+    versions = {}
+    for pk, updated_at in Document.objects.filter(project_id=project_id).values_list('id', 'updated_at'):
+        versions[context_id('doc', pk)] = updated_at.isoformat()
+    for pk, updated_at in Note.objects.filter(project_id=project_id).values_list('id', 'updated_at'):
+        versions[context_id('note', pk)] = updated_at.isoformat()
+    resources = Resource.objects.filter(project_id=project_id, last_extracted__isnull=False)
+    for pk, last_extracted in resources.values_list('id', 'last_extracted'):
+        versions[context_id('resource', pk)] = last_extracted.isoformat()
+    return versions
+
+
+def _split_key(key):
+    kind, _, pk = key.rpartition('_')
+    return kind, int(pk)
+
+
+def iter_source_chunks(keys):
+    """Yield ``(key, position, start, end, text)`` for the chunks of the given sources"""
+    grouped = {}
+    for key in keys:
+        kind, pk = _split_key(key)
+        grouped.setdefault(kind, []).append(pk)
+
+    for kind in ('doc', 'note'):
+        model, _, field = CONTEXT_SOURCES[kind]
+        for pk, content in model.objects.filter(pk__in=grouped.get(kind, ())).values_list('id', field).iterator():
+            for position, chunk in enumerate(iter_chunks(content or '')):
+                yield (context_id(kind, pk), position, chunk['start_offset'], chunk['end_offset'],
+                       _chunk_text(chunk['heading_path'], chunk['content']))
+
+    rows = (
+        Chunk.objects.filter(resource_id__in=grouped.get('resource', ()))
+        .order_by('resource_id', 'position')
+        .values_list('resource_id', 'position', 'start_offset', 'end_offset', 'heading_path', 'content')
+        .iterator(chunk_size=1000)
+    )
+    for pk, position, start, end, heading_path, content in rows:
+        yield context_id('resource', pk), position, start, end, _chunk_text(heading_path, content)
+
+
+def _chunk_text(heading_path, content):
+    # Headings carry much of a chunk's meaning in legal documents
+    return f'{heading_path.replace(HEADING_SEPARATOR, " / ")}\n{content}' if heading_path else content
+
+
+class ProjectIndex:
+    """
+    The vector index of one project. Searches go through ``get_index`` and
+    hold ``lock``; syncs use an instance of their own (see ``sync_project``)
+    and only become visible to searches when ``_save`` commits them.
+    """
+
+    def __init__(self, project_id, embedder):
+        self.project_id = project_id
+        self.embedder = embedder
+        self.path = os.path.join(settings.EMBEDDING_INDEX_ROOT, f'project-{project_id}')
+        self.lock = threading.Lock()
+        self._loaded_mtime = None
+        # Vectors file written by this sync, renamed into place on commit
+        self._pending_vectors = None
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _file_lock(self, name, operation):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(name), 'w') as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    def _manifest_mtime(self):
+        try:
+            return os.path.getmtime(self._file('manifest.json'))
+        except OSError:
+            return None
+
+    def _clear(self):
+        self.manifest = {'embedder': self.embedder.name, 'count': 0, 'trained_count': 0, 'sources': {}}
+        self.vectors = None
+        self.rows = np.zeros(0, dtype=ROW_DTYPE)
+        self.centroids = None
+        self.df = np.zeros(self.embedder.dim, dtype=np.int64)
+
+    def _load(self):
+        self._clear()
+        mtime = self._manifest_mtime()
+        if mtime is None:
+            self._loaded_mtime = None
+            return
+
+        # Shared with other readers, never while a sync is committing
+        with self._file_lock('.commit', fcntl.LOCK_SH):
+            mtime = self._manifest_mtime()
+            with open(self._file('manifest.json')) as f:
+                manifest = json.load(f)
+            if manifest.get('embedder') == self.embedder.name:
+                self.manifest = manifest
+                # A sync that found only empty sources writes no vectors
+                if self.count:
+                    self.vectors = np.load(self._file('vectors.npy'), mmap_mode='r+')
+                self.rows = np.load(self._file('rows.npy'))
+                self.df = np.load(self._file('df.npy'))
+                if os.path.exists(self._file('centroids.npy')):
+                    self.centroids = np.load(self._file('centroids.npy'))
+            else:
+                logger.info(f"Embedder changed for project {self.project_id}, rebuilding its index")
+        self._loaded_mtime = mtime
+
+    def refresh(self):
+        """Load the last committed index if a sync committed since this one was loaded"""
+        if self._manifest_mtime() != self._loaded_mtime:
+            self._load()
+
+    def is_stale(self):
+        """Whether any source changed since the index was last synced"""
+        return self._diff(source_versions(self.project_id)) != ([], [])
+
+    @property
+    def count(self):
+        return self.manifest['count']
+
+    def _ensure_capacity(self, extra):
+        needed = self.count + extra
+        capacity = len(self.rows)
+        if needed <= capacity:
+            return
+        capacity = max(capacity * 2, needed, INITIAL_CAPACITY)
+        os.makedirs(self.path, exist_ok=True)
+
+        # A new file, so searches keep reading the committed one until _save
+        fd, tmp = tempfile.mkstemp(prefix='vectors.', suffix='.tmp.npy', dir=self.path)
+        os.close(fd)
+        vectors = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.int8, shape=(capacity, self.embedder.dim))
+        if self.vectors is not None:
+            vectors[:self.count] = self.vectors[:self.count]
+        if self._pending_vectors is not None:
+            os.remove(self._pending_vectors)
+        self.vectors = vectors
+        self._pending_vectors = tmp
+
+        rows = np.zeros(capacity, dtype=ROW_DTYPE)
+        rows[:self.count] = self.rows[:self.count]
+        self.rows = rows
+
+    def _dequantize(self, rows):
+        """float32 vectors for the given row indexes or slice"""
+        return self.vectors[rows].astype(np.float32) * self.rows['scale'][rows][:, None]
+
+    def _assign(self, vectors):
+        if self.centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _append(self, entries, vectors):
+        self._ensure_capacity(len(entries))
+        start = self.count
+        end = start + len(entries)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        self.vectors[start:end] = np.rint(vectors / scales[:, None]).astype(np.int8)
+        rows = self.rows[start:end]
+        rows['scale'] = scales
+        for row, (key, position, chunk_start, chunk_end) in zip(rows, entries):
+            kind, pk = _split_key(key)
+            row['kind'], row['source_id'] = KIND_CODES[kind], pk
+            row['position'], row['start'], row['end'] = position, chunk_start, chunk_end
+            row['live'] = True
+        rows['cluster'] = self._assign(vectors)
+        self.df += np.count_nonzero(vectors, axis=0)
+        self.manifest['count'] = end
+        return range(start, end)
+
+    def _remove(self, key):
+        source = self.manifest['sources'].pop(key, None)
+        if not source:
+            return
+        first, last = source['rows']
+        if first == last or self.vectors is None:
+            # The source had no chunks, or the index has no vectors yet
+            return
+        live = self.rows['live'][first:last]
+        self.df -= np.count_nonzero(self.vectors[first:last][live], axis=0)
+        self.rows['live'][first:last] = False
+
+    def _compact(self):
+        live = np.flatnonzero(self.rows['live'][:self.count])
+        remap = np.full(self.count, -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        for source in self.manifest['sources'].values():
+            first, last = source['rows']
+            kept = remap[first:last]
+            kept = kept[kept >= 0]
+            source['rows'] = [int(kept[0]), int(kept[-1]) + 1] if len(kept) else [0, 0]
+
+        vectors = np.array(self.vectors[live])
+        rows = self.rows[live]
+        self.rows = np.zeros(0, dtype=ROW_DTYPE)
+        self.vectors = None
+        self.manifest['count'] = 0
+        if not len(live):
+            return
+        self._ensure_capacity(len(live))
+        self.vectors[:len(live)] = vectors
+        self.rows[:len(live)] = rows
+        self.manifest['count'] = len(live)
+
+    def _train(self):
+        live = np.flatnonzero(self.rows['live'][:self.count])
+        clusters = max(int(np.sqrt(len(live))), 1)
+        rng = np.random.default_rng(self.project_id)
+        sample = live if len(live) <= IVF_TRAIN_SAMPLE else rng.choice(live, IVF_TRAIN_SAMPLE, replace=False)
+        self.centroids = _spherical_kmeans(self._dequantize(np.sort(sample)), clusters)
+        for start in range(0, self.count, 8192):
+            batch = slice(start, min(start + 8192, self.count))
+            self.rows['cluster'][batch] = self._assign(self._dequantize(batch))
+        self.manifest['trained_count'] = len(live)
+
+    def _save(self):
+        """Commit the index: searches see all of it from now on, or none of it before"""
+        if self.vectors is not None:
+            self.vectors.flush()
+        with self._file_lock('.commit', fcntl.LOCK_EX):
+            if self._pending_vectors is not None:
+                os.replace(self._pending_vectors, self._file('vectors.npy'))
+                self._pending_vectors = None
+            for name, array in (('rows', self.rows), ('df', self.df), ('centroids', self.centroids)):
+                if array is None:
+                    if os.path.exists(self._file(f'{name}.npy')):
+                        os.remove(self._file(f'{name}.npy'))
+                    continue
+                tmp = self._file(f'{name}.tmp.npy')
+                np.save(tmp, array)
+                os.replace(tmp, self._file(f'{name}.npy'))
+            tmp = self._file('manifest.tmp.json')
+            with open(tmp, 'w') as f:
+                json.dump(self.manifest, f)
+            os.replace(tmp, self._file('manifest.json'))
+            self._loaded_mtime = self._manifest_mtime()
+
+    def _diff(self, versions):
+        indexed = self.manifest['sources']
+        stale = [key for key, source in indexed.items() if versions.get(key) != source['version']]
+        changed = [key for key, version in versions.items() if indexed.get(key, {}).get('version') != version]
+        return stale, changed
+
+    @timed_function('embed')
+    def sync(self, rebuild=False):
+        """
+        Re-embed sources that changed since the last sync, or all of them
+        with ``rebuild``; returns the number of chunks embedded
+        """
+        self.refresh()
+        versions = source_versions(self.project_id)
+        if not rebuild and self._diff(versions) == ([], []):
+            return 0
+
+        # Other threads and processes may be syncing the same project
+        with self._file_lock('.lock', fcntl.LOCK_EX):
+            if rebuild:
+                self._clear()
+            else:
+                self.refresh()
+            stale, changed = self._diff(versions)
+            for key in stale:
+                self._remove(key)
+
+            embedded = 0
+            spans = {}
+            batch = []
+
+            def flush():
+                vectors = self.embedder.embed([text for *_, text in batch])
+                rows = self._append([entry[:4] for entry in batch], vectors)
+                for (key, *_), row in zip(batch, rows):
+                    first, _ = spans.get(key, (row, row))
+                    spans[key] = (first, row + 1)
+                batch.clear()
+
+            for entry in iter_source_chunks(changed):
+                batch.append(entry)
+                embedded += 1
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+
+            for key in changed:
+                self.manifest['sources'][key] = {'version': versions[key], 'rows': list(spans.get(key, (0, 0)))}
+
+            live = int(self.rows['live'][:self.count].sum())
+            if self.count and 1 - live / self.count > MAX_DEAD_RATIO:
+                self._compact()
+            if live >= IVF_MIN_ROWS and (self.centroids is None or live >= 2 * self.manifest['trained_count']):
+                self._train()
+            self._save()
+        return embedded
+
+    def _idf(self):
+        live = max(int(self.rows['live'][:self.count].sum()), 1)
+        return (np.log((live + 1) / (self.df + 1)) + 1).astype(np.float32)
+
+    def search(self, query, k=10, kinds=None):
+        """Return ``(row, score)`` pairs for the ``k`` chunks closest to the query"""
+        if not self.count:
+            return []
+
+        with timed('embed'):
+            q = self.embedder.embed([query])[0]
+        if self.embedder.uses_idf:
+            q = q * self._idf()
+            norm = np.linalg.norm(q)
+            if norm:
+                q /= norm
+
+        rows = self.rows[:self.count]
+        mask = rows['live'].copy()
+        if kinds:
+            mask &= np.isin(rows['kind'], [KIND_CODES[kind] for kind in kinds])
+        if self.centroids is not None:
+            probe = np.argsort(-(self.centroids @ q))[:settings.EMBEDDING_NPROBE]
+            mask &= np.isin(rows['cluster'], probe)
+
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        scores = (self.vectors[candidates].astype(np.float32) @ q) * rows['scale'][candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top])]
+        return [(rows[candidates[i]], float(scores[i])) for i in top]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+_sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding-sync')
+# Projects queued for a sync that hasn't started yet
+_pending_syncs = set()
+_pending_lock = threading.Lock()
+
+
+def get_index(project_id):
+    embedder = get_embedder()
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is None or index.embedder is not embedder:
+            index = _indexes[project_id] = ProjectIndex(project_id, embedder)
+        return index
+
+
+def sync_project(project_id, rebuild=False):
+    """Sync a project's index and return ``(chunks embedded, rows indexed)``"""
+    index = ProjectIndex(project_id, get_embedder())
+    embedded = index.sync(rebuild=rebuild)
+    return embedded, index.count
+
+
+def _sync_in_background(project_id):
+    with _pending_lock:
+        # Changes made from now on need another sync
+        _pending_syncs.discard(project_id)
+    try:
+        sync_project(project_id)
+    except Exception:
+        logger.exception(f"Syncing the index of project {project_id} failed")
+    finally:
+        connection.close()
+
+
+def schedule_sync(project_id):
+    """Queue a background sync of a project's index, unless one is already waiting"""
+    with _pending_lock:
+        if project_id in _pending_syncs:
+            return
+        _pending_syncs.add(project_id)
+    _sync_executor.submit(_sync_in_background, project_id)
+
+
+def delete_index(sender, instance, **kwargs):
+    """post_delete receiver for Project"""
+    with _indexes_lock:
+        _indexes.pop(instance.pk, None)
+    shutil.rmtree(os.path.join(settings.EMBEDDING_INDEX_ROOT, f'project-{instance.pk}'), ignore_errors=True)
+
+
+def _snippets(results, length=300):
+    """Look up titles and text for search results with one query per kind"""
+    wanted = {}
+    for row, _ in results:
+        wanted.setdefault(KINDS[row['kind']], set()).add(int(row['source_id']))
+
+    titles, texts = {}, {}
+    for kind, pks in wanted.items():
+        model, _, field = CONTEXT_SOURCES[kind]
+        fields = ('id', 'title') if kind == 'resource' else ('id', 'title', field)
+        for values in model.objects.filter(pk__in=pks).values_list(*fields):
+            titles[(kind, values[0])] = values[1]
+            if kind != 'resource':
+                texts[(kind, values[0])] = values[2] or ''
+
+    chunks = {}
+    resource_rows = [row for row, _ in results if KINDS[row['kind']] == 'resource']
+    if resource_rows:
+        positions = {(int(row['source_id']), int(row['position'])) for row in resource_rows}
+        queryset = Chunk.objects.filter(resource_id__in={pk for pk, _ in positions}, position__in={p for _, p in positions})
+        for pk, position, content in queryset.values_list('resource_id', 'position', 'content'):
+            chunks[(pk, position)] = content
+
+    def snippet(row):
+        kind, pk = KINDS[row['kind']], int(row['source_id'])
+        if kind == 'resource':
+            return chunks.get((pk, int(row['position'])), '')[:length]
+        return texts.get((kind, pk), '')[row['start']:row['end']][:length]
+
+    return titles, snippet
+
+
+def search_project(project_id, query, k=10, kinds=None):
+    """
+    Return a project's ``k`` best matches for ``query`` from its last
+    committed index, queueing a sync if sources changed since
+    """
+    index = get_index(project_id)
+    with index.lock:
+        index.refresh()
+        stale = index.is_stale()
+        results = index.search(query, k=k, kinds=kinds)
+    if stale:
+        schedule_sync(project_id)
+
+    titles, snippet = _snippets(results)
+    matches = []
+    for row, score in results:
+        kind, pk = KINDS[row['kind']], int(row['source_id'])
+        if score <= 0 or (kind, pk) not in titles:
+            # Unrelated, or deleted since the last sync
+            continue
+        matches.append({
+            'id': context_id(kind, pk),
+            'type': CONTEXT_SOURCES[kind][1],
+            'title': titles[(kind, pk)],
+            'position': int(row['position']),
+            'start_offset': int(row['start']),
+            'end_offset': int(row['end']),
+            'score': round(score, 4),
+            'snippet': snippet(row),
+        })
+    return matches
@@ -0,0 +1,385 @@
+"""
+Text extraction, by MIME type.
+
+Each extractor is a generator registered for one or more MIME types that
+yields markdown chunks as it reads the file, so large Word documents, RTF
+files and transcripts are converted incrementally instead of being loaded
+whole. New formats plug in with ``@register('mime/type')``; extractors of
+paged formats yield ``PAGE_BREAK`` where each page starts.
+"""
+import codecs
+import os
+import re
+import shutil
+import subprocess
+import zipfile
+from typing import NamedTuple
+from xml.etree.ElementTree import iterparse
+
+from .metrics import timed_function
+from .utils import PAGE_BREAK, extract_pdf_pages, get_file_type
+
+# Characters (or bytes) read from a file at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# What libmagic reports for containers and files it can't place; for these
+# the file extension decides instead
+GENERIC_TYPES = {'application/octet-stream', 'application/zip', 'application/x-empty', 'inode/x-empty'}
+
+EXTENSION_TYPES = {
+    '.pdf': 'application/pdf',
+    '.docx': DOCX_TYPE,
+    '.doc': 'application/msword',
+    '.rtf': 'text/rtf',
+    '.txt': 'text/plain',
+    '.md': 'text/markdown',
+}
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+class Extraction(NamedTuple):
+    text: str
+    # Offset in ``text`` at which each page starts; empty for formats without pages
+    page_offsets: list
+
+
+class ExtractorRegistry:
+    def __init__(self):
+        self._extractors = {}
+
+    def register(self, *mime_types):
+        """Decorator registering a generator of markdown chunks for the given types"""
+        def decorator(func):
+            for mime_type in mime_types:
+                self._extractors[mime_type] = func
+            return func
+        return decorator
+
+    def get(self, mime_type):
+        return self._extractors.get(mime_type.split(';')[0].strip().lower())
+
+    @property
+    def mime_types(self):
+        return sorted(self._extractors)
+
+
+registry = ExtractorRegistry()
+register = registry.register
+
+
+def detect_mime_type(file_path):
+    mime_type = get_file_type(file_path).split(';')[0].strip().lower()
+    if mime_type in GENERIC_TYPES:
+        extension = os.path.splitext(file_path)[1].lower()
+        mime_type = EXTENSION_TYPES.get(extension, mime_type)
+    return mime_type
+
+
+def is_supported(file_path):
+    return registry.get(detect_mime_type(file_path)) is not None
+
+
+def extract_chunks(file_path):
+    """Yield the markdown for a file chunk by chunk"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    mime_type = detect_mime_type(file_path)
+    extractor = registry.get(mime_type)
+    if extractor is None:
+        raise UnsupportedFileType(f'Unsupported file type: {mime_type}')
+    yield from extractor(file_path)
+
+
+@timed_function('extract')
+def extract_file(file_path):
+    """Extract a file's text as markdown with the extractor for its type"""
+    parts = []
+    page_offsets = []
+    length = 0
+    for chunk in extract_chunks(file_path):
+        if chunk == PAGE_BREAK:
+            page_offsets.append(length)
+            continue
+        parts.append(chunk)
+        length += len(chunk)
+
+    text = ''.join(parts)
+    leading = len(text) - len(text.lstrip())
+    text = text.strip()
+    page_offsets = [min(max(offset - leading, 0), len(text)) for offset in page_offsets]
+    return Extraction(text, page_offsets)
+
+
+@register('application/pdf')
+def extract_pdf(file_path):
+    emitted = False
+    for page in extract_pdf_pages(file_path):
+        if emitted and page:
+            yield '\n\n'
+        yield PAGE_BREAK
+        if page:
+            yield page
+            emitted = True
+
+
+def _sniff_encoding(sample):
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is fine
+        if e.start < len(sample) - 3:
+            return 'cp1252'
+    return 'utf-8'
+
+
+@register('text/plain', 'text/markdown', 'text/x-markdown')
+def extract_text(file_path):
+    """Plain text, decoded a chunk at a time"""
+    with open(file_path, 'rb') as f:
+        encoding = _sniff_encoding(f.read(READ_CHUNK_SIZE))
+    with open(file_path, encoding=encoding, errors='replace') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), ''):
+            yield chunk.replace('\x00', '')
+
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+HEADING_STYLE = re.compile(r'^(?:heading|titre|berschrift)\s*(\d)$', re.IGNORECASE)
+
+
+def _docx_paragraph(p):
+    """Markdown for one ``w:p`` element"""
+    parts = []
+    for node in p.iter():
+        if node.tag == f'{W}t':
+            parts.append(node.text or '')
+        elif node.tag == f'{W}tab':
+            parts.append('\t')
+        elif node.tag in (f'{W}br', f'{W}cr'):
+            parts.append('\n')
+    text = ''.join(parts).strip()
+    if not text:
+        return ''
+
+    properties = p.find(f'{W}pPr')
+    if properties is not None:
+        style = properties.find(f'{W}pStyle')
+        style = style.get(f'{W}val', '') if style is not None else ''
+        heading = HEADING_STYLE.match(style)
+        if style.lower() == 'title':
+            return f'# {text}'
+        if heading:
+            return f"{'#' * min(int(heading.group(1)), 6)} {text}"
+        numbering = properties.find(f'{W}numPr')
+        if numbering is not None:
+            level = numbering.find(f'{W}ilvl')
+            level = int(level.get(f'{W}val', '0')) if level is not None else 0
+            return f"{'  ' * level}- {text}"
+    return text
+
+
+def _markdown_table(rows):
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + '---|' * width]
+    lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+    return '\n'.join(lines)
+
+
+@register(DOCX_TYPE)
+def extract_docx(file_path):
+    """Word documents, streamed from ``word/document.xml`` one paragraph or table at a time"""
+    with zipfile.ZipFile(file_path) as archive:
+        try:
+            document = archive.open('word/document.xml')
+        except KeyError:
+            raise ValueError('Not a Word document: word/document.xml is missing')
+
+        with document:
+            # Stack of tables being read; each is a list of rows of cells
+            tables = []
+            for event, elem in iterparse(document, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == f'{W}tbl':
+                        tables.append([])
+                    elif elem.tag == f'{W}tr' and tables:
+                        tables[-1].append([])
+                    elif elem.tag == f'{W}tc' and tables and tables[-1]:
+                        tables[-1][-1].append([])
+                    continue
+
+                if elem.tag == f'{W}p':
+                    text = _docx_paragraph(elem)
+                    if tables and tables[-1] and tables[-1][-1]:
+                        if text:
+                            tables[-1][-1][-1].append(text)
+                    elif text:
+                        yield text + '\n\n'
+                    elem.clear()
+                elif elem.tag == f'{W}tc' and tables and tables[-1] and tables[-1][-1]:
+                    cell = tables[-1][-1].pop()
+                    tables[-1][-1].append(' '.join(cell).replace('|', '\\|').replace('\n', ' '))
+                    elem.clear()
+                elif elem.tag == f'{W}tbl' and tables:
+                    rows = [row for row in tables.pop() if row]
+                    if not rows:
+                        continue
+                    if tables and tables[-1] and tables[-1][-1]:
+                        # A nested table is flattened into the enclosing cell
+                        tables[-1][-1][-1].append(' '.join(' '.join(row) for row in rows))
+                    else:
+                        yield _markdown_table(rows) + '\n\n'
+                    elem.clear()
+
+
+@register('application/msword')
+def extract_doc(file_path):
+    """Legacy binary Word documents, through ``antiword`` when it is installed"""
+    antiword = shutil.which('antiword')
+    if antiword is None:
+        raise UnsupportedFileType('Legacy .doc files need antiword installed on the server')
+
+    process = subprocess.Popen([antiword, '-w', '0', file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        reader = codecs.getreader('utf-8')(process.stdout, errors='replace')
+        for chunk in iter(lambda: reader.read(READ_CHUNK_SIZE), ''):
+            yield chunk
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', 'replace')
+        process.stderr.close()
+        if process.wait() != 0:
+            raise ValueError(f"antiword failed: {stderr.strip()}")
+
+
+RTF_TOKEN = re.compile(
+    r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-fA-F]{2})|\\([^a-zA-Z'])|([{}])|[\r\n]+|([^\\{}\r\n]+)"
+)
+# Groups whose content is never document text
+RTF_DESTINATIONS = {
+    'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'object', 'header', 'headerl', 'headerr',
+    'headerf', 'footer', 'footerl', 'footerr', 'footerf', 'listtable', 'listoverridetable',
+    'rsidtbl', 'generator', 'xmlnstbl', 'themedata', 'colorschememapping', 'datastore',
+    'latentstyles', 'fldinst', 'filetbl', 'revtbl', 'fldtype', 'bkmkstart',
+    'bkmkend', 'private', 'userprops', 'mmathPr', 'pgdsctbl', 'wgrffmtfilter',
+}
+RTF_WORDS = {
+    'par': '\n\n', 'sect': '\n\n', 'page': '\n\n', 'line': '\n', 'row': '\n', 'cell': ' | ',
+    'tab': '\t', 'emdash': '\u2014', 'endash': '\u2013', 'lquote': '\u2018', 'rquote': '\u2019',
+    'ldblquote': '\u201c', 'rdblquote': '\u201d', 'bullet': '\u2022', 'emspace': ' ', 'enspace': ' ',
+}
+RTF_SYMBOLS = {'~': '\u00a0', '-': '', '_': '-', '\\': '\\', '{': '{', '}': '}', '\n': '\n\n', '\r': '\n\n'}
+
+
+class RTFReader:
+    """Incremental RTF to text conversion; feed it text and collect the output"""
+
+    def __init__(self):
+        self.stack = []
+        self.ignorable = False
+        self.uc_skip = 1
+        self.pending_skip = 0
+        self.codec = 'cp1252'
+
+    def feed(self, data):
+        out = []
+        for match in RTF_TOKEN.finditer(data):
+            word, arg, hex_code, symbol, brace, text = match.groups()
+            if brace == '{':
+                self.stack.append((self.ignorable, self.uc_skip))
+            elif brace == '}':
+                if self.stack:
+                    self.ignorable, self.uc_skip = self.stack.pop()
+            elif word:
+                self._control_word(word, arg, out)
+            elif hex_code:
+                if self.pending_skip:
+                    self.pending_skip -= 1
+                elif not self.ignorable:
+                    out.append(bytes([int(hex_code, 16)]).decode(self.codec, 'replace'))
+            elif symbol:
+                if symbol == '*':
+                    self.ignorable = True
+                elif not self.ignorable:
+                    out.append(RTF_SYMBOLS.get(symbol, ''))
+            elif text and not self.ignorable:
+                if self.pending_skip:
+                    skipped = min(self.pending_skip, len(text))
+                    self.pending_skip -= skipped
+                    text = text[skipped:]
+                out.append(text)
+        return ''.join(out)
+
+    def _control_word(self, word, arg, out):
+        if word in RTF_DESTINATIONS:
+            self.ignorable = True
+        elif word == 'ansicpg' and arg:
+            try:
+                self.codec = codecs.lookup(f'cp{arg}').name
+            except LookupError:
+                pass
+        elif word == 'uc' and arg:
+            self.uc_skip = int(arg)
+        elif self.ignorable:
+            return
+        elif word == 'u' and arg:
+            code = int(arg)
+            out.append(chr(code + 65536 if code < 0 else code))
+            self.pending_skip = self.uc_skip
+        elif word in RTF_WORDS:
+            out.append(RTF_WORDS[word])
+
+
+def _rtf_safe_end(buffer):
+    """Where a buffer can be cut without splitting a control word or escape"""
+    end = buffer.rfind('\\')
+    if end == -1 or end < len(buffer) - 48:
+        return len(buffer)
+    while end > 0 and buffer[end - 1] == '\\':
+        end -= 1
+    return end
+
+
+def _collapse_blank_lines(pieces):
+    """Collapse runs of blank lines in streamed text, including runs split between pieces"""
+    trailing = 0
+    for text in pieces:
+        text = re.sub(r'\n{3,}', '\n\n', text)
+        leading = len(text) - len(text.lstrip('\n'))
+        if trailing + leading > 2:
+            text = text[min(leading, trailing + leading - 2):]
+        if not text:
+            continue
+        body = text.rstrip('\n')
+        trailing = trailing + len(text) if not body else len(text) - len(body)
+        yield text
+
+
+def _rtf_pieces(file_path):
+    reader = RTFReader()
+    buffer = ''
+    # RTF is 7-bit; latin-1 maps any stray 8-bit bytes one-to-one
+    with open(file_path, encoding='latin-1', newline='') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), ''):
+            buffer += chunk
+            end = _rtf_safe_end(buffer)
+            text, buffer = reader.feed(buffer[:end]), buffer[end:]
+            if text:
+                yield text
+        if buffer:
+            yield reader.feed(buffer)
+
+
+@register('text/rtf', 'application/rtf')
+def extract_rtf(file_path):
+    """RTF documents, tokenized a chunk at a time"""
+    yield from _collapse_blank_lines(_rtf_pieces(file_path))
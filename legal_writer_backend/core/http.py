@@ -0,0 +1,260 @@
+import hashlib
+import mimetypes
+import os
+import re
+from calendar import timegm
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import content_disposition_header, http_date
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 200
+
+# Read size used when Python has to stream a byte range itself
+FILE_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ACCEPTS_BR_RE = re.compile(r'\bbr\b')
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be satisfied for the given size"""
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the given version markers"""
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def latest_timestamp(*values):
+    """Return the most recent of the given datetimes, ignoring empty ones"""
+    values = [value for value in values if value]
+    return max(values) if values else None
+
+
+def conditional_response(request, etag=None, last_modified=None):
+    """Return a 304/412 response if the request's preconditions say so, else None"""
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Attach ETag and Last-Modified headers to a response"""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return response
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single ``bytes=`` range into an inclusive (start, end) pair.
+
+    Returns None when there is no usable range (absent, malformed or
+    multi-range headers are served in full) and raises RangeNotSatisfiable
+    when the range lies outside the representation.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def requested_range(request, size, etag=None):
+    """Resolve the byte range for a request, honouring If-Range"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and etag and if_range.strip() != etag:
+        # The client's copy is stale, so it gets the full representation
+        return None
+    return parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+
+def range_not_satisfiable_response(size):
+    """Build a 416 response for a representation of the given size"""
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{size}'
+    return response
+
+
+def choose_encoding(request):
+    """Pick the best content coding the client accepts, or None"""
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if brotli is not None and ACCEPTS_BR_RE.search(accept_encoding):
+        return 'br'
+    if ACCEPTS_GZIP_RE.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+def compress_payload(payload, encoding):
+    """Compress bytes with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(payload, quality=5)
+    return compress_string(payload)
+
+
+def content_response(request, payload, content_type, etag=None, last_modified=None):
+    """
+    Serve an in-memory payload with Range support and gzip/brotli compression.
+
+    Range requests are answered from the identity encoding so that byte
+    offsets always refer to the uncompressed text.
+    """
+    size = len(payload)
+    try:
+        byte_range = requested_range(request, size, etag)
+    except RangeNotSatisfiable:
+        return range_not_satisfiable_response(size)
+
+    if byte_range is not None:
+        start, end = byte_range
+        response = HttpResponse(payload[start:end + 1], content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = HttpResponse(content_type=content_type)
+        encoding = choose_encoding(request) if size >= MIN_COMPRESS_SIZE else None
+        if encoding:
+            payload = compress_payload(payload, encoding)
+            response['Content-Encoding'] = encoding
+            # Compressed bytes differ from the identity ones, so the
+            # validator is only weakly equivalent
+            if etag:
+                etag = f'W/{etag}'
+        response.content = payload
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    response['Accept-Ranges'] = 'bytes'
+    return set_validators(response, etag, last_modified)
+
+
+def iter_file_range(path, start, end, chunk_size=FILE_CHUNK_SIZE):
+    """Yield the inclusive byte range [start, end] of a file in chunks"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def iterate_in_thread(iterator, thread_sensitive=True):
+    """
+    Step a blocking iterator from a thread, one item at a time. Under ASGI
+    Django reads a synchronous streaming iterator to the end before sending
+    anything, so streams that must start early or stay small in memory are
+    handed over as this async iterator instead.
+    """
+    iterator = iter(iterator)
+    step = sync_to_async(next, thread_sensitive=thread_sensitive)
+    done = object()
+    try:
+        while True:
+            item = await step(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=thread_sensitive)()
+
+
+def is_asgi(request):
+    """Whether the request (or the HttpRequest a DRF request wraps) is served over ASGI"""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def streaming_content(request, iterator, thread_sensitive=True):
+    """Content for a StreamingHttpResponse that streams under both WSGI and ASGI"""
+    if is_asgi(request):
+        return iterate_in_thread(iterator, thread_sensitive=thread_sensitive)
+    return iterator
+
+
+def file_download_response(request, path, filename, etag=None, last_modified=None, as_attachment=True):
+    """
+    Serve a file from MEDIA_ROOT without reading it through Python where possible.
+
+    With FILE_DOWNLOAD_BACKEND set to ``nginx`` or ``sendfile`` the web server
+    is told to send the file itself (X-Accel-Redirect / X-Sendfile) and
+    handles ranges; use one of those in production, and always under ASGI.
+    The ``python`` fallback streams with FileResponse under WSGI, which lets
+    the server use its zero-copy file wrapper, reads in chunks from a thread
+    under ASGI, and answers single byte ranges from a chunked reader.
+    """
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    disposition = content_disposition_header(as_attachment, filename)
+    backend = settings.FILE_DOWNLOAD_BACKEND
+
+    if backend in ('nginx', 'sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            relative_path = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_INTERNAL_URL + quote(relative_path)
+        else:
+            response['X-Sendfile'] = os.fspath(path)
+        response['Content-Disposition'] = disposition
+        return set_validators(response, etag, last_modified)
+
+    size = os.path.getsize(path)
+    try:
+        byte_range = requested_range(request, size, etag)
+    except RangeNotSatisfiable:
+        return range_not_satisfiable_response(size)
+
+    asgi = is_asgi(request)
+    if byte_range is None and not asgi:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif byte_range is None:
+        # FileResponse would be read whole before the first byte is sent
+        response = StreamingHttpResponse(
+            iterate_in_thread(iter_file_range(path, 0, size - 1), thread_sensitive=False), content_type=content_type,
+        )
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            streaming_content(request, iter_file_range(path, start, end), thread_sensitive=False),
+            content_type=content_type, status=206,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Content-Disposition'] = disposition
+    response['Accept-Ranges'] = 'bytes'
+    return set_validators(response, etag, last_modified)
@@ -0,0 +1,194 @@
+"""
+Model routing for LLM calls.
+
+Callers name a task (``chat``, ``summarize``, ``suggest``) rather than a
+model. ``LLM_ROUTES`` lists the tiers each task may use, smallest first,
+and ``LLM_TIERS`` the models of each tier and the largest prompt it takes:
+a request goes to the first tier its prompt fits, e.g. short questions to
+the fast tier and large contexts to the long-context one.
+
+When a model is throttled or unavailable, the call fails over to the next
+model of the tier and then to the larger tiers, and the model is skipped
+for ``LLM_THROTTLE_COOLDOWN`` seconds (or as long as the provider's
+Retry-After asks) so later calls don't wait on it first. Callers that have
+a local fallback (e.g. an extractive summary) pass it in; it is used, when
+``LLM_LOCAL_FALLBACK`` is on, once every model has failed over.
+
+Each attempt is recorded in the ``legal_writer_llm_*`` histograms by task,
+tier, model and outcome.
+"""
+import logging
+import time
+from typing import NamedTuple
+
+import openai
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .contexts import estimate_tokens
+from .metrics import registry, timed
+
+logger = logging.getLogger(__name__)
+
+# Model name recorded for answers from a caller's local fallback
+LOCAL_MODEL = 'local'
+
+# Errors after which the same request can go to another model
+FAILOVER_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.TryAgain,
+)
+
+llm_duration = registry.histogram(
+    'legal_writer_llm_duration_seconds',
+    'Time spent on LLM calls (until the response starts, when streaming), by task, tier, model and outcome',
+    ('task', 'tier', 'model', 'outcome'),
+)
+llm_input_tokens = registry.histogram(
+    'legal_writer_llm_input_tokens',
+    'Estimated prompt size of routed LLM calls, by task and the tier chosen',
+    ('task', 'tier'),
+    buckets=(100, 500, 1000, 5000, 10000, 25000, 50000, 100000, 200000, 500000, 1000000),
+)
+
+
+class Completion(NamedTuple):
+    text: str
+    model: str
+    tier: str
+    usage: dict
+    response_id: str
+
+
+class Route(NamedTuple):
+    tier: str
+    model: str
+
+
+# model -> monotonic time until which it's skipped
+_cooling = {}
+
+
+def _cool_down(model, error):
+    delay = settings.LLM_THROTTLE_COOLDOWN
+    retry_after = (getattr(error, 'headers', None) or {}).get('retry-after')
+    if retry_after and str(retry_after).isdigit():
+        delay = int(retry_after)
+    _cooling[model] = time.monotonic() + delay
+
+
+def input_tokens(messages):
+    return estimate_tokens(sum(len(message['content']) for message in messages))
+
+
+def plan(task, tokens):
+    """
+    The models to try for a prompt of ``tokens`` tokens, in order: those of
+    the first tier in the task's route the prompt fits, then of the larger
+    tiers. Models cooling down after throttling go last.
+    """
+    tiers = settings.LLM_ROUTES[task]
+    fitting = [tier for tier in tiers if tokens <= settings.LLM_TIERS[tier]['max_input_tokens']]
+    # Nothing fits: the largest tier is the best chance
+    fitting = fitting or tiers[-1:]
+    routes = list(dict.fromkeys(
+        # An unset *_MODELS setting splits into an empty name
+        Route(tier, model) for tier in fitting for model in settings.LLM_TIERS[tier]['models'] if model
+    ))
+    now = time.monotonic()
+    return sorted(routes, key=lambda route: _cooling.get(route.model, 0) > now)
+
+
+def primary_model(task):
+    """The model a task's prompts usually go to, e.g. to key caches of its answers"""
+    return settings.LLM_TIERS[settings.LLM_ROUTES[task][0]]['models'][0]
+
+
+def _attempts(task, messages):
+    tokens = input_tokens(messages)
+    routes = plan(task, tokens)
+    if not routes:
+        logger.error(f"No models are configured for {task}")
+        return routes
+    llm_input_tokens.observe(tokens, task=task, tier=routes[0].tier)
+    logger.debug(f"Routing {task} ({tokens} tokens) to {', '.join(route.model for route in routes)}")
+    return routes
+
+
+def _failed_over(task, route, started, error):
+    llm_duration.observe(time.perf_counter() - started, task=task, tier=route.tier, model=route.model, outcome='failover')
+    _cool_down(route.model, error)
+    logger.warning(f"{route.model} unavailable for {task}, failing over: {str(error)}")
+
+
+def _no_models(task):
+    return ImproperlyConfigured(f"No models are configured for {task}; see LLM_TIERS and LLM_ROUTES")
+
+
+async def complete(task, messages, fallback=None, **params):
+    """
+    Run a chat completion for a task on the model the router picks and
+    return a ``Completion``. ``fallback`` is a function producing a local
+    answer for when every model has failed over; without one the last
+    error is raised (``ImproperlyConfigured`` when the task has no models).
+    """
+    error = None
+    for route in _attempts(task, messages):
+        started = time.perf_counter()
+        try:
+            with timed('llm'):
+                response = await openai.ChatCompletion.acreate(model=route.model, messages=messages, **params)
+        except FAILOVER_ERRORS as e:
+            _failed_over(task, route, started, e)
+            error = e
+            continue
+        except Exception:
+            llm_duration.observe(time.perf_counter() - started, task=task, tier=route.tier, model=route.model, outcome='error')
+            raise
+        llm_duration.observe(time.perf_counter() - started, task=task, tier=route.tier, model=route.model, outcome='ok')
+        text = response.choices[0].message.content if response.choices else None
+        return Completion(text, route.model, route.tier, dict(response.get('usage') or {}), response.get('id'))
+
+    if fallback is not None and settings.LLM_LOCAL_FALLBACK:
+        llm_duration.observe(0, task=task, tier=LOCAL_MODEL, model=LOCAL_MODEL, outcome='ok')
+        logger.warning(f"Every model is unavailable for {task}, answering locally")
+        return Completion(fallback(), LOCAL_MODEL, LOCAL_MODEL, {}, None)
+    raise error or _no_models(task)
+
+
+async def stream(task, messages, fallback=None, **params):
+    """
+    Like ``complete``, but yield the text as it's produced. Failover happens
+    before the first text arrives; once a model is streaming it is used to
+    the end.
+    """
+    error = None
+    for route in _attempts(task, messages):
+        started = time.perf_counter()
+        try:
+            response = await openai.ChatCompletion.acreate(model=route.model, messages=messages, stream=True, **params)
+        except FAILOVER_ERRORS as e:
+            _failed_over(task, route, started, e)
+            error = e
+            continue
+        except Exception:
+            llm_duration.observe(time.perf_counter() - started, task=task, tier=route.tier, model=route.model, outcome='error')
+            raise
+        llm_duration.observe(time.perf_counter() - started, task=task, tier=route.tier, model=route.model, outcome='ok')
+        async for chunk in response:
+            if chunk.choices:
+                text = chunk.choices[0].delta.get('content')
+                if text:
+                    yield text
+        return
+
+    if fallback is not None and settings.LLM_LOCAL_FALLBACK:
+        llm_duration.observe(0, task=task, tier=LOCAL_MODEL, model=LOCAL_MODEL, outcome='ok')
+        text = fallback()
+        if text:
+            yield text
+        return
+    raise error or _no_models(task)
@@ -0,0 +1,112 @@
+"""
+Logging pipeline pieces referenced from ``settings.LOGGING``.
+
+Records are filtered (sampled, redacted and size-capped) in the calling
+thread, then handed to a bounded queue; a background listener does the
+actual disk writes so request threads never block on I/O.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+from datetime import datetime, timezone
+
+SENSITIVE_PATTERN = re.compile(
+    r"""(?P<key>['"]?(?:password|token|access|refresh|authorization|api_key|secret)['"]?\s*[:=]\s*)(?P<value>'[^']*'|"[^"]*"|[^\s,}]+)""",
+    re.IGNORECASE,
+)
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records below ``min_level``; warnings and errors always pass"""
+
+    def __init__(self, rate=1.0, min_level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.min_level = logging.getLevelName(min_level) if isinstance(min_level, str) else min_level
+
+    def filter(self, record):
+        if record.levelno >= self.min_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class RedactingFilter(logging.Filter):
+    """Mask credentials and cap the size of the rendered message"""
+
+    def __init__(self, max_length=2000):
+        super().__init__()
+        self.max_length = int(max_length)
+
+    def filter(self, record):
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            message = f'{message[:self.max_length]}... [{len(message) - self.max_length} chars truncated]'
+        message = SENSITIVE_PATTERN.sub(r'\g<key>[REDACTED]', message)
+        record.msg, record.args = message, None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundFileHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a rotating file handler running on a listener thread.
+
+    When the queue is full records are dropped rather than blocking the
+    caller; the number dropped is kept in ``dropped``.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        target = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True,
+        )
+        # Records are fully formatted by prepare() before they are queued
+        target.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        # Flushes the queue at exit unless logging was reconfigured first
+        atexit.register(self.close)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Called by logging on reconfiguration and shutdown, and at exit
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            atexit.unregister(self.close)
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        super().close()
@@ -0,0 +1,139 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.benchmarks.corpus import KINDS, SIZES, build_corpus
+
+
+def _measure(path):
+    """Run one extraction in a fresh process and report its timing and peak RSS"""
+    # The same path uploads take, including OCR, formatting and page splitting
+    from core.extractors import extract_file
+
+    started = time.perf_counter()
+    extraction = extract_file(path)
+    finished = time.perf_counter()
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() != 'Darwin':
+        max_rss *= 1024
+
+    return {
+        'total_seconds': finished - started,
+        'peak_rss_bytes': max_rss,
+        'markdown_chars': len(extraction.text),
+        'extracted_pages': len(extraction.page_offsets),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark PDF extraction and markdown formatting against a synthetic '
+        'legal corpus and write the results as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+        parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per document; the median is reported')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--corpus-dir',
+            default=os.path.join(tempfile.gettempdir(), 'legal-writer-bench-corpus'),
+            help='Where generated PDFs are kept between runs',
+        )
+        parser.add_argument(
+            '--output',
+            default=os.path.join(tempfile.gettempdir(), 'legal-writer-bench-results.json'),
+            help='JSON results file',
+        )
+        parser.add_argument('--compare', help='Previous results file to compare against')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        sizes = {size: SIZES[size] for size in options['sizes']}
+        self.stdout.write(f"Preparing corpus in {options['corpus_dir']}...")
+        corpus = build_corpus(options['corpus_dir'], options['kinds'], sizes, options['seed'])
+
+        # Each run gets its own process so peak RSS isn't polluted by earlier runs
+        context = multiprocessing.get_context('fork')
+        results = []
+        for item in corpus:
+            runs = []
+            for _ in range(options['repeat']):
+                with context.Pool(1) as pool:
+                    runs.append(pool.apply(_measure, (item['path'],)))
+
+            result = {
+                'name': item['name'],
+                'kind': item['kind'],
+                'size': item['size'],
+                'pages': item['pages'],
+                'file_bytes': item['bytes'],
+                'total_seconds': statistics.median(run['total_seconds'] for run in runs),
+                'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+                'markdown_chars': runs[-1]['markdown_chars'],
+                'extracted_pages': runs[-1]['extracted_pages'],
+            }
+            result['pages_per_second'] = item['pages'] / result['total_seconds']
+            results.append(result)
+            self.stdout.write(
+                f"{item['name']:<20} {result['pages_per_second']:8.1f} pages/s  "
+                f"total {result['total_seconds'] * 1000:8.1f} ms  "
+                f"peak RSS {result['peak_rss_bytes'] / 2 ** 20:7.1f} MiB"
+            )
+
+        report = {
+            'commit': _git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            self._compare(options['compare'], results)
+
+    def _compare(self, path, results):
+        with open(path) as f:
+            baseline = {result['name']: result for result in json.load(f)['results']}
+
+        self.stdout.write(f'\nCompared with {path}:')
+        for result in results:
+            previous = baseline.get(result['name'])
+            if previous is None:
+                continue
+            throughput = result['pages_per_second'] / previous['pages_per_second'] - 1
+            rss = result['peak_rss_bytes'] / previous['peak_rss_bytes'] - 1
+            total = result['total_seconds'] / max(previous['total_seconds'], 1e-9) - 1
+            self.stdout.write(
+                f"{result['name']:<20} throughput {throughput:+7.1%}  "
+                f"total time {total:+7.1%}  peak RSS {rss:+7.1%}"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Resource
+
+
+class Command(BaseCommand):
+    help = (
+        'Build chunks and citations for resources extracted before they existed. '
+        'Page ranges need the original file, so pass --reextract to fill them in.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every resource, not just those without chunks')
+        parser.add_argument('--reextract', action='store_true', help='Re-extract each file instead of chunking the stored text')
+        parser.add_argument('--project', type=int, help='Only resources in this project')
+
+    def handle(self, *args, **options):
+        resources = Resource.objects.exclude(content_extracted='')
+        if options['project']:
+            resources = resources.filter(project_id=options['project'])
+        if not options['all']:
+            resources = resources.filter(chunks__isnull=True)
+
+        count = 0
+        for resource in resources.distinct().iterator(chunk_size=100):
+            if options['reextract']:
+                resource.extract_content()
+            else:
+                resource.rebuild_index()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Built chunks and citations for {count} resources'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.embeddings import sync_project
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        'Bring per-project embedding indexes up to date ahead of the first search, '
+        'e.g. after a bulk import or a change of EMBEDDING_BACKEND.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', help='Only this project (repeatable)')
+        parser.add_argument('--rebuild', action='store_true', help='Discard existing indexes and embed everything again')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['project']:
+            projects = projects.filter(pk__in=options['project'])
+
+        for project_id in projects.values_list('id', flat=True).iterator():
+            started = time.perf_counter()
+            embedded, count = sync_project(project_id, rebuild=options['rebuild'])
+            self.stdout.write(
+                f'Project {project_id}: embedded {embedded} chunks in {time.perf_counter() - started:.1f}s, '
+                f'{count} rows indexed'
+            )
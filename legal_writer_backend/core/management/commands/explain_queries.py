@@ -0,0 +1,138 @@
+import re
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import ChatContext, ChatSession, Document, Note, Project, Resource
+from core.views import ChatContextViewSet, ChatSessionViewSet
+
+# Plan lines that mean a table is read in full, by database vendor
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING (?:COVERING )?INDEX\b)(?!CONSTANT ROW)'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+    'mysql': re.compile(r'\bTable scan on\b'),
+}
+# Plan lines that mean rows are sorted after being read rather than in index order
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'\bUSE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)\b'),
+    'postgresql': re.compile(r'^\s*(?:->\s*)?Sort\b', re.MULTILINE),
+    'mysql': re.compile(r'\bSort: '),
+}
+
+# Viewsets that aren't routed but whose querysets are still used
+EXTRA_VIEWSETS = (('chat-sessions', ChatSessionViewSet), ('chat-contexts', ChatContextViewSet))
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on every viewset's list and detail querysets and flag "
+        'full table scans and sorts that an index should avoid.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='Explain queries as this existing user; by default a throwaway user and project are created and rolled back',
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just flagged ones')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit non-zero if any full scan is found')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f"Don't know how to read {vendor} query plans")
+
+        results = []
+        try:
+            with transaction.atomic():
+                if vendor == 'postgresql':
+                    # With tiny tables the planner prefers a seq scan even when an index
+                    # exists; disabling them leaves seq scans only where no index applies
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                user, project_id = self._subject(options['username'])
+                results = [self._explain(vendor, *query) for query in self._queries(user, project_id)]
+                raise Rollback
+        except Rollback:
+            pass
+
+        scans = sum(1 for result in results if result['full_scan'])
+        sorts = sum(1 for result in results if result['sort'])
+        for result in results:
+            flags = [label for label, flagged in (('FULL SCAN', result['full_scan']), ('SORT', result['sort'])) if flagged]
+            if flags:
+                self.stdout.write(self.style.WARNING(f"{result['name']:<40} {', '.join(flags)}"))
+            else:
+                self.stdout.write(f"{result['name']:<40} ok")
+            if flags or options['verbose_plans']:
+                for line in result['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
+
+        summary = f'\n{len(results)} queries explained on {vendor}: {scans} full scans, {sorts} sorts'
+        if scans and options['fail_on_scan']:
+            raise CommandError(summary.strip())
+        self.stdout.write(self.style.WARNING(summary) if scans else self.style.SUCCESS(summary))
+
+    def _subject(self, username):
+        """The user to explain as and one of their project ids"""
+        if username:
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named '{username}'")
+            project = Project.objects.filter(owner=user).first()
+            if project is None:
+                raise CommandError(f"'{username}' has no projects")
+            return user, project.pk
+
+        user = User.objects.create_user('explain-queries')
+        project = Project.objects.create(title='Query plan audit', owner=user)
+        document = Document.objects.create(project=project, title='Document', content='')
+        Note.objects.create(project=project, title='Note', content='')
+        Resource.objects.create(project=project, title='Resource', file_type='PDF', file_size=0)
+        session = ChatSession.objects.create(project=project)
+        ChatContext.objects.create(chat_session=session, context_type='DOCUMENT', document=document)
+        return user, project.pk
+
+    def _queries(self, user, project_id):
+        """Yield (name, queryset) for each viewset's list, filtered list and detail lookups"""
+        router = import_module(settings.ROOT_URLCONF).router
+        viewsets = [(prefix, viewset) for prefix, viewset, _ in router.registry] + list(EXTRA_VIEWSETS)
+        factory = APIRequestFactory()
+
+        for prefix, viewset in viewsets:
+            scenarios = [('list', {})]
+            if prefix != 'projects':
+                scenarios.append(('list?project', {'project': project_id}))
+            for label, params in scenarios:
+                queryset = self._get_queryset(factory, user, viewset, 'list', params)
+                yield f'{prefix} {label}', queryset
+            queryset = self._get_queryset(factory, user, viewset, 'retrieve', {})
+            yield f'{prefix} retrieve', queryset.filter(pk=0)
+
+    def _get_queryset(self, factory, user, viewset, action, params):
+        http_request = factory.get('/', params)
+        force_authenticate(http_request, user=user)
+        view = viewset(action=action, format_kwarg=None, kwargs={})
+        view.request = Request(http_request, authenticators=[])
+        view.request.user = user
+        return view.filter_queryset(view.get_queryset())
+
+    def _explain(self, vendor, name, queryset):
+        explain_options = {'format': 'tree'} if vendor == 'mysql' else {}
+        plan = queryset.explain(**explain_options)
+        return {
+            'name': name,
+            'plan': plan,
+            'full_scan': bool(FULL_SCAN_PATTERNS[vendor].search(plan)),
+            'sort': bool(SORT_PATTERNS[vendor].search(plan)),
+        }
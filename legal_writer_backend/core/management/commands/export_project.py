@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archives import ARCHIVE_FORMATS, iter_export
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Write a project, its rows and its files to a zip or tar archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help='Project id')
+        parser.add_argument('path', help='Archive to write')
+        parser.add_argument('--archive', choices=list(ARCHIVE_FORMATS), default=None,
+                            help='Archive format (default: from the file extension, else zip)')
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f"Project {options['project']} does not exist")
+
+        archive_format = options['archive']
+        if archive_format is None:
+            path = options['path'].lower()
+            archive_format = next(
+                (name for name in sorted(ARCHIVE_FORMATS, key=len, reverse=True) if path.endswith('.' + name)),
+                'zip'
+            )
+
+        size = 0
+        with open(options['path'], 'wb') as f:
+            for data in iter_export(project, archive_format):
+                f.write(data)
+                size += len(data)
+        self.stdout.write(f"Exported project {project.pk} to {options['path']} ({size} bytes)")
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archives import ArchiveError, import_project
+
+
+class Command(BaseCommand):
+    help = 'Create a project from an archive written by export_project or the export endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Zip or tar archive')
+        parser.add_argument('--owner', required=True, help='Username of the new project\'s owner')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['owner']} does not exist")
+
+        try:
+            with open(options['path'], 'rb') as f:
+                project = import_project(f, owner)
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Imported {options['path']} as project {project.pk}")
@@ -0,0 +1,304 @@
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from core.benchmarks.corpus import build_pdf
+from core.benchmarks.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from core.models import Document, Note, Project, Resource
+
+SERVERS = ('asgi', 'wsgi')
+ENDPOINTS = ('chat', 'summarize', 'upload', 'list_documents', 'list_resources')
+DEFAULT_MIX = 'chat=4,summarize=1,upload=1,list_documents=2,list_resources=2'
+PASSWORD = 'loadtest-password'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_mix(value):
+    """Parse ``name=weight,...`` into a dict of endpoint weights"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint '{name}', expected one of: {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class WSGIServer:
+    """Django's threaded development server on a background thread"""
+
+    def __init__(self):
+        self.httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        self.httpd.set_app(get_wsgi_application())
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='loadtest-wsgi', daemon=True).start()
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ASGIServer:
+    """The deployed ASGI application under uvicorn, on a background thread"""
+
+    def __init__(self):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(
+            import_string(settings.ASGI_APPLICATION), host='127.0.0.1', port=0, log_level='warning',
+        ))
+        self.thread = threading.Thread(target=self.server.run, name='loadtest-asgi', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise CommandError('The ASGI server failed to start')
+            time.sleep(0.05)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{port}'
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Workload:
+    """Issues one request per endpoint name against the running server"""
+
+    def __init__(self, base_url, token, fixtures, pdf_bytes):
+        self.base_url = base_url
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.fixtures = fixtures
+        self.pdf_bytes = pdf_bytes
+
+    def chat(self, session, rng):
+        contexts = [
+            {'type': 'DOCUMENT', 'title': 'Heads of argument', 'content': self.fixtures['context_text']},
+        ]
+        return session.post(f'{self.base_url}/api/chat/', json={
+            'message': 'What is the strongest ground of appeal?',
+            'contexts': contexts,
+        }, headers=self.headers)
+
+    def summarize(self, session, rng):
+        resource_id = rng.choice(self.fixtures['resource_ids'])
+        return session.post(f'{self.base_url}/api/resources/{resource_id}/summarize/', headers=self.headers)
+
+    def upload(self, session, rng):
+        return session.post(f'{self.base_url}/api/resources/', data={
+            'project': self.fixtures['project_id'],
+            'title': 'Load test upload',
+            'file_type': 'PDF',
+        }, files={'file': ('upload.pdf', self.pdf_bytes, 'application/pdf')}, headers=self.headers)
+
+    def list_documents(self, session, rng):
+        return session.get(f"{self.base_url}/api/documents/?project={self.fixtures['project_id']}", headers=self.headers)
+
+    def list_resources(self, session, rng):
+        return session.get(f"{self.base_url}/api/resources/?project={self.fixtures['project_id']}", headers=self.headers)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the API under a mixed concurrent workload against a scratch database, '
+        'with OpenAI replaced by an in-process fake, and report latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', choices=SERVERS, default='asgi',
+            help='Serve the app with uvicorn (as deployed) or the threaded WSGI development server',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run the workload for')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Endpoint weights, e.g. chat=4,list_documents=1')
+        parser.add_argument('--llm-latency', type=float, default=0.5, help='Fake LLM response time in seconds')
+        parser.add_argument('--llm-jitter', type=float, default=0.1)
+        parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='Fraction of LLM calls answered with 429')
+        parser.add_argument('--stream-chunk-delay', type=float, default=0.02)
+        parser.add_argument('--documents', type=int, default=50, help='Documents, notes and resources to seed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        workdir = tempfile.mkdtemp(prefix='legal-writer-loadtest-')
+
+        # Never touch the configured database or media directory; the scratch
+        # database is the test one (see TEST_DATABASE_NAME)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = self._run(mix, workdir, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def _run(self, mix, workdir, options):
+        fake_llm = FakeOpenAIServer(FakeOpenAIConfig(
+            latency=options['llm_latency'],
+            jitter=options['llm_jitter'],
+            rate_limit_ratio=options['rate_limit_ratio'],
+            stream_chunk_delay=options['stream_chunk_delay'],
+            seed=options['seed'],
+        )).start()
+        openai.api_base = fake_llm.url
+        openai.api_key = 'loadtest'
+
+        with override_settings(
+            MEDIA_ROOT=os.path.join(workdir, 'media'),
+            OPENAI_API_KEY='loadtest',
+            ALLOWED_HOSTS=['127.0.0.1', 'localhost'],
+        ):
+            pdf_path = build_pdf(os.path.join(workdir, 'sample.pdf'), 'judgment', 2, options['seed'])
+            with open(pdf_path, 'rb') as f:
+                pdf_bytes = f.read()
+            fixtures = self._seed(options['documents'], pdf_bytes)
+
+            server = ASGIServer() if options['server'] == 'asgi' else WSGIServer()
+            try:
+                base_url = server.start()
+                token = requests.post(f'{base_url}/api/token/', json={
+                    'username': fixtures['username'], 'password': PASSWORD,
+                }).json()['access']
+                workload = Workload(base_url, token, fixtures, pdf_bytes)
+                samples, elapsed = self._drive(workload, mix, options)
+            finally:
+                server.stop()
+                fake_llm.stop()
+
+        return self._report(samples, elapsed, options, fake_llm.requests_seen)
+
+    def _seed(self, count, pdf_bytes):
+        user = User.objects.create_user('loadtest', password=PASSWORD)
+        project = Project.objects.create(title='Load test matter', owner=user)
+        rng = random.Random(count)
+        paragraph = ' '.join(rng.choice(['court', 'held', 'appeal', 'contract', 'damages', 'the']) for _ in range(400))
+
+        Document.objects.bulk_create(
+            Document(project=project, title=f'Document {i}', content=paragraph) for i in range(count)
+        )
+        Note.objects.bulk_create(
+            Note(project=project, title=f'Note {i}', content=paragraph) for i in range(count)
+        )
+        resource_ids = []
+        for i in range(count):
+            resource = Resource(
+                project=project, title=f'Resource {i}', file_type='PDF',
+                file_size=len(pdf_bytes), content_extracted=paragraph * 5,
+            )
+            resource.file.save(f'resource-{i}.pdf', ContentFile(pdf_bytes), save=False)
+            resource.save()
+            resource_ids.append(resource.pk)
+
+        return {
+            'username': user.username,
+            'project_id': project.pk,
+            'resource_ids': resource_ids,
+            'context_text': paragraph * 10,
+        }
+
+    def _drive(self, workload, mix, options):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        deadline = time.monotonic() + options['duration']
+        samples = defaultdict(list)
+        samples_lock = threading.Lock()
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            session = requests.Session()
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status_code = getattr(workload, name)(session, rng).status_code
+                except requests.RequestException:
+                    status_code = None
+                latency = time.perf_counter() - started
+                with samples_lock:
+                    samples[name].append((latency, status_code))
+
+        self.stdout.write(
+            f"Running {options['concurrency']} workers against {options['server'].upper()} "
+            f"for {options['duration']:.0f}s "
+            f"(LLM latency {options['llm_latency'] * 1000:.0f} ms, 429 ratio {options['rate_limit_ratio']:.0%})..."
+        )
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(worker, range(options['concurrency'])))
+        return samples, time.monotonic() - started
+
+    def _report(self, samples, elapsed, options, llm_requests):
+        endpoints = {}
+        self.stdout.write(
+            f"\n{'endpoint':<16} {'requests':>8} {'errors':>7} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for name in ENDPOINTS:
+            if name not in samples:
+                continue
+            latencies = sorted(latency for latency, _ in samples[name])
+            errors = sum(1 for _, code in samples[name] if code is None or code >= 400)
+            stats = {
+                'requests': len(latencies),
+                'errors': errors,
+                'throughput': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+            }
+            endpoints[name] = stats
+            self.stdout.write(
+                f"{name:<16} {stats['requests']:>8} {errors:>7} {stats['throughput']:>8.1f} "
+                f"{stats['p50_ms']:>8.0f} {stats['p95_ms']:>8.0f} {stats['p99_ms']:>8.0f}"
+            )
+
+        total = sum(stats['requests'] for stats in endpoints.values())
+        self.stdout.write(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), {llm_requests} LLM calls")
+        return {
+            'server': options['server'],
+            'concurrency': options['concurrency'],
+            'duration_seconds': elapsed,
+            'llm_latency': options['llm_latency'],
+            'rate_limit_ratio': options['rate_limit_ratio'],
+            'llm_requests': llm_requests,
+            'endpoints': endpoints,
+        }
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.purge import BATCH_SIZE, purge_project, purgeable_projects
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove the files and rows of projects deleted more than PROJECT_PURGE_AFTER_DAYS ago. '
+        'Meant to run periodically, e.g. nightly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after-days', type=int, default=None,
+                            help='Override PROJECT_PURGE_AFTER_DAYS (0 purges every deleted project)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows deleted per statement')
+        parser.add_argument('--dry-run', action='store_true', help='List the projects that would be purged')
+
+    def handle(self, *args, **options):
+        projects = purgeable_projects(after_days=options['after_days'])
+        for project in projects.iterator():
+            if options['dry_run']:
+                self.stdout.write(f'Would purge project {project.pk} ({project.title}), deleted {project.deleted_at}')
+                continue
+            project_id, started = project.pk, time.perf_counter()
+            counts = purge_project(project, batch_size=options['batch_size'])
+            summary = ', '.join(f'{count} {label}' for label, count in counts.items() if count)
+            self.stdout.write(f'Purged project {project_id} in {time.perf_counter() - started:.1f}s: {summary}')
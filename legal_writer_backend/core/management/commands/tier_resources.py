@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.tiering import TieringPolicy, demote
+
+
+class Command(BaseCommand):
+    help = (
+        'Move resource files that the tiering policy marks as cold (archived projects, '
+        'files unread for TIERING_COLD_AFTER_DAYS) to cold storage. Meant to run periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cold-after-days', type=int, default=None,
+                            help='Override TIERING_COLD_AFTER_DAYS')
+        parser.add_argument('--keep-archived', action='store_true',
+                            help='Only move files by last access, not because their project is archived')
+        parser.add_argument('--limit', type=int, default=None, help='Move at most this many files')
+        parser.add_argument('--dry-run', action='store_true', help='List the files that would move')
+
+    def handle(self, *args, **options):
+        policy = TieringPolicy(options['cold_after_days'], archived_projects=not options['keep_archived'])
+        candidates = policy.cold_candidates().order_by('pk')
+        if options['limit']:
+            candidates = candidates[:options['limit']]
+
+        moved = moved_bytes = 0
+        started = time.perf_counter()
+        for resource in candidates.iterator(chunk_size=100):
+            if options['dry_run']:
+                self.stdout.write(f'Would move {resource.file.name} ({resource.file_size} bytes)')
+                continue
+            try:
+                if demote(resource):
+                    moved += 1
+                    moved_bytes += resource.file_size
+            except Exception as e:
+                self.stderr.write(f'Could not move {resource.file.name}: {str(e)}')
+        if not options['dry_run']:
+            self.stdout.write(
+                f'Moved {moved} files ({moved_bytes} bytes) to cold storage in {time.perf_counter() - started:.1f}s'
+            )
@@ -0,0 +1,214 @@
+"""
+Lightweight request instrumentation.
+
+Phases of a request (database, serialization, extraction, LLM calls) are
+timed into a per-request ``RequestTimings`` held in a context variable, so
+the same code works for sync views, async views and work handed to threads
+by ``sync_to_async``. Outside a request the helpers are no-ops.
+
+The tasks and threads of one request share its ``RequestTimings``, so its
+totals are updated under a lock, while the phases a block is nested in
+are tracked per task in a context variable of their own.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_timings = ContextVar('request_timings', default=None)
+# Phases the current task or thread is inside of
+_open_phases = ContextVar('open_phases', default=frozenset())
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        with self._lock:
+            total, count = self.phases.get(name, (0.0, 0))
+            self.phases[name] = (total + duration, count + 1)
+
+    def totals(self):
+        """A copy of ``phases``, safe to iterate while other threads add to it"""
+        with self._lock:
+            return dict(self.phases)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Render the collected phases as a Server-Timing header value"""
+        entries = []
+        for name, (total, count) in self.totals().items():
+            entries.append(f'{name};dur={total * 1000:.1f};desc="{count}x"')
+        entries.append(f'total;dur={self.elapsed * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def start_request():
+    """Begin collecting timings for the current request; returns the reset token"""
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def finish_request(token):
+    _current_timings.reset(token)
+
+
+def current_timings():
+    return _current_timings.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Time a block as the given phase of the current request.
+
+    Nested blocks of the same phase (e.g. nested serializers) are only
+    counted once, at the outermost level. Blocks in concurrent tasks of the
+    same request are each counted.
+    """
+    timings = _current_timings.get()
+    open_phases = _open_phases.get()
+    if timings is None or name in open_phases:
+        yield
+        return
+
+    _open_phases.set(open_phases | {name})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        # set() rather than reset(): an async generator may finish in another context
+        _open_phases.set(open_phases)
+        timings.add(name, time.perf_counter() - started)
+
+
+def timed_function(name):
+    """Decorator form of ``timed`` for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Connection execute wrapper that times queries as the ``db`` phase"""
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+def install_db_instrumentation(sender, connection, **kwargs):
+    """``connection_created`` receiver that attaches ``db_execute_wrapper``"""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _labels(self, key, **extra):
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{self._labels(key, le=bound)} {cumulative}')
+            lines.append(f'{self.name}_bucket{self._labels(key, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{self._labels(key)} {total}')
+            lines.append(f'{self.name}_count{self._labels(key)} {count}')
+        return '\n'.join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'legal_writer_request_duration_seconds',
+    'Time spent handling a request, by view',
+    ('view', 'method', 'status'),
+)
+phase_duration = registry.histogram(
+    'legal_writer_request_phase_duration_seconds',
+    'Time spent in each phase of a request (db, serialize, extract, llm...), by view',
+    ('view', 'phase'),
+)
+db_queries = registry.histogram(
+    'legal_writer_request_db_queries',
+    'Database queries issued per request, by view',
+    ('view',),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+def record_request(view, method, status, timings):
+    """Fold a finished request's timings into the per-view histograms"""
+    request_duration.observe(timings.elapsed, view=view, method=method, status=status)
+    phases = timings.totals()
+    for phase, (total, _) in phases.items():
+        phase_duration.observe(total, view=view, phase=phase)
+    db_queries.observe(phases.get('db', (0.0, 0))[1], view=view)
@@ -0,0 +1,41 @@
+import asyncio
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+
+def _view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'unresolved'
+    return resolver_match.view_name or resolver_match._func_path
+
+
+def _finish(request, response, timings, token):
+    metrics.finish_request(token)
+    metrics.record_request(_view_name(request), request.method, response.status_code, timings)
+    if settings.SERVER_TIMING_ENABLED:
+        response['Server-Timing'] = timings.server_timing()
+    return response
+
+
+@sync_and_async_middleware
+def ServerTimingMiddleware(get_response):
+    """
+    Time each request and its phases, expose them in a Server-Timing header
+    and record them in the per-view histograms served at /metrics/.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings, token = metrics.start_request()
+            response = await get_response(request)
+            return _finish(request, response, timings, token)
+    else:
+        def middleware(request):
+            timings, token = metrics.start_request()
+            response = get_response(request)
+            return _finish(request, response, timings, token)
+
+    return middleware
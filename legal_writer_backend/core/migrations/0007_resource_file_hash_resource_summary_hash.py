@@ -0,0 +1,30 @@
+# Generated by Django 4.2.5 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_resource_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resource",
+            name="file_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 of the file at the last extraction",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="summary_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 of the content the summary was made from",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.5 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_resource_file_hash_resource_summary_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatcontext',
+            index=models.Index(fields=['chat_session', 'context_type'], name='chatcontext_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatcontext',
+            index=models.Index(fields=['chat_session', '-added_at'], name='chatcontext_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['project', '-created_at'], name='chatsession_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['project', '-created_at'], name='document_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['project', '-created_at'], name='note_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['owner', '-created_at'], name='project_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['owner', 'status'], name='project_owner_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['project', '-uploaded_at'], name='resource_project_idx'),
+        ),
+    ]
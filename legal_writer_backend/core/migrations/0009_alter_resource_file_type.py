@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-19 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_chatcontext_chatcontext_type_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resource',
+            name='file_type',
+            field=models.CharField(choices=[('PDF', 'PDF Document'), ('DOC', 'Word Document'), ('TXT', 'Text File'), ('RTF', 'Rich Text Document'), ('OTHER', 'Other')], max_length=10),
+        ),
+    ]
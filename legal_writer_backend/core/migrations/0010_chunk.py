@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2026-10-19 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_alter_resource_file_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Chunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(help_text='Order of the chunk within the resource')),
+                ('heading_path', models.TextField(blank=True, help_text='Enclosing headings, outermost first, joined by " > "')),
+                ('page_start', models.PositiveIntegerField(blank=True, null=True)),
+                ('page_end', models.PositiveIntegerField(blank=True, null=True)),
+                ('start_offset', models.PositiveIntegerField(help_text='Offset of the first character in content_extracted')),
+                ('end_offset', models.PositiveIntegerField(help_text='Offset just past the last character in content_extracted')),
+                ('token_count', models.PositiveIntegerField()),
+                ('content', models.TextField()),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='core.resource')),
+            ],
+            options={
+                'ordering': ['resource', 'position'],
+                'indexes': [models.Index(fields=['resource', 'page_start'], name='chunk_resource_page_idx'), models.Index(fields=['resource', 'start_offset'], name='chunk_resource_offset_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chunk',
+            constraint=models.UniqueConstraint(fields=('resource', 'position'), name='chunk_resource_position_uniq'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-19 05:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_chunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Citation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CASE', 'Case'), ('STATUTE', 'Statute'), ('PARAGRAPH', 'Paragraph')], max_length=10)),
+                ('text', models.CharField(help_text='The citation as written', max_length=500)),
+                ('key', models.CharField(help_text='Normalized form used for lookups', max_length=255)),
+                ('authority', models.CharField(blank=True, help_text='For pinpoints, the key of the cited authority', max_length=255)),
+                ('start_offset', models.PositiveIntegerField(help_text='Offset of the citation in content_extracted')),
+                ('end_offset', models.PositiveIntegerField()),
+                ('chunk', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='citations', to='core.chunk')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citations', to='core.project')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citations', to='core.resource')),
+            ],
+            options={
+                'ordering': ['resource', 'start_offset'],
+                'indexes': [models.Index(fields=['project', 'key'], name='citation_project_key_idx'), models.Index(fields=['project', 'authority'], name='citation_project_auth_idx'), models.Index(fields=['resource', 'start_offset'], name='citation_resource_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.5 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_remove_project_project_owner_idx_project_deleted_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='last_accessed',
+            field=models.DateTimeField(blank=True, help_text='When the file was last read', null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='storage_tier',
+            field=models.CharField(choices=[('HOT', 'Local disk'), ('COLD', 'Cold storage')], default='HOT', help_text='Where the file is kept, see core.tiering', max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['storage_tier', 'last_accessed'], name='resource_tier_access_idx'),
+        ),
+    ]
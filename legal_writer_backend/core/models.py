@@ -1,14 +1,32 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from asgiref.sync import sync_to_async
 
 # Create your models here.
 
+class ProjectQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status=Project.ACTIVE)
+
+    def archived(self):
+        return self.filter(status=Project.ARCHIVED)
+
+    def deleted(self):
+        return self.filter(status=Project.DELETED)
+
+class ProjectManager(models.Manager.from_queryset(ProjectQuerySet)):
+    """Hides soft-deleted projects; use ``Project.all_objects`` to see them"""
+    def get_queryset(self):
+        return super().get_queryset().exclude(status=Project.DELETED)
+
 class Project(models.Model):
+    ACTIVE = 'ACTIVE'
+    ARCHIVED = 'ARCHIVED'
+    DELETED = 'DELETED'
     STATUS_CHOICES = [
-        ('ACTIVE', 'Active'),
-        ('ARCHIVED', 'Archived'),
-        ('DELETED', 'Deleted'),
+        (ACTIVE, 'Active'),
+        (ARCHIVED, 'Archived'),
+        (DELETED, 'Deleted'),
     ]
     
     title = models.CharField(max_length=200)
@@ -16,13 +34,37 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=ACTIVE)
+    deleted_at = models.DateTimeField(null=True, blank=True, help_text='When the project was soft-deleted')
+
+    objects = ProjectManager()
+    all_objects = ProjectQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    def soft_delete(self):
+        """Hide the project now; purge_projects removes its rows and files later"""
+        from django.utils import timezone
+
+        self.status = self.DELETED
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['status', 'deleted_at', 'updated_at'])
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Partial: the daily project list never reads archived or deleted rows
+            models.Index(
+                fields=['owner', '-created_at'], name='project_owner_active_idx',
+                condition=models.Q(status='ACTIVE'),
+            ),
+            models.Index(fields=['owner', 'status'], name='project_owner_status_idx'),
+            models.Index(
+                fields=['deleted_at'], name='project_purge_idx',
+                condition=models.Q(status='DELETED'),
+            ),
+        ]
 
 class Document(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='documents')
@@ -36,6 +78,9 @@ class Document(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', '-created_at'], name='document_project_idx'),
+        ]
 
 class Note(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='notes')
@@ -50,12 +95,23 @@ class Note(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', '-created_at'], name='note_project_idx'),
+        ]
 
 class Resource(models.Model):
+    HOT = 'HOT'
+    COLD = 'COLD'
+    STORAGE_TIERS = [
+        (HOT, 'Local disk'),
+        (COLD, 'Cold storage'),
+    ]
+
     RESOURCE_TYPES = [
         ('PDF', 'PDF Document'),
         ('DOC', 'Word Document'),
         ('TXT', 'Text File'),
+        ('RTF', 'Rich Text Document'),
         ('OTHER', 'Other'),
     ]
 
@@ -64,6 +120,7 @@ class Resource(models.Model):
     file = models.FileField(upload_to='resources/', max_length=255)
     file_type = models.CharField(max_length=10, choices=RESOURCE_TYPES)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     description = models.TextField(blank=True)
     file_size = models.PositiveIntegerField(help_text='File size in bytes')
     content_extracted = models.TextField(blank=True, help_text='Extracted text content from the file')
@@ -72,55 +129,87 @@ class Resource(models.Model):
     summary = models.TextField(blank=True, help_text='AI-generated summary of the content')
     summary_error = models.TextField(blank=True, help_text='Any errors encountered during summarization')
     last_summarized = models.DateTimeField(null=True, blank=True, help_text='When the content was last summarized')
+    file_hash = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the file at the last extraction')
+    summary_hash = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the content the summary was made from')
+    storage_tier = models.CharField(max_length=4, choices=STORAGE_TIERS, default=HOT, help_text='Where the file is kept, see core.tiering')
+    last_accessed = models.DateTimeField(null=True, blank=True, help_text='When the file was last read')
 
     def __str__(self):
         return f"{self.title} ({self.file_type})"
 
-    def extract_content(self):
-        """Extract content from the uploaded file"""
+    def _run_extraction(self):
+        """Extract content from the uploaded file into this instance, without saving"""
         from django.utils import timezone
-        from .utils import extract_text_from_pdf, get_file_type
-        import os
-
-        if not self.file:
-            return
+        from .extractors import extract_file
+        from .tiering import local_path
+        from .utils import file_sha256
 
         try:
-            file_path = self.file.path
-            file_type = get_file_type(file_path)
-
-            if file_type.lower().startswith('application/pdf'):
-                extracted_text = extract_text_from_pdf(file_path)
-                self.content_extracted = extracted_text
-                self.extraction_error = ''
-            else:
-                self.extraction_error = f'Unsupported file type: {file_type}'
-                self.content_extracted = ''
-
+            file_path = local_path(self)
+            self.file_hash = file_sha256(file_path)
+            self.content_extracted, self._page_offsets = extract_file(file_path)
+            self.extraction_error = ''
         except Exception as e:
             self.extraction_error = str(e)
             self.content_extracted = ''
+            self._page_offsets = []
         
         self.last_extracted = timezone.now()
-        self.save()
+
+    def extract_content(self):
+        """Extract content from the uploaded file"""
+        if not self.file:
+            return
+
+        self._run_extraction()
+        self._save_extraction()
+
+    async def aextract_content(self):
+        """Async extract_content: the conversion runs in a worker thread, off the event loop"""
+        if not self.file:
+            return
+
+        await sync_to_async(self._run_extraction, thread_sensitive=False)()
+        await sync_to_async(self._save_extraction)()
+
+    def _save_extraction(self):
+        """Save freshly extracted content and rebuild what is derived from it"""
+        from .embeddings import schedule_sync
+
+        with transaction.atomic():
+            self.save()
+            self.rebuild_index(getattr(self, '_page_offsets', ()))
+            transaction.on_commit(lambda: schedule_sync(self.project_id))
+
+    def rebuild_index(self, page_offsets=()):
+        """Rebuild the chunks and citations of the extracted content"""
+        from .chunks import rebuild_chunks
+        from .citations import rebuild_citations
+
+        with transaction.atomic():
+            rebuild_chunks(self, page_offsets)
+            rebuild_citations(self)
 
     async def summarize(self):
         """Generate a summary of the extracted content"""
         from django.utils import timezone
-        from .utils import summarize_text
+        from .llm import LOCAL_MODEL
+        from .utils import summarize_text, text_sha256
 
         if not self.content_extracted:
-            # Run extract_content synchronously since it's a blocking operation
-            self.extract_content()
+            await self.aextract_content()
             if not self.content_extracted:
                 self.summary_error = "No content available for summarization"
                 await sync_to_async(self.save)()
                 return
 
         try:
-            summary = await summarize_text(self.content_extracted)
-            self.summary = summary
+            completion = await summarize_text(self.content_extracted)
+            self.summary = completion.text
             self.summary_error = ''
+            # A stand-in summary isn't marked current, so summarize_if_changed
+            # replaces it once a model is available again
+            self.summary_hash = '' if completion.model == LOCAL_MODEL else text_sha256(self.content_extracted)
         except Exception as e:
             self.summary_error = str(e)
             self.summary = ''
@@ -128,8 +217,95 @@ class Resource(models.Model):
         self.last_summarized = timezone.now()
         await sync_to_async(self.save)()
 
+    async def aextract_if_changed(self):
+        """Re-extract unless the file is unchanged since a successful extraction; returns whether it ran"""
+        from .utils import file_sha256
+
+        if not self.file:
+            return False
+        if self.content_extracted and not self.extraction_error and self.file_hash:
+            if self.storage_tier == self.COLD:
+                # Cold files are never changed, so don't fetch one back just to hash it
+                return False
+            current_hash = await sync_to_async(file_sha256, thread_sensitive=False)(self.file.path)
+            if current_hash == self.file_hash:
+                return False
+        await self.aextract_content()
+        return True
+
+    async def summarize_if_changed(self):
+        """Summarize unless the summary was made from the current content; returns whether it ran"""
+        from .utils import text_sha256
+
+        if (self.summary and not self.summary_error and self.content_extracted
+                and self.summary_hash == text_sha256(self.content_extracted)):
+            return False
+        await self.summarize()
+        return True
+
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['project', '-uploaded_at'], name='resource_project_idx'),
+            models.Index(fields=['storage_tier', 'last_accessed'], name='resource_tier_access_idx'),
+        ]
+
+class Chunk(models.Model):
+    """A slice of a resource's extracted content, built at extraction time"""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='chunks')
+    position = models.PositiveIntegerField(help_text='Order of the chunk within the resource')
+    heading_path = models.TextField(blank=True, help_text='Enclosing headings, outermost first, joined by " > "')
+    page_start = models.PositiveIntegerField(null=True, blank=True)
+    page_end = models.PositiveIntegerField(null=True, blank=True)
+    start_offset = models.PositiveIntegerField(help_text='Offset of the first character in content_extracted')
+    end_offset = models.PositiveIntegerField(help_text='Offset just past the last character in content_extracted')
+    token_count = models.PositiveIntegerField()
+    content = models.TextField()
+
+    def __str__(self):
+        return f"{self.resource_id}#{self.position}"
+
+    class Meta:
+        ordering = ['resource', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'position'], name='chunk_resource_position_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['resource', 'page_start'], name='chunk_resource_page_idx'),
+            models.Index(fields=['resource', 'start_offset'], name='chunk_resource_offset_idx'),
+        ]
+
+class Citation(models.Model):
+    """A case, statute or paragraph reference found in a resource's extracted content"""
+    CASE = 'CASE'
+    STATUTE = 'STATUTE'
+    PARAGRAPH = 'PARAGRAPH'
+    KIND_CHOICES = [
+        (CASE, 'Case'),
+        (STATUTE, 'Statute'),
+        (PARAGRAPH, 'Paragraph'),
+    ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='citations')
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='citations')
+    chunk = models.ForeignKey(Chunk, on_delete=models.SET_NULL, null=True, blank=True, related_name='citations')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    text = models.CharField(max_length=500, help_text='The citation as written')
+    key = models.CharField(max_length=255, help_text='Normalized form used for lookups')
+    authority = models.CharField(max_length=255, blank=True, help_text='For pinpoints, the key of the cited authority')
+    start_offset = models.PositiveIntegerField(help_text='Offset of the citation in content_extracted')
+    end_offset = models.PositiveIntegerField()
+
+    def __str__(self):
+        return self.text
+
+    class Meta:
+        ordering = ['resource', 'start_offset']
+        indexes = [
+            models.Index(fields=['project', 'key'], name='citation_project_key_idx'),
+            models.Index(fields=['project', 'authority'], name='citation_project_auth_idx'),
+            models.Index(fields=['resource', 'start_offset'], name='citation_resource_idx'),
+        ]
 
 class ChatSession(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='chat_sessions')
@@ -142,6 +318,9 @@ class ChatSession(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', '-created_at'], name='chatsession_project_idx'),
+        ]
 
 class ChatContext(models.Model):
     CONTEXT_TYPE_CHOICES = [
@@ -172,3 +351,7 @@ class ChatContext(models.Model):
 
     class Meta:
         ordering = ['-added_at']
+        indexes = [
+            models.Index(fields=['chat_session', 'context_type'], name='chatcontext_type_idx'),
+            models.Index(fields=['chat_session', '-added_at'], name='chatcontext_added_idx'),
+        ]
@@ -0,0 +1,109 @@
+"""
+OCR for scanned PDF pages.
+
+A page with (almost) no text layer but with at least one image is treated
+as a scan. Only those pages are rendered and run through Tesseract, using
+PyMuPDF's OCR support, on a process pool; pages that already carry text
+keep using the normal markdown conversion. Requires the ``tesseract``
+binary and its language data (found through ``TESSDATA_PREFIX``) on the
+host; without them scanned pages are left empty, as before.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+from django.conf import settings
+
+from .metrics import timed_function
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_tessdata = None
+
+
+def tessdata_path():
+    """Tesseract's language data directory, or '' when OCR isn't available"""
+    global _tessdata
+    if _tessdata is None:
+        try:
+            _tessdata = pymupdf.get_tessdata() or ''
+        except Exception as e:
+            logger.warning(f"OCR disabled, Tesseract language data not found: {str(e)}")
+            _tessdata = ''
+    return _tessdata
+
+
+def is_scanned_page(page, min_chars=None):
+    """Whether a page looks like an image of text rather than text"""
+    if min_chars is None:
+        min_chars = settings.OCR_MIN_TEXT_CHARS
+    if len(page.get_text('text').strip()) >= min_chars:
+        return False
+    return bool(page.get_images(full=False))
+
+
+def scanned_pages(doc):
+    """Zero-based numbers of the pages in an open document that need OCR"""
+    if not settings.OCR_ENABLED:
+        return []
+    return [page.number for page in doc if is_scanned_page(page)]
+
+
+def _ocr_page(path, number, language, dpi, tessdata):
+    """Runs in a worker process: OCR one zero-based page and return its text"""
+    try:
+        with pymupdf.open(path) as doc:
+            page = doc[number]
+            textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True, tessdata=tessdata)
+            blocks = page.get_text('blocks', textpage=textpage, sort=True)
+    except Exception as e:
+        # MuPDF exceptions can't be pickled back to the parent process
+        raise RuntimeError(str(e)) from None
+    # Keep text blocks only, one paragraph each
+    paragraphs = (' '.join(block[4].split()) for block in blocks if block[6] == 0)
+    return '\n\n'.join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked: the parent runs threads (logging,
+            # page prefetch) that a forked child would inherit mid-state
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.OCR_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+@timed_function('ocr')
+def ocr_pages(path, numbers):
+    """
+    OCR the given zero-based pages of a PDF in parallel.
+
+    Returns ``{number: text}``; pages that fail, or every page when
+    Tesseract isn't installed, map to an empty string.
+    """
+    numbers = list(numbers)
+    tessdata = tessdata_path()
+    if not numbers or not tessdata:
+        return {number: '' for number in numbers}
+
+    executor = get_executor()
+    futures = {
+        number: executor.submit(_ocr_page, str(path), number, settings.OCR_LANGUAGE, settings.OCR_DPI, tessdata)
+        for number in numbers
+    }
+    results = {}
+    for number, future in futures.items():
+        try:
+            results[number] = future.result()
+        except Exception as e:
+            logger.warning(f"OCR of page {number + 1} of {path} failed: {str(e)}")
+            results[number] = ''
+    return results
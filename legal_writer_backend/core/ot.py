@@ -0,0 +1,131 @@
+"""
+Operational transformation for plain text.
+
+An operation is a list of components in the ot.js JSON format: a positive
+int retains that many characters, a negative int deletes that many, and a
+string inserts itself. Operations cover the whole document, so the
+characters they retain and delete add up to its length. Lengths count
+Unicode code points.
+"""
+
+
+class OperationError(ValueError):
+    """Raised for malformed operations or ones that don't fit the document"""
+
+
+def _is_insert(component):
+    return isinstance(component, str)
+
+
+def _push(op, component):
+    """Append a component, merging it into the last one when they're of the same kind"""
+    if not op:
+        op.append(component)
+    elif _is_insert(component) and _is_insert(op[-1]):
+        op[-1] += component
+    elif not _is_insert(component) and not _is_insert(op[-1]) and (component > 0) == (op[-1] > 0):
+        op[-1] += component
+    else:
+        op.append(component)
+
+
+def parse(value):
+    """Validate an operation decoded from JSON and return it normalized"""
+    if not isinstance(value, list):
+        raise OperationError("An operation must be a list")
+    op = []
+    for component in value:
+        if isinstance(component, bool) or not isinstance(component, (int, str)) or not component:
+            raise OperationError(f"Invalid operation component: {component!r}")
+        _push(op, component)
+    return op
+
+
+def base_length(op):
+    """Length of the document an operation applies to"""
+    return sum(abs(component) for component in op if not _is_insert(component))
+
+
+def apply(op, text):
+    """Apply an operation to a string"""
+    if base_length(op) != len(text):
+        raise OperationError(f"Operation is for a document of {base_length(op)} characters, not {len(text)}")
+    parts = []
+    position = 0
+    for component in op:
+        if _is_insert(component):
+            parts.append(component)
+        elif component > 0:
+            parts.append(text[position:position + component])
+            position += component
+        else:
+            position -= component
+    return ''.join(parts)
+
+
+def transform(a, b):
+    """
+    Transform concurrent operations ``a`` and ``b`` on the same document into
+    ``(a', b')`` such that applying ``a`` then ``b'`` gives the same text as
+    ``b`` then ``a'``. Where both insert at the same place, ``a`` goes first.
+    """
+    if base_length(a) != base_length(b):
+        raise OperationError("Concurrent operations must apply to the same document")
+
+    a_prime, b_prime = [], []
+    a_components, b_components = iter(a), iter(b)
+    op1, op2 = next(a_components, None), next(b_components, None)
+    while op1 is not None or op2 is not None:
+        if op1 is not None and _is_insert(op1):
+            _push(a_prime, op1)
+            _push(b_prime, len(op1))
+            op1 = next(a_components, None)
+            continue
+        if op2 is not None and _is_insert(op2):
+            _push(a_prime, len(op2))
+            _push(b_prime, op2)
+            op2 = next(b_components, None)
+            continue
+        if op1 is None or op2 is None:
+            raise OperationError("Operations have different lengths")
+
+        if op1 > 0 and op2 > 0:
+            # Both retain
+            length = min(op1, op2)
+            _push(a_prime, length)
+            _push(b_prime, length)
+        elif op1 < 0 and op2 < 0:
+            # Both delete the same characters: nothing left to do for them
+            length = min(-op1, -op2)
+        elif op1 < 0:
+            # a deletes what b retains
+            length = min(-op1, op2)
+            _push(a_prime, -length)
+        else:
+            # a retains what b deletes
+            length = min(op1, -op2)
+            _push(b_prime, -length)
+
+        op1 = op1 - length if op1 > 0 else op1 + length
+        op2 = op2 - length if op2 > 0 else op2 + length
+        if op1 == 0:
+            op1 = next(a_components, None)
+        if op2 == 0:
+            op2 = next(b_components, None)
+    return a_prime, b_prime
+
+
+def transform_index(op, index):
+    """Where a position in the document ends up after an operation, e.g. a cursor"""
+    new_index = index
+    for component in op:
+        if _is_insert(component):
+            new_index += len(component)
+        elif component > 0:
+            index -= component
+        else:
+            new_index -= min(index, -component)
+            index += component
+        if index < 0:
+            break
+    return new_index
@@ -0,0 +1,186 @@
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pymupdf
+import pymupdf4llm
+from django.conf import settings
+from django.core.cache import cache
+
+from .ocr import is_scanned_page, ocr_pages
+from .utils import format_markdown_text
+
+logger = logging.getLogger(__name__)
+
+# How long an extracted page stays in the cache (seconds)
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Pages on either side of a requested page that are extracted ahead of time
+PREFETCH_RADIUS = 2
+
+# Open, memory-mapped documents kept around between requests
+MAX_OPEN_DOCUMENTS = 8
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='page-prefetch')
+_pending_prefetches = set()
+_pending_lock = threading.Lock()
+
+
+class OpenDocument:
+    """A memory-mapped PDF; MuPDF documents are not thread-safe, so use ``lock``"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.lock = threading.Lock()
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        self.doc = pymupdf.open(stream=self.view, filetype='pdf')
+        # Checkouts in progress, and whether the pool has let go of it;
+        # both guarded by the pool's lock
+        self.users = 0
+        self.retired = False
+
+    @property
+    def page_count(self):
+        return self.doc.page_count
+
+    def close(self):
+        with self.lock:
+            self.doc.close()
+            # The mmap can't close while the view handed to MuPDF is alive
+            self.view.release()
+            self.mmap.close()
+
+
+class DocumentPool:
+    """
+    Small LRU of open documents so each page request doesn't reparse the PDF.
+
+    Documents are used through ``checkout``. One that is evicted or replaced
+    while checked out is closed when its last user is done with it, so a
+    request or prefetch holding it never finds it closed.
+    """
+
+    def __init__(self, max_size=MAX_OPEN_DOCUMENTS):
+        self.max_size = max_size
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _retire(self, document):
+        """Drop a document from the pool; returns it if it can be closed now"""
+        document.retired = True
+        return document if document.users == 0 else None
+
+    @contextmanager
+    def checkout(self, path):
+        path = os.fspath(path)
+        to_close = []
+        with self._lock:
+            document = self._documents.get(path)
+            if document is not None and document.mtime == os.path.getmtime(path):
+                self._documents.move_to_end(path)
+            else:
+                if document is not None:
+                    to_close.append(self._retire(self._documents.pop(path)))
+                document = OpenDocument(path)
+                self._documents[path] = document
+                while len(self._documents) > self.max_size:
+                    to_close.append(self._retire(self._documents.popitem(last=False)[1]))
+            document.users += 1
+        for closable in to_close:
+            if closable is not None:
+                closable.close()
+
+        try:
+            yield document
+        finally:
+            with self._lock:
+                document.users -= 1
+                closable = document.retired and document.users == 0
+            if closable:
+                document.close()
+
+
+documents = DocumentPool()
+
+
+def page_cache_key(document, number):
+    return f'pdf-page:{document.path}:{document.mtime}:{number}'
+
+
+def _to_markdown(doc, number):
+    kwargs = {'pages': [number]}
+    identify_headers = getattr(pymupdf4llm, 'IdentifyHeaders', None)
+    if identify_headers is not None:
+        # Header detection scans every page by default; scope it to this page
+        # so the cost doesn't grow with the size of the document
+        kwargs['hdr_info'] = identify_headers(doc, pages=[number])
+    return pymupdf4llm.to_markdown(doc, **kwargs)
+
+
+def _extract_page(document, number):
+    """Convert one zero-based page to formatted markdown, using the cache"""
+    key = page_cache_key(document, number)
+    content = cache.get(key)
+    if content is None:
+        with document.lock:
+            scanned = settings.OCR_ENABLED and is_scanned_page(document.doc[number])
+            md_text = '' if scanned else _to_markdown(document.doc, number)
+        if scanned:
+            md_text = ocr_pages(document.path, [number])[number]
+        content = format_markdown_text(md_text)
+        cache.set(key, content, PAGE_CACHE_TIMEOUT)
+    return content
+
+
+def _prefetch(path, number):
+    try:
+        with documents.checkout(path) as document:
+            _extract_page(document, number)
+    except Exception as e:
+        logger.warning(f"Prefetch of page {number + 1} of {path} failed: {str(e)}")
+    finally:
+        with _pending_lock:
+            _pending_prefetches.discard((path, number))
+
+
+def prefetch_pages(document, number, radius=PREFETCH_RADIUS):
+    """Queue extraction of the pages around a zero-based page number"""
+    for neighbour in range(number - radius, number + radius + 1):
+        if neighbour == number or not 0 <= neighbour < document.page_count:
+            continue
+        if cache.get(page_cache_key(document, neighbour)) is not None:
+            continue
+        task = (document.path, neighbour)
+        with _pending_lock:
+            if task in _pending_prefetches:
+                continue
+            _pending_prefetches.add(task)
+        _prefetch_executor.submit(_prefetch, document.path, neighbour)
+
+
+def get_page(file_path, page_number, prefetch=True):
+    """
+    Return ``(markdown, page_count)`` for a one-based page of a PDF.
+
+    Only the requested page is converted; neighbouring pages are extracted
+    in the background so paging through the document stays fast.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    with documents.checkout(file_path) as document:
+        page_count = document.page_count
+        if not 1 <= page_number <= page_count:
+            raise IndexError(f"Page {page_number} out of range (1-{page_count})")
+
+        content = _extract_page(document, page_number - 1)
+        if prefetch:
+            prefetch_pages(document, page_number - 1)
+    return content, page_count
@@ -0,0 +1,76 @@
+"""
+Purging of soft-deleted projects.
+
+Deleting a project through the API only marks it DELETED. Once it has
+been deleted for ``PROJECT_PURGE_AFTER_DAYS``, ``purge_projects`` removes
+its files and rows. Rows are deleted a table at a time in batches, each
+in its own short transaction, so purging a large matter never holds long
+locks or loads all of its rows into memory.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Project, Document, Note, Resource, Chunk, Citation, ChatSession, ChatContext
+from .tiering import get_cold_storage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def purgeable_projects(now=None, after_days=None):
+    """Soft-deleted projects whose grace period is over"""
+    if after_days is None:
+        after_days = settings.PROJECT_PURGE_AFTER_DAYS
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=after_days)
+    return Project.all_objects.deleted().filter(deleted_at__lte=cutoff)
+
+
+def _delete_files(resources):
+    storage = Resource._meta.get_field('file').storage
+    cold = get_cold_storage()
+    for name in resources.exclude(file='').values_list('file', flat=True):
+        # Cold copies are kept after a file is fetched back, so check both tiers
+        for tier in (storage, cold):
+            try:
+                tier.delete(name)
+            except Exception as e:
+                logger.warning(f"Could not delete {name} from {type(tier).__name__}: {str(e)}")
+
+
+def _delete_in_batches(queryset, batch_size, before_delete=None):
+    """Delete the rows of a queryset ``batch_size`` at a time; returns how many were deleted"""
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        batch = model._base_manager.filter(pk__in=ids)
+        if before_delete:
+            before_delete(batch)
+        deleted += batch.delete()[1].get(model._meta.label, 0)
+
+
+def purge_project(project, batch_size=BATCH_SIZE):
+    """Delete a project's files and rows, dependents first; returns row counts per model"""
+    # Leaf tables first, so each batch delete has nothing left to cascade to
+    steps = (
+        (Citation, Citation.objects.filter(project=project), None),
+        (Chunk, Chunk.objects.filter(resource__project=project), None),
+        (ChatContext, ChatContext.objects.filter(chat_session__project=project), None),
+        (ChatSession, ChatSession.objects.filter(project=project), None),
+        (Resource, Resource.objects.filter(project=project), _delete_files),
+        (Note, Note.objects.filter(project=project), None),
+        (Document, Document.objects.filter(project=project), None),
+    )
+    counts = {}
+    for model, queryset, before_delete in steps:
+        counts[model._meta.label] = _delete_in_batches(queryset, batch_size, before_delete)
+    # Also drops the embedding index and the owner's access cache
+    project.delete()
+    counts[Project._meta.label] = 1
+    return counts
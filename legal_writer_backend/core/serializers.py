@@ -1,36 +1,72 @@
 from rest_framework import serializers
 """Provides classes for easily serializing complex data types into JSON or other content types."""
-from .models import Project, Document, Note, Resource, ChatSession, ChatContext
+from .models import Project, Document, Note, Resource, Chunk, ChatSession, ChatContext
 from django.contrib.auth.models import User
+from django.urls import reverse
+from .metrics import timed
+from .access import accessible_project_ids, can_access_project
 import logging
 
 logger = logging.getLogger('core')
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Record time spent turning instances into primitives as the ``serialize`` phase"""
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
 
-class ResourceSerializer(serializers.ModelSerializer):
+class ResourceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Resource
         fields = [
-            'id', 'project', 'title', 'file', 'file_type', 'description',
+            'id', 'project', 'title', 'file', 'download_url', 'file_type', 'description',
             'file_size', 'uploaded_at', 'content_extracted', 'extraction_error',
-            'last_extracted', 'summary', 'summary_error', 'last_summarized'
+            'last_extracted', 'summary', 'summary_error', 'last_summarized', 'storage_tier'
         ]
         read_only_fields = [
             'file_size', 'content_extracted', 'extraction_error', 'last_extracted',
-            'summary', 'summary_error', 'last_summarized'
+            'summary', 'summary_error', 'last_summarized', 'storage_tier'
+        ]
+
+    def get_download_url(self, obj):
+        url = reverse('resource-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class ChunkSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    headings = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Chunk
+        fields = [
+            'id', 'resource', 'position', 'headings', 'page_start', 'page_end',
+            'start_offset', 'end_offset', 'token_count', 'content'
         ]
 
-class NoteSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, include_content=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not include_content:
+            self.fields.pop('content')
+
+    def get_headings(self, obj):
+        from .chunks import HEADING_SEPARATOR
+        return obj.heading_path.split(HEADING_SEPARATOR) if obj.heading_path else []
+
+class NoteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Note
         fields = ['id', 'title', 'name_identifier', 'content', 'created_at', 'updated_at', 'project']
         read_only_fields = ['created_at', 'updated_at']
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     project = serializers.PrimaryKeyRelatedField(
         queryset=Project.objects.all(), 
         required=True,
@@ -61,7 +97,7 @@ class DocumentSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         # Comprehensive validation with detailed logging
-        logger.info(f"Validating document data: {data}")
+        logger.debug("Validating document data: fields %s, %d content chars", sorted(data), len(data.get('content') or ''))
         
         errors = {}
 
@@ -75,7 +111,7 @@ class DocumentSerializer(serializers.ModelSerializer):
             logger.error("No title provided in document creation")
             errors['title'] = 'Title is required and cannot be empty'
         elif len(data['title']) > 200:
-            logger.error(f"Title too long: {len(data['title'])} characters")
+            logger.error("Title too long: %d characters", len(data['title']))
             errors['title'] = 'Title cannot be longer than 200 characters'
         
         # Validate content
@@ -85,14 +121,14 @@ class DocumentSerializer(serializers.ModelSerializer):
         
         # Raise validation error if any errors found
         if errors:
-            logger.error(f"Validation errors in document creation: {errors}")
+            logger.error("Validation errors in document creation: %s", errors)
             raise serializers.ValidationError(errors)
         
         return data
 
     def validate_project(self, project):
         # Additional project validation
-        logger.info(f"Validating project: {project}")
+        logger.debug("Validating project: %s", project.pk if project else None)
         
         if not project:
             logger.error("Invalid project in document creation")
@@ -100,13 +136,13 @@ class DocumentSerializer(serializers.ModelSerializer):
         
         # Optional: Check if user has permission to create document in this project
         request = self.context.get('request')
-        if request and request.user != project.owner:
-            logger.error(f"User {request.user} does not own project {project}")
+        if request and not can_access_project(request, project.pk):
+            logger.error("User %s does not own project %s", request.user, project.pk)
             raise serializers.ValidationError('You do not have permission to create documents in this project')
         
         return project
 
-class ChatContextSerializer(serializers.ModelSerializer):
+class ChatContextSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     content = serializers.SerializerMethodField()
 
     class Meta:
@@ -114,6 +150,16 @@ class ChatContextSerializer(serializers.ModelSerializer):
         fields = ['id', 'chat_session', 'context_type', 'note', 'document', 'resource', 'added_at', 'content']
         read_only_fields = ['added_at']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None:
+            # Only sessions and items from the user's projects can be referenced
+            project_ids = accessible_project_ids(request, include_archived=True)
+            for name, model in (('chat_session', ChatSession), ('note', Note), ('document', Document), ('resource', Resource)):
+                fields[name].queryset = model.objects.filter(project_id__in=project_ids)
+        return fields
+
     def get_content(self, obj):
         return obj.get_content()
 
@@ -132,7 +178,7 @@ class ChatContextSerializer(serializers.ModelSerializer):
 
         return data
 
-class ChatSessionSerializer(serializers.ModelSerializer):
+class ChatSessionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     contexts = ChatContextSerializer(many=True, read_only=True)
 
     class Meta:
@@ -140,14 +186,16 @@ class ChatSessionSerializer(serializers.ModelSerializer):
         fields = ['id', 'project', 'title', 'created_at', 'updated_at', 'contexts']
         read_only_fields = ['created_at', 'updated_at']
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     documents = DocumentSerializer(many=True, read_only=True)
     notes = NoteSerializer(many=True, read_only=True)
     resources = ResourceSerializer(many=True, read_only=True)
     chat_sessions = ChatSessionSerializer(many=True, read_only=True)
+    # Deletion goes through DELETE, not a status change
+    status = serializers.ChoiceField(choices=[Project.ACTIVE, Project.ARCHIVED], required=False)
 
     class Meta:
         model = Project
-        fields = ['id', 'title', 'description', 'created_at', 'updated_at', 'owner', 'documents', 'notes', 'resources', 'chat_sessions']
+        fields = ['id', 'title', 'description', 'status', 'created_at', 'updated_at', 'owner', 'documents', 'notes', 'resources', 'chat_sessions']
         read_only_fields = ['created_at', 'updated_at', 'owner']
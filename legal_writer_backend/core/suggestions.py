@@ -0,0 +1,263 @@
+"""
+Inline writing suggestions for the document editor.
+
+The editor posts the text before the cursor (and optionally some after it)
+and gets a short continuation streamed back as NDJSON. It should feel like
+autocomplete, not chat, so the fast paths come first:
+
+* the user typed the first characters of the suggestion they were shown:
+  the rest of it is returned straight from memory;
+* the same preceding text was completed before: the cached completion is
+  returned (cache keys hash the preceding text, see ``cache_key``);
+* a generation for the same text is already running, e.g. a prefetch: the
+  request follows it instead of starting another.
+
+Each editor (user and document) has one generation slot. A request for
+different text cancels the generation before it, so a user who keeps
+typing never waits on, or pays for, suggestions for text that's gone.
+When a suggestion finishes, the suggestion that would follow it is
+prefetched in the slot, so accepting one suggestion and pausing shows the
+next one at once; typing anything else cancels that prefetch. Editors can
+also send ``prefetch: true`` when the user pauses, to warm the cache
+before they ask for the suggestion itself.
+
+Slots live in the process that serves the editor; the completion cache is
+Django's cache, so use a shared backend to share it between processes.
+Generations are tasks on the server's event loop, which outlive the
+request that started them, so suggestions are only served under ASGI: under
+WSGI each request runs on an event loop of its own that is gone when it ends.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import llm
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are an autocomplete engine for legal drafting. Continue the user's text from exactly "
+    "where it stops, in the same voice and style. Reply with the continuation only: a few words, "
+    "at most one sentence, with no quotes, commentary or repetition of the given text. Start with "
+    "a space if the continuation is a new word."
+)
+
+suggestion_latency = registry.histogram(
+    'legal_writer_suggestion_first_token_seconds',
+    'Time until the first text of an inline suggestion is sent, by where it came from',
+    ('source',),
+)
+
+
+def cache_key(prefix, suffix=''):
+    """Cache key for a completion; only the text within the model's window matters"""
+    prefix = prefix[-settings.SUGGEST_CONTEXT_CHARS:]
+    suffix = suffix[:settings.SUGGEST_SUFFIX_CHARS]
+    digest = hashlib.sha256(f"{llm.primary_model('suggest')}\0{prefix}\0{suffix}".encode('utf-8')).hexdigest()
+    return f'suggestion:v1:{digest}'
+
+
+def build_messages(prefix, suffix=''):
+    user = prefix[-settings.SUGGEST_CONTEXT_CHARS:]
+    if suffix:
+        user = f"{user}[CURSOR]{suffix[:settings.SUGGEST_SUFFIX_CHARS]}\n\nContinue at [CURSOR]."
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': user},
+    ]
+
+
+async def stream_completion(prefix, suffix=''):
+    """Yield pieces of a continuation as the model produces them"""
+    # With every model throttled there's simply no suggestion
+    async for text in llm.stream(
+        'suggest', build_messages(prefix, suffix), fallback=lambda: '',
+        temperature=0.2, max_tokens=settings.SUGGEST_MAX_TOKENS, stop=['\n\n'],
+    ):
+        yield text
+
+
+class Generation:
+    """One completion being produced, which any number of requests can follow"""
+
+    def __init__(self, key, prefix, suffix):
+        self.key = key
+        self.prefix = prefix
+        self.suffix = suffix
+        self.parts = []
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.create_task(self._run())
+        self.task.add_done_callback(self._settle)
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _run(self):
+        try:
+            cached = await cache.aget(self.key)
+            if cached is not None:
+                self.parts.append(cached)
+                return
+            async for text in stream_completion(self.prefix, self.suffix):
+                self.parts.append(text)
+                await self._notify()
+            suggestion = self.text
+            if suggestion.strip():
+                await cache.aset(self.key, suggestion, settings.SUGGEST_CACHE_TTL)
+        except asyncio.CancelledError:
+            self.cancelled = True
+        except Exception as e:
+            logger.warning(f"Suggestion failed: {str(e)}")
+            self.error = e
+        finally:
+            self.done = True
+            await asyncio.shield(self._notify())
+
+    def _settle(self, task):
+        # A task cancelled before its first step never runs _run, so its
+        # followers would wait forever
+        if not self.done:
+            self.cancelled = task.cancelled()
+            self.done = True
+            asyncio.ensure_future(self._notify())
+
+    def cancel(self):
+        if not self.done:
+            self.task.cancel()
+
+    async def follow(self):
+        """Yield the generation's text pieces, from the start, as they arrive"""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.parts) > sent)
+            while sent < len(self.parts):
+                sent += 1
+                yield self.parts[sent - 1]
+            if self.done and sent == len(self.parts):
+                return
+
+
+class Editor:
+    """The generation slot and last suggestion of one user's editor on one document"""
+
+    def __init__(self):
+        self.generation = None
+        self.last_prefix = None
+        self.last_suggestion = ''
+        self.used = time.monotonic()
+
+    def typed_through(self, prefix, suffix):
+        """The rest of the last suggestion, if the user has been typing it"""
+        if self.last_prefix is None or not prefix.startswith(self.last_prefix):
+            return None
+        typed = prefix[len(self.last_prefix):]
+        if typed and len(typed) < len(self.last_suggestion) and self.last_suggestion.startswith(typed):
+            return self.last_suggestion[len(typed):]
+        return None
+
+    def supersede(self, key):
+        """Cancel the running generation unless it's for this key"""
+        if self.generation is not None and self.generation.key != key:
+            self.generation.cancel()
+
+    def start(self, prefix, suffix):
+        """The generation for this text: the running one if it matches, else a new one"""
+        key = cache_key(prefix, suffix)
+        current = self.generation
+        if current is not None and current.key == key and not (current.cancelled or current.error):
+            return current
+        self.supersede(key)
+        self.generation = Generation(key, prefix, suffix)
+        return self.generation
+
+    def remember(self, prefix, suggestion):
+        self.last_prefix = prefix
+        self.last_suggestion = suggestion
+
+    def prefetch_next(self, prefix, suffix, suggestion):
+        """Start on what would follow the suggestion, in case it's accepted"""
+        if settings.SUGGEST_PREFETCH_ACCEPTED and suggestion.strip():
+            self.start(prefix + suggestion, suffix)
+
+
+_editors = {}
+
+
+def get_editor(user_id, document_id):
+    now = time.monotonic()
+    # Forget editors nobody has used for a while
+    for key, editor in list(_editors.items()):
+        if now - editor.used > settings.SUGGEST_EDITOR_TTL and (editor.generation is None or editor.generation.done):
+            del _editors[key]
+    editor = _editors.setdefault((user_id, document_id), Editor())
+    editor.used = now
+    return editor
+
+
+def _line(event, **data):
+    return json.dumps({'event': event, **data}) + '\n'
+
+
+async def prefetch(editor, prefix, suffix=''):
+    """Warm the cache for this text; returns whether a generation was started"""
+    if editor.typed_through(prefix, suffix) is not None:
+        return False
+    if await cache.aget(cache_key(prefix, suffix)) is not None:
+        return False
+    editor.start(prefix, suffix)
+    return True
+
+
+async def suggest(editor, prefix, suffix=''):
+    """Yield NDJSON lines streaming a suggestion for the text around the cursor"""
+    started = time.perf_counter()
+
+    remainder = editor.typed_through(prefix, suffix)
+    if remainder is not None:
+        suggestion_latency.observe(time.perf_counter() - started, source='typed')
+        yield _line('done', suggestion=remainder, source='typed')
+        return
+
+    key = cache_key(prefix, suffix)
+    cached = await cache.aget(key)
+    if cached is not None:
+        editor.supersede(key)
+        suggestion_latency.observe(time.perf_counter() - started, source='cache')
+        editor.remember(prefix, cached)
+        editor.prefetch_next(prefix, suffix, cached)
+        yield _line('done', suggestion=cached, source='cache')
+        return
+
+    generation = editor.start(prefix, suffix)
+    first = True
+    async for text in generation.follow():
+        if first:
+            suggestion_latency.observe(time.perf_counter() - started, source='model')
+            first = False
+        yield _line('delta', text=text)
+
+    if generation.cancelled:
+        # Superseded by a request for newer text
+        yield _line('cancelled')
+    elif generation.error is not None:
+        yield _line('error', error='Suggestions are unavailable right now')
+    else:
+        suggestion = generation.text
+        editor.remember(prefix, suggestion)
+        editor.prefetch_next(prefix, suffix, suggestion)
+        yield _line('done', suggestion=suggestion, source='model')
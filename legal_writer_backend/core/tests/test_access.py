@@ -0,0 +1,121 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.access import accessible_project_ids, can_access_project
+from core.models import ChatSession, Note, Project
+from core.serializers import ChatContextSerializer
+
+
+class ProjectAccessTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.other = User.objects.create_user('other')
+        self.active = Project.objects.create(title='Smith v Jones', owner=self.owner)
+        self.archived = Project.objects.create(title='Old matter', owner=self.owner, status=Project.ARCHIVED)
+        self.deleted = Project.objects.create(title='Gone', owner=self.owner)
+        self.deleted.soft_delete()
+        self.foreign = Project.objects.create(title='Not yours', owner=self.other)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_active_and_archived_projects(self):
+        request = self.request(self.owner)
+        self.assertEqual(accessible_project_ids(request), {self.active.pk})
+        self.assertEqual(accessible_project_ids(request, include_archived=True), {self.active.pk, self.archived.pk})
+
+    def test_can_access_project(self):
+        request = self.request(self.owner)
+        self.assertTrue(can_access_project(request, self.active.pk))
+        self.assertTrue(can_access_project(request, str(self.archived.pk)))
+        self.assertFalse(can_access_project(request, self.deleted.pk))
+        self.assertFalse(can_access_project(request, self.foreign.pk))
+        self.assertFalse(can_access_project(request, 'not-a-number'))
+
+    def test_resolved_once_per_request(self):
+        request = self.request(self.owner)
+        with self.assertNumQueries(1):
+            accessible_project_ids(request)
+            accessible_project_ids(request, include_archived=True)
+            can_access_project(request, self.active.pk)
+
+    def test_new_project_is_rechecked(self):
+        request = self.request(self.owner)
+        accessible_project_ids(request)
+        project = Project.objects.create(title='New matter', owner=self.owner)
+        self.assertTrue(can_access_project(request, project.pk))
+        self.assertIn(project.pk, accessible_project_ids(request))
+
+    @override_settings(PROJECT_ACCESS_CACHE_TIMEOUT=30)
+    def test_cached_across_requests(self):
+        accessible_project_ids(self.request(self.owner))
+        with self.assertNumQueries(0):
+            self.assertEqual(accessible_project_ids(self.request(self.owner)), {self.active.pk})
+
+    @override_settings(PROJECT_ACCESS_CACHE_TIMEOUT=30)
+    def test_archiving_invalidates_the_cache(self):
+        accessible_project_ids(self.request(self.owner))
+        self.active.status = Project.ARCHIVED
+        self.active.save()
+
+        request = self.request(self.owner)
+        self.assertEqual(accessible_project_ids(request), set())
+        self.assertIn(self.active.pk, accessible_project_ids(request, include_archived=True))
+
+    @override_settings(PROJECT_ACCESS_CACHE_TIMEOUT=30)
+    def test_change_of_owner_invalidates_both_owners(self):
+        accessible_project_ids(self.request(self.owner))
+        accessible_project_ids(self.request(self.other))
+        self.active.owner = self.other
+        self.active.save()
+
+        self.assertNotIn(self.active.pk, accessible_project_ids(self.request(self.owner)))
+        self.assertIn(self.active.pk, accessible_project_ids(self.request(self.other)))
+
+    @override_settings(PROJECT_ACCESS_CACHE_TIMEOUT=30)
+    def test_deleting_invalidates_the_cache(self):
+        accessible_project_ids(self.request(self.owner))
+        self.active.soft_delete()
+        self.assertFalse(can_access_project(self.request(self.owner), self.active.pk))
+
+    def test_anonymous_user(self):
+        request = self.request(AnonymousUser())
+        self.assertEqual(accessible_project_ids(request, include_archived=True), set())
+        self.assertFalse(can_access_project(request, self.active.pk))
+
+
+class ChatContextScopeTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.other = User.objects.create_user('other')
+        project = Project.objects.create(title='Smith v Jones', owner=self.owner)
+        archived = Project.objects.create(title='Old matter', owner=self.owner, status=Project.ARCHIVED)
+        foreign = Project.objects.create(title='Not yours', owner=self.other)
+        self.session = ChatSession.objects.create(project=project, title='Research')
+        self.archived_note = Note.objects.create(project=archived, title='Old', content='Kept')
+        self.foreign_note = Note.objects.create(project=foreign, title='Secret', content='Privileged')
+        self.foreign_session = ChatSession.objects.create(project=foreign, title='Theirs')
+
+    def serializer(self, **data):
+        request = RequestFactory().post('/')
+        request.user = self.owner
+        return ChatContextSerializer(data={'context_type': 'NOTE', **data}, context={'request': request})
+
+    def test_own_archived_note(self):
+        serializer = self.serializer(chat_session=self.session.pk, note=self.archived_note.pk)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_another_users_note(self):
+        serializer = self.serializer(chat_session=self.session.pk, note=self.foreign_note.pk)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('note', serializer.errors)
+
+    def test_another_users_session(self):
+        serializer = self.serializer(chat_session=self.foreign_session.pk, note=self.archived_note.pk)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('chat_session', serializer.errors)
@@ -0,0 +1,94 @@
+import io
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from core.archives import ARCHIVE_FORMATS, ArchiveError, import_project, iter_export
+from core.models import ChatContext, ChatSession, Chunk, Document, Note, Project, Resource
+
+CONTENT = '# Facts\n\nDonoghue v Stevenson [1932] AC 562 at [44].\n\n# Held\n\nThe appeal succeeds.'
+
+
+class ArchiveRoundTripTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.owner = User.objects.create_user('owner')
+        self.project = Project.objects.create(title='Smith v Jones', description='Appeal', owner=self.owner)
+        self.document = Document.objects.create(project=self.project, title='Heads', content=CONTENT)
+        self.note = Note.objects.create(project=self.project, title='Todo', content='File by Friday')
+        self.data = b'The judgment text.\n' * 5000
+        self.resource = Resource.objects.create(
+            project=self.project, title='Judgment', file=SimpleUploadedFile('judgment.txt', self.data),
+            file_type='TXT', file_size=len(self.data), content_extracted=CONTENT,
+        )
+        self.resource.rebuild_index()
+        session = ChatSession.objects.create(project=self.project, title='Research')
+        ChatContext.objects.create(chat_session=session, context_type='NOTE', note=self.note)
+        ChatContext.objects.create(chat_session=session, context_type='RESOURCE', resource=self.resource)
+
+    def round_trip(self, archive_format):
+        data = b''.join(iter_export(self.project, archive_format))
+        return import_project(io.BytesIO(data), self.owner)
+
+    def test_round_trip(self):
+        for archive_format in ARCHIVE_FORMATS:
+            with self.subTest(archive_format=archive_format):
+                project = self.round_trip(archive_format)
+                self.assertNotEqual(project.pk, self.project.pk)
+                self.assertEqual((project.title, project.description), (self.project.title, self.project.description))
+
+                document = project.documents.get()
+                self.assertEqual((document.title, document.content), (self.document.title, self.document.content))
+                self.assertEqual(document.created_at, self.document.created_at)
+                self.assertEqual(project.notes.get().content, self.note.content)
+
+                resource = project.resources.get()
+                self.assertEqual(resource.uploaded_at, self.resource.uploaded_at)
+                self.assertNotEqual(resource.file.name, self.resource.file.name)
+                with resource.file.open('rb') as f:
+                    self.assertEqual(f.read(), self.data)
+
+                self.assertEqual(
+                    list(Chunk.objects.filter(resource=resource).values_list('position', 'heading_path', 'content')),
+                    list(Chunk.objects.filter(resource=self.resource).values_list('position', 'heading_path', 'content')),
+                )
+                # Citations are rebuilt rather than exported
+                self.assertEqual(
+                    sorted(resource.citations.values_list('key', flat=True)),
+                    sorted(self.resource.citations.values_list('key', flat=True)),
+                )
+                contexts = ChatContext.objects.filter(chat_session__project=project)
+                self.assertEqual(
+                    sorted(contexts.values_list('context_type', 'note__project', 'resource__project')),
+                    [('NOTE', project.pk, None), ('RESOURCE', None, project.pk)],
+                )
+
+    def test_invalid_archive_leaves_nothing_behind(self):
+        with self.assertRaises(ArchiveError):
+            import_project(io.BytesIO(b'not an archive'), self.owner)
+        self.assertEqual(Project.all_objects.count(), 1)
+
+    def test_status(self):
+        for status, imported in ((Project.ARCHIVED, Project.ARCHIVED), (Project.DELETED, Project.ACTIVE)):
+            with self.subTest(status=status):
+                self.project.status = status
+                self.project.save()
+                self.assertEqual(self.round_trip('zip').status, imported)
+
+    def test_import_limits(self):
+        limits = {'ARCHIVE_IMPORT_MAX_MEMBERS': 3}, {'ARCHIVE_IMPORT_MAX_BYTES': len(self.data) // 2}
+        storage = Resource._meta.get_field('file').storage
+        for archive_format in ARCHIVE_FORMATS:
+            for limit in limits:
+                with self.subTest(archive_format=archive_format, limit=limit), override_settings(**limit):
+                    with self.assertRaises(ArchiveError):
+                        self.round_trip(archive_format)
+                    self.assertEqual(Project.all_objects.count(), 1)
+                    self.assertEqual(storage.listdir(Resource._meta.get_field('file').upload_to)[1], ['judgment.txt'])
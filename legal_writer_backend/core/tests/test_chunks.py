@@ -0,0 +1,75 @@
+from django.test import SimpleTestCase
+
+from core.chunks import HEADING_SEPARATOR, iter_chunks, iter_sections, parse_range
+
+TEXT = (
+    "Preamble text.\n\n"
+    "# Part 1\n\n"
+    "Intro to part one.\n\n"
+    "## Definitions\n\n"
+    "A term means a thing.\n\n"
+    "## Scope\n\n"
+    "Applies everywhere.\n\n"
+    "# Part 2\n\n"
+    "Second part."
+)
+
+
+class IterSectionsTests(SimpleTestCase):
+    def test_heading_paths(self):
+        sections = [(TEXT[start:end].split('\n')[0], headings) for start, end, headings in iter_sections(TEXT)]
+        self.assertEqual(sections, [
+            ('Preamble text.', []),
+            ('# Part 1', ['Part 1']),
+            ('## Definitions', ['Part 1', 'Definitions']),
+            ('## Scope', ['Part 1', 'Scope']),
+            ('# Part 2', ['Part 2']),
+        ])
+
+    def test_heading_markup_is_stripped(self):
+        [(_, _, headings)] = iter_sections('### **Notice** ###\n\nText')
+        self.assertEqual(headings, ['Notice'])
+
+
+class IterChunksTests(SimpleTestCase):
+    def test_offsets_point_at_the_content(self):
+        chunks = list(iter_chunks(TEXT))
+        self.assertEqual(len(chunks), 5)
+        for chunk in chunks:
+            self.assertEqual(TEXT[chunk['start_offset']:chunk['end_offset']], chunk['content'])
+            self.assertEqual(chunk['content'], chunk['content'].strip())
+        self.assertEqual(chunks[2]['heading_path'], HEADING_SEPARATOR.join(['Part 1', 'Definitions']))
+        self.assertEqual(chunks[2]['content'], '## Definitions\n\nA term means a thing.')
+
+    def test_chunks_stay_under_the_limit(self):
+        paragraph = ' '.join(['word'] * 60) + '.'
+        text = '# Long\n\n' + '\n\n'.join([paragraph] * 20)
+        chunks = list(iter_chunks(text, max_tokens=100))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(chunk['token_count'], 100)
+            self.assertEqual(chunk['heading_path'], 'Long')
+            self.assertEqual(text[chunk['start_offset']:chunk['end_offset']], chunk['content'])
+        # Nothing is lost between chunks
+        self.assertEqual(sum(chunk['content'].count('word') for chunk in chunks), 60 * 20)
+
+    def test_oversized_sentences_are_split_by_word(self):
+        text = ' '.join(['x' * 9] * 200)
+        chunks = list(iter_chunks(text, max_tokens=50))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(' '.join(chunk['content'] for chunk in chunks), text)
+
+    def test_pages(self):
+        text = 'Page one.\n\n# Heading\n\nPage two.'
+        chunks = list(iter_chunks(text, page_offsets=[0, text.index('Page two')]))
+        self.assertEqual([(c['page_start'], c['page_end']) for c in chunks], [(1, 1), (1, 2)])
+        self.assertIsNone(next(iter_chunks(text))['page_start'])
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range('3'), (3, 3))
+        self.assertEqual(parse_range('2-5'), (2, 5))
+        for value in ('5-2', '-1', 'a', ''):
+            with self.assertRaises(ValueError):
+                parse_range(value)
@@ -0,0 +1,62 @@
+import time
+
+from django.test import SimpleTestCase
+
+from core.citations import iter_citations, normalize_key, query_keys
+from core.models import Citation
+
+TEXT = (
+    "In Donoghue v Stevenson [1932] AC 562 at [45] the court held. See S v Makwanyane 1995 (3) SA 391 (CC), "
+    "para 12. Section 12(3)(a) of the Companies Act 71 of 2008 applies, as does the Labour Relations Act 66 "
+    "of 1995 and s 23. Brown v. Board of Education, 347 U.S. 483 (1954). [2019] ZASCA 12 paras 3-5."
+)
+
+
+class IterCitationsTests(SimpleTestCase):
+    def test_patterns(self):
+        found = [(kind, raw, key, authority) for kind, raw, key, _, _, authority in iter_citations(TEXT)]
+        self.assertEqual(found, [
+            (Citation.CASE, 'Donoghue v Stevenson', 'donoghue v stevenson', ''),
+            (Citation.CASE, '[1932] AC 562', '[1932] ac 562', ''),
+            (Citation.PARAGRAPH, 'at [45]', 'para 45', '[1932] ac 562'),
+            (Citation.CASE, 'S v Makwanyane', 's v makwanyane', ''),
+            (Citation.CASE, '1995 (3) SA 391 (CC)', '1995 (3) sa 391 (cc)', ''),
+            (Citation.PARAGRAPH, 'para 12', 'para 12', '1995 (3) sa 391 (cc)'),
+            (Citation.STATUTE, 'Section 12(3)(a) of the Companies Act 71 of 2008',
+             's 12(3)(a) companies act 71 of 2008', ''),
+            (Citation.STATUTE, 'the Labour Relations Act 66 of 1995', 'labour relations act 66 of 1995', ''),
+            (Citation.STATUTE, 's 23', 's 23', ''),
+            (Citation.CASE, 'Brown v. Board of Education', 'brown v board of education', ''),
+            (Citation.CASE, '347 U.S. 483', '347 u.s. 483', ''),
+            (Citation.CASE, '[2019] ZASCA 12', '[2019] zasca 12', ''),
+            (Citation.PARAGRAPH, 'paras 3-5', 'para 3-5', '[2019] zasca 12'),
+        ])
+
+    def test_offsets(self):
+        for _, raw, _, start, end, _ in iter_citations(TEXT):
+            self.assertEqual(TEXT[start:end], raw)
+
+    def test_long_act_names(self):
+        [(kind, raw, *_)] = iter_citations('under the Promotion of Administrative Justice Act 3 of 2000.')
+        self.assertEqual((kind, raw), (Citation.STATUTE, 'the Promotion of Administrative Justice Act 3 of 2000'))
+
+    def test_long_capitalized_runs_are_linear(self):
+        # Tables of contents and headings in capitals once took quadratic time
+        for text in ('WORD ' * 20000, 'Title Of ' * 12000, 'Capital Words Here ' * 5000 + 'Act 5 of 2001'):
+            started = time.perf_counter()
+            citations = list(iter_citations(text))
+            self.assertLess(time.perf_counter() - started, 5)
+        self.assertEqual(citations[-1][1], 'Capital Words Here Capital Words Here Capital Words Here Act 5 of 2001')
+
+
+class NormalizeKeyTests(SimpleTestCase):
+    def test_statute_prefixes(self):
+        self.assertEqual(normalize_key(Citation.STATUTE, 'Sections 12 of the Act'), 's 12 act')
+        self.assertEqual(normalize_key(Citation.STATUTE, 'Regulation 4'), 'reg 4')
+
+    def test_us_reporters(self):
+        self.assertEqual(normalize_key(Citation.CASE, '123 S. Ct. 45'), normalize_key(Citation.CASE, '123 S.Ct. 45'))
+
+    def test_query_keys(self):
+        self.assertEqual(query_keys('Donoghue v. Stevenson', Citation.CASE), {'donoghue v stevenson'})
+        self.assertNotIn('para ', query_keys('donoghue'))
@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import collab
+from core.models import Document, Project
+
+
+class FakeClient:
+    """One WebSocket connection to ``websocket_application``, driven through its ASGI queues"""
+
+    def __init__(self, path, token=None):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = asyncio.create_task(collab.websocket_application(
+            {'type': 'websocket', 'path': path, 'query_string': b''}, self.incoming.get, self.outgoing.put,
+        ))
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        if token is not None:
+            self.send({'type': 'auth', 'token': token})
+
+    def send(self, message):
+        self.incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        """The next message, decoded, or the ASGI event for anything but a send"""
+        message = await asyncio.wait_for(self.outgoing.get(), 2)
+        return json.loads(message['text']) if message['type'] == 'websocket.send' else message
+
+    async def receive_type(self, kind):
+        message = await self.receive()
+        while message.get('type') != kind:
+            message = await self.receive()
+        return message
+
+    async def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 2)
+
+
+@override_settings(COLLAB_SAVE_DELAY=60, COLLAB_SAVE_MAX_DELAY=60, COLLAB_AUTH_TIMEOUT=2)
+class RoomTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.other = User.objects.create_user('other')
+        self.project = Project.objects.create(title='Smith v Jones', owner=self.owner)
+        self.document = Document.objects.create(project=self.project, title='Heads', content='hello world')
+        self.path = f'/ws/documents/{self.document.pk}/'
+        self.token = str(AccessToken.for_user(self.owner))
+        self.addCleanup(collab._rooms.clear)
+
+    async def connect(self):
+        client = FakeClient(self.path, self.token)
+        self.assertEqual(await client.receive(), {'type': 'websocket.accept'})
+        init = await client.receive()
+        self.assertEqual(init['type'], 'init')
+        return client, init
+
+    async def saved_content(self):
+        return (await Document.objects.aget(pk=self.document.pk)).content
+
+    async def assert_closed(self, client, code):
+        message = await client.receive()
+        if message['type'] == 'websocket.accept':
+            message = await client.receive()
+        self.assertEqual(message, {'type': 'websocket.close', 'code': code})
+        await asyncio.wait_for(client.task, 2)
+
+    async def test_first_message_authenticates(self):
+        client = FakeClient(self.path)
+        client.send({'type': 'presence', 'cursor': {}})
+        await self.assert_closed(client, collab.CLOSE_UNAUTHORIZED)
+
+        await self.assert_closed(FakeClient(self.path, 'not-a-token'), collab.CLOSE_UNAUTHORIZED)
+        await self.assert_closed(FakeClient(self.path, str(AccessToken.for_user(self.other))), collab.CLOSE_NOT_FOUND)
+        await self.assert_closed(FakeClient('/ws/elsewhere/', self.token), collab.CLOSE_NOT_FOUND)
+
+        with override_settings(COLLAB_AUTH_TIMEOUT=0.05):
+            await self.assert_closed(FakeClient(self.path), collab.CLOSE_UNAUTHORIZED)
+
+    async def test_apply_and_broadcast(self):
+        alice, init = await self.connect()
+        self.assertEqual((init['revision'], init['content'], init['clients']), (0, 'hello world', []))
+        bob, init = await self.connect()
+        self.assertEqual(len(init['clients']), 1)
+        self.assertEqual((await alice.receive())['type'], 'join')
+
+        alice.send({'type': 'op', 'revision': 0, 'op': ['Oh, ', 11]})
+        self.assertEqual(await alice.receive(), {'type': 'ack', 'revision': 1})
+        message = await bob.receive()
+        self.assertEqual((message['type'], message['revision'], message['op']), ('op', 1, ['Oh, ', 11]))
+        self.assertEqual(collab.open_room_content(self.document.pk), 'Oh, hello world')
+
+        await alice.disconnect()
+        self.assertEqual((await bob.receive())['type'], 'leave')
+        await bob.disconnect()
+
+    async def test_concurrent_edits_are_rebased(self):
+        alice, _ = await self.connect()
+        bob, _ = await self.connect()
+
+        # Both edit revision 0; Bob's edit arrives second and is transformed past Alice's
+        alice.send({'type': 'op', 'revision': 0, 'op': ['Oh, ', 11]})
+        bob.send({'type': 'op', 'revision': 0, 'op': [5, -6, ' there']})
+        self.assertEqual(await alice.receive_type('ack'), {'type': 'ack', 'revision': 1})
+        self.assertEqual(await bob.receive_type('ack'), {'type': 'ack', 'revision': 2})
+
+        rebased = await alice.receive_type('op')
+        self.assertEqual((rebased['revision'], rebased['op']), (2, [9, -6, ' there']))
+        self.assertEqual(collab.open_room_content(self.document.pk), 'Oh, hello there')
+
+        bob.send({'type': 'op', 'revision': 3, 'op': [1]})
+        self.assertEqual((await bob.receive())['error'], 'Invalid revision')
+
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_resync_when_too_far_behind(self):
+        with override_settings(COLLAB_HISTORY=2):
+            alice, _ = await self.connect()
+        for revision in range(3):
+            alice.send({'type': 'op', 'revision': revision, 'op': ['a', 11 + revision]})
+            await alice.receive_type('ack')
+        alice.send({'type': 'op', 'revision': 0, 'op': [11]})
+        self.assertEqual(await alice.receive(), {'type': 'resync', 'revision': 3, 'content': 'aaahello world'})
+        await alice.disconnect()
+
+    async def test_edits_are_saved_after_a_quiet_spell(self):
+        with override_settings(COLLAB_SAVE_DELAY=0.1, COLLAB_SAVE_MAX_DELAY=10):
+            alice, _ = await self.connect()
+            alice.send({'type': 'op', 'revision': 0, 'op': ['Oh, ', 11]})
+            await alice.receive_type('ack')
+            alice.send({'type': 'op', 'revision': 1, 'op': [15, '!']})
+            await alice.receive_type('ack')
+            self.assertEqual(await self.saved_content(), 'hello world')
+
+            await asyncio.sleep(0.3)
+            self.assertEqual(await self.saved_content(), 'Oh, hello world!')
+            await alice.disconnect()
+
+    async def test_last_client_leaving_saves(self):
+        alice, _ = await self.connect()
+        alice.send({'type': 'op', 'revision': 0, 'op': [11, '.']})
+        await alice.receive_type('ack')
+        await alice.disconnect()
+        self.assertEqual(await self.saved_content(), 'hello world.')
+        self.assertIsNone(collab.open_room_content(self.document.pk))
+
+    async def test_close_rooms_flushes_and_disconnects(self):
+        alice, _ = await self.connect()
+        alice.send({'type': 'op', 'revision': 0, 'op': [11, '.']})
+        await alice.receive_type('ack')
+
+        await collab.close_rooms()
+        self.assertEqual(await self.saved_content(), 'hello world.')
+        self.assertEqual(await alice.receive(), {'type': 'websocket.close', 'code': collab.CLOSE_SERVICE_RESTART})
+        await alice.disconnect()
+
+    async def test_rest_updates_are_refused_while_open(self):
+        def update(content):
+            client = APIClient()
+            client.force_authenticate(self.owner)
+            return client.put(
+                f'/api/documents/{self.document.pk}/',
+                {'project': self.project.pk, 'title': 'Heads of argument', 'content': content},
+                format='json',
+            )
+
+        alice, _ = await self.connect()
+        self.assertEqual((await sync_to_async(update)('Overwritten')).status_code, 409)
+        # Leaving the content as it is in the room is fine
+        self.assertEqual((await sync_to_async(update)('hello world')).status_code, 200)
+        await alice.disconnect()
+        self.assertEqual((await sync_to_async(update)('Overwritten')).status_code, 200)
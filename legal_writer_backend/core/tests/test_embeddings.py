@@ -0,0 +1,119 @@
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core import embeddings
+from core.embeddings import ProjectIndex, get_embedder, get_index, search_project, sync_project
+from core.models import Document, Note, Project
+
+
+class EmbeddingIndexTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = override_settings(EMBEDDING_INDEX_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        embeddings._indexes.clear()
+        self.addCleanup(embeddings._indexes.clear)
+        # Searches would otherwise queue syncs on the background thread
+        patcher = mock.patch('core.embeddings.schedule_sync')
+        self.schedule_sync = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        owner = User.objects.create_user('owner')
+        self.project = Project.objects.create(title='Matter', owner=owner)
+
+    def document(self, title, content):
+        return Document.objects.create(project=self.project, title=title, content=content)
+
+    def index(self):
+        return ProjectIndex(self.project.pk, get_embedder())
+
+    def live_rows(self, index):
+        return int(index.rows['live'][:index.count].sum())
+
+    def search(self, query, **kwargs):
+        return [match['id'] for match in search_project(self.project.pk, query, **kwargs)]
+
+    def test_sync_and_search(self):
+        negligence = self.document('Heads', '# Negligence\n\nThe defendant owed a duty of care to the plaintiff.')
+        self.document('Costs', 'Costs follow the event and are taxed on the party and party scale.')
+        note = Note.objects.create(project=self.project, title='n', content='The limitation period for delict.')
+
+        self.assertEqual(sync_project(self.project.pk), (3, 3))
+        self.assertEqual(self.search('duty of care')[0], f'doc_{negligence.pk}')
+        self.assertEqual(self.search('limitation period', kinds=['note']), [f'note_{note.pk}'])
+        self.schedule_sync.assert_not_called()
+        # Nothing changed, nothing is embedded
+        self.assertEqual(sync_project(self.project.pk), (0, 3))
+
+    def test_search_reads_the_committed_index_and_queues_a_sync(self):
+        sync_project(self.project.pk)
+        document = self.document('Heads', 'The defendant owed a duty of care.')
+        self.assertEqual(self.search('duty of care'), [])
+        self.schedule_sync.assert_called_once_with(self.project.pk)
+
+        sync_project(self.project.pk)
+        self.assertEqual(self.search('duty of care'), [f'doc_{document.pk}'])
+
+    def test_changed_sources_replace_their_rows(self):
+        document = self.document('Heads', 'The defendant owed a duty of care.')
+        sync_project(self.project.pk)
+        document.content = 'Prescription runs for three years.'
+        document.save()
+        self.assertTrue(get_index(self.project.pk).is_stale())
+
+        self.assertEqual(sync_project(self.project.pk), (1, 2))
+        index = self.index()
+        self.assertEqual(self.live_rows(index), 1)
+        self.assertEqual(self.search('duty of care'), [])
+        self.assertEqual(self.search('prescription'), [f'doc_{document.pk}'])
+
+    def test_sources_without_chunks(self):
+        # An empty note commits an index without any vectors
+        note = Note.objects.create(project=self.project, title='n', content='')
+        self.assertEqual(sync_project(self.project.pk), (0, 0))
+        note.content = 'Now with text about the lease.'
+        note.save()
+        self.assertEqual(sync_project(self.project.pk), (1, 1))
+        note.content = ''
+        note.save()
+        self.assertEqual(sync_project(self.project.pk), (0, 0))
+        self.assertEqual(self.search('lease'), [])
+
+    def test_compaction(self):
+        documents = [self.document(f'Doc {i}', f'Clause {i} about the sale of goods.') for i in range(6)]
+        sync_project(self.project.pk)
+        for document in documents[:4]:
+            document.delete()
+        # Four of six rows dead is past MAX_DEAD_RATIO
+        sync_project(self.project.pk)
+        index = self.index()
+        self.assertEqual((index.count, self.live_rows(index)), (2, 2))
+        self.assertEqual(sorted(self.search('sale of goods')), sorted(f'doc_{d.pk}' for d in documents[4:]))
+
+        for document in documents[4:]:
+            document.delete()
+        self.assertEqual(sync_project(self.project.pk), (0, 0))
+        self.assertEqual(self.search('sale of goods'), [])
+
+    def test_clustered_search(self):
+        topics = ['lease rent landlord tenant', 'murder sentence accused trial', 'merger shares company board']
+        documents = [self.document(f'Doc {i}', f'{topics[i % 3]} number {i}.') for i in range(30)]
+        with mock.patch.object(embeddings, 'IVF_MIN_ROWS', 10):
+            sync_project(self.project.pk)
+        index = self.index()
+        self.assertIsNotNone(index.centroids)
+        with override_settings(EMBEDDING_NPROBE=2):
+            results = self.search('landlord tenant rent', k=5)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result in {f'doc_{d.pk}' for d in documents[0::3]} for result in results))
+
+    def test_rebuild(self):
+        self.document('Heads', 'The defendant owed a duty of care.')
+        sync_project(self.project.pk)
+        self.assertEqual(sync_project(self.project.pk, rebuild=True), (1, 1))
+        self.assertEqual(self.live_rows(self.index()), 1)
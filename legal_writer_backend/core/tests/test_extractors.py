@@ -0,0 +1,136 @@
+import os
+import tempfile
+import zipfile
+
+from django.test import SimpleTestCase
+
+from core import extractors
+from core.extractors import RTFReader, extract_docx, extract_file, extract_rtf
+
+# RTF's unicode control word, spelled out so it can't be taken for a Python escape
+U = '\\' + 'u'
+
+DOCX_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def paragraph(text, style=None, level=None):
+    properties = ''
+    if style:
+        properties += f'<w:pStyle w:val="{style}"/>'
+    if level is not None:
+        properties += f'<w:numPr><w:ilvl w:val="{level}"/></w:numPr>'
+    if properties:
+        properties = f'<w:pPr>{properties}</w:pPr>'
+    return f'<w:p>{properties}<w:r><w:t>{text}</w:t></w:r></w:p>'
+
+
+def table(rows):
+    cells = ''.join(
+        '<w:tr>' + ''.join(f'<w:tc>{cell}</w:tc>' for cell in row) + '</w:tr>' for row in rows
+    )
+    return f'<w:tbl>{cells}</w:tbl>'
+
+
+class ExtractorTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data.encode('latin-1') if isinstance(data, str) else data)
+        return path
+
+    def write_docx(self, body):
+        path = os.path.join(self.directory, 'test.docx')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('[Content_Types].xml', '<Types/>')
+            archive.writestr(
+                'word/document.xml',
+                f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{DOCX_NS}"><w:body>{body}</w:body></w:document>',
+            )
+        return path
+
+
+class RTFReaderTests(SimpleTestCase):
+    def convert(self, *pieces):
+        reader = RTFReader()
+        return ''.join(reader.feed(piece) for piece in pieces)
+
+    def test_plain_text_and_paragraphs(self):
+        self.assertEqual(self.convert(r'{\rtf1\ansi Hello\par World}'), 'Hello\n\nWorld')
+
+    def test_destinations_are_skipped(self):
+        text = self.convert(r'{\rtf1{\fonttbl{\f0 Arial;}}{\*\generator Writer;}{\info{\title T}}Body}')
+        self.assertEqual(text, 'Body')
+
+    def test_hex_escapes_use_the_code_page(self):
+        self.assertEqual(self.convert(r"{\rtf1\ansi\ansicpg1252 caf\'e9}"), 'caf\N{LATIN SMALL LETTER E WITH ACUTE}')
+        self.assertEqual(self.convert(r"{\rtf1\ansi\ansicpg1251 \'e4}"), '\N{CYRILLIC SMALL LETTER DE}')
+
+    def test_unicode_skips_its_fallback(self):
+        self.assertEqual(self.convert(r'{\rtf1 ' + U + r'8212?x}'), '\N{EM DASH}x')
+        self.assertEqual(self.convert(r'{\rtf1\uc2 ' + U + r"8364\'80\'80 EUR}"), '\N{EURO SIGN} EUR')
+        self.assertEqual(self.convert(r'{\rtf1 ' + U + r'-3913?}'), chr(65536 - 3913))
+
+    def test_uc_is_restored_after_a_group(self):
+        self.assertEqual(self.convert(r'{\rtf1{\uc2 ' + U + r'8364??}' + U + r'8364?x}'), '\N{EURO SIGN}\N{EURO SIGN}x')
+
+    def test_symbols(self):
+        self.assertEqual(self.convert(r'{\rtf1 a\~b\_c\{d\}\\}'), 'a\N{NO-BREAK SPACE}b-c{d}\\')
+
+    def test_state_carries_across_feeds(self):
+        self.assertEqual(self.convert(r'{\rtf1{\fonttbl{\f0 ', r'Arial;}}Te', r'xt\par}'), 'Text\n\n')
+
+
+class ExtractRTFTests(ExtractorTestCase):
+    def test_control_words_split_across_reads(self):
+        body = 'x' * (extractors.READ_CHUNK_SIZE - 3) + r"\par caf\'e9 " + U + '8212? end'
+        path = self.write('test.rtf', '{\\rtf1\\ansi ' + body + '}')
+        text = ''.join(extract_rtf(path))
+        self.assertTrue(text.endswith('x\n\ncaf\N{LATIN SMALL LETTER E WITH ACUTE} \N{EM DASH} end'))
+        self.assertNotIn('\\', text)
+
+    def test_extract_file_detects_rtf(self):
+        path = self.write('test.rtf', r'{\rtf1\ansi{\fonttbl{\f0 Arial;}}First\par\par\par Second}')
+        self.assertEqual(extract_file(path).text, 'First\n\nSecond')
+
+
+class ExtractDocxTests(ExtractorTestCase):
+    def test_headings_lists_and_paragraphs(self):
+        path = self.write_docx(
+            paragraph('Agreement', style='Title')
+            + paragraph('Definitions', style='Heading2')
+            + paragraph('Body text.')
+            + paragraph('First item', level=0)
+            + paragraph('Nested item', level=1)
+            + paragraph('   ')
+        )
+        self.assertEqual(
+            ''.join(extract_docx(path)),
+            '# Agreement\n\n## Definitions\n\nBody text.\n\n- First item\n\n  - Nested item\n\n',
+        )
+
+    def test_tables_become_markdown(self):
+        path = self.write_docx(table([
+            [paragraph('Party'), paragraph('Role')],
+            [paragraph('Acme | Ltd'), paragraph('Seller') + paragraph('Lessor')],
+        ]))
+        self.assertEqual(
+            ''.join(extract_docx(path)),
+            '| Party | Role |\n|---|---|\n| Acme \\| Ltd | Seller Lessor |\n\n',
+        )
+
+    def test_nested_tables_are_flattened(self):
+        inner = table([[paragraph('a'), paragraph('b')]])
+        path = self.write_docx(table([[paragraph('Outer') + inner, paragraph('c')]]))
+        self.assertEqual(''.join(extract_docx(path)), '| Outer a b | c |\n|---|---|\n\n')
+
+    def test_missing_document_part(self):
+        path = os.path.join(self.directory, 'empty.docx')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('other.xml', '<x/>')
+        with self.assertRaises(ValueError):
+            list(extract_docx(path))
@@ -0,0 +1,153 @@
+import gzip
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.http import RangeNotSatisfiable, parse_range_header
+from core.models import Project, Resource
+
+CONTENT = '# Facts\n\nDonoghue v Stevenson [1932] AC 562 at [44].\n\n' * 20
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range_header('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=95-200', 100), (95, 99))
+        self.assertEqual(parse_range_header('bytes=-5', 100), (95, 99))
+        self.assertEqual(parse_range_header('bytes=-500', 100), (0, 99))
+
+    def test_served_in_full(self):
+        for header in (None, '', 'bytes=-', 'bytes=0-1,5-6', 'lines=0-1'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 100))
+
+    def test_not_satisfiable(self):
+        for header, size in (('bytes=100-', 100), ('bytes=5-1', 100), ('bytes=-0', 100), ('bytes=-5', 0), ('bytes=0-', 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(RangeNotSatisfiable):
+                parse_range_header(header, size)
+
+
+class ResourceHTTPTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, FILE_DOWNLOAD_BACKEND='python')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.owner = User.objects.create_user('owner')
+        project = Project.objects.create(title='Smith v Jones', owner=self.owner)
+        self.data = bytes(range(256)) * 40
+        self.resource = Resource.objects.create(
+            project=project, title='Judgment', file=SimpleUploadedFile('judgment.bin', self.data),
+            file_type='TXT', file_size=len(self.data), content_extracted=CONTENT,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.content_url = f'/api/resources/{self.resource.pk}/content/'
+        self.download_url = f'/api/resources/{self.resource.pk}/download/'
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_content(self):
+        response = self.client.get(self.content_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertFalse(response['ETag'].startswith('W/'))
+
+    def test_content_range(self):
+        payload = CONTENT.encode()
+        response = self.client.get(self.content_url, HTTP_RANGE='bytes=2-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, payload[2:9])
+        self.assertEqual(response['Content-Range'], f'bytes 2-8/{len(payload)}')
+
+        response = self.client.get(self.content_url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.content, payload[-5:])
+
+        response = self.client.get(self.content_url, HTTP_RANGE=f'bytes={len(payload)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(payload)}')
+
+    def test_empty_content_range(self):
+        response = self.client.get(self.content_url, {'field': 'summary'}, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_content_if_range(self):
+        etag = self.client.get(self.content_url)['ETag']
+        response = self.client.get(self.content_url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, response.content), (206, CONTENT.encode()[:4]))
+
+        response = self.client.get(self.content_url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, response.content.decode()), (200, CONTENT))
+
+    def test_content_not_modified(self):
+        etag = self.client.get(self.content_url)['ETag']
+        self.assertEqual(self.client.get(self.content_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.resource.content_extracted = 'Revised'
+        self.resource.save()
+        self.assertEqual(self.client.get(self.content_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_content_compression(self):
+        response = self.client.get(self.content_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), CONTENT)
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        # Ranges always refer to the identity encoding
+        response = self.client.get(self.content_url, HTTP_ACCEPT_ENCODING='gzip', HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.content, CONTENT.encode()[:4])
+
+    def test_download(self):
+        response = self.client.get(self.download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        self.assertEqual(self.client.get(self.download_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_download_range(self):
+        response = self.client.get(self.download_url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[1000:2000])
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '1000')
+
+        response = self.client.get(self.download_url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, self.body(response)), (200, self.data))
+
+        response = self.client.get(self.download_url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_download_of_empty_file(self):
+        self.resource.file = SimpleUploadedFile('empty.bin', b'')
+        self.resource.file_size = 0
+        self.resource.save()
+        response = self.client.get(self.download_url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    async def test_download_under_asgi(self):
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.owner)}'}
+
+        response = await client.get(self.download_url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.data)
+
+        response = await client.get(self.download_url, headers={**headers, 'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.data[10:20])
@@ -0,0 +1,146 @@
+import time
+from unittest import mock
+
+import openai
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from openai.openai_object import OpenAIObject
+
+from core import llm
+from core.utils import summarize_text
+
+TIERS = {
+    'fast': {'models': ['small-a', 'small-b'], 'max_input_tokens': 1000},
+    'long_context': {'models': ['large'], 'max_input_tokens': 100000},
+}
+ROUTES = {'chat': ['fast', 'long_context'], 'summarize': ['fast', 'long_context'], 'suggest': ['fast']}
+
+
+def messages(chars=100):
+    return [{'role': 'user', 'content': 'x' * chars}]
+
+
+def rate_limited(retry_after=None):
+    return openai.error.RateLimitError('Slow down', headers={'retry-after': retry_after} if retry_after else {})
+
+
+class FakeProvider:
+    """Stands in for ``openai.ChatCompletion.acreate``, failing for the models in ``errors``"""
+
+    def __init__(self, text='An answer', errors=None):
+        self.text = text
+        self.errors = errors or {}
+        self.models = []
+
+    async def acreate(self, model, messages, stream=False, **params):
+        self.models.append(model)
+        if model in self.errors:
+            raise self.errors[model]
+        if stream:
+            return self.chunks(model)
+        return OpenAIObject.construct_from({
+            'id': f'{model}-1',
+            'choices': [{'message': {'role': 'assistant', 'content': self.text}}],
+            'usage': {'total_tokens': 10},
+        })
+
+    async def chunks(self, model):
+        for word in self.text.split(' '):
+            yield OpenAIObject.construct_from({'choices': [{'delta': {'content': word}}]})
+
+
+@override_settings(LLM_TIERS=TIERS, LLM_ROUTES=ROUTES, LLM_THROTTLE_COOLDOWN=30, LLM_LOCAL_FALLBACK=True)
+class RoutingTests(SimpleTestCase):
+    def setUp(self):
+        llm._cooling.clear()
+        self.addCleanup(llm._cooling.clear)
+
+    def provide(self, **kwargs):
+        provider = FakeProvider(**kwargs)
+        patcher = mock.patch.object(openai.ChatCompletion, 'acreate', provider.acreate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return provider
+
+    async def test_small_prompt_goes_to_fast_tier(self):
+        provider = self.provide()
+        completion = await llm.complete('chat', messages())
+        self.assertEqual((completion.text, completion.model, completion.tier), ('An answer', 'small-a', 'fast'))
+        self.assertEqual(completion.response_id, 'small-a-1')
+        self.assertEqual(provider.models, ['small-a'])
+
+    async def test_large_prompt_goes_to_long_context_tier(self):
+        provider = self.provide()
+        completion = await llm.complete('chat', messages(chars=20000))
+        self.assertEqual((completion.model, completion.tier), ('large', 'long_context'))
+        self.assertEqual(provider.models, ['large'])
+
+    def test_prompt_too_large_for_every_tier(self):
+        self.assertEqual(llm.plan('suggest', 10 ** 6), [llm.Route('fast', 'small-a'), llm.Route('fast', 'small-b')])
+
+    async def test_failover_within_and_across_tiers(self):
+        provider = self.provide(errors={'small-a': rate_limited(), 'small-b': openai.error.ServiceUnavailableError('Down')})
+        completion = await llm.complete('chat', messages())
+        self.assertEqual(completion.model, 'large')
+        self.assertEqual(provider.models, ['small-a', 'small-b', 'large'])
+
+    async def test_throttled_model_cools_down(self):
+        provider = self.provide(errors={'small-a': rate_limited()})
+        await llm.complete('chat', messages())
+        del provider.errors['small-a']
+
+        # Tried last while cooling down...
+        self.assertEqual([route.model for route in llm.plan('chat', 10)], ['small-b', 'large', 'small-a'])
+        provider.models.clear()
+        self.assertEqual((await llm.complete('chat', messages())).model, 'small-b')
+        self.assertEqual(provider.models, ['small-b'])
+
+        # ...and first again once it's over
+        with mock.patch('core.llm.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertEqual(llm.plan('chat', 10)[0].model, 'small-a')
+
+    async def test_retry_after_sets_the_cooldown(self):
+        self.provide(errors={'small-a': rate_limited(retry_after='120')})
+        before = time.monotonic()
+        await llm.complete('chat', messages())
+        self.assertGreaterEqual(llm._cooling['small-a'], before + 120)
+
+    async def test_local_fallback_once_every_model_fails(self):
+        error = rate_limited()
+        self.provide(errors={'small-a': error, 'small-b': error, 'large': error})
+        completion = await llm.complete('summarize', messages(), fallback=lambda: 'Lead sentences')
+        self.assertEqual((completion.text, completion.model), ('Lead sentences', llm.LOCAL_MODEL))
+
+        with override_settings(LLM_LOCAL_FALLBACK=False):
+            with self.assertRaises(openai.error.RateLimitError):
+                await llm.complete('summarize', messages(), fallback=lambda: 'Lead sentences')
+
+    async def test_other_errors_do_not_fail_over(self):
+        provider = self.provide(errors={'small-a': openai.error.InvalidRequestError('Bad request', None)})
+        with self.assertRaises(openai.error.InvalidRequestError):
+            await llm.complete('chat', messages())
+        self.assertEqual(provider.models, ['small-a'])
+        self.assertNotIn('small-a', llm._cooling)
+
+    async def test_no_models_configured(self):
+        provider = self.provide()
+        with override_settings(LLM_TIERS={**TIERS, 'fast': {'models': [''], 'max_input_tokens': 1000}}):
+            with self.assertRaises(ImproperlyConfigured):
+                await llm.complete('suggest', messages())
+            with self.assertRaises(ImproperlyConfigured):
+                async for _ in llm.stream('suggest', messages()):
+                    pass
+            completion = await llm.complete('suggest', messages(), fallback=lambda: 'Local')
+            self.assertEqual(completion.model, llm.LOCAL_MODEL)
+        self.assertEqual(provider.models, [])
+
+    async def test_stream_fails_over_before_the_first_text(self):
+        provider = self.provide(text='Held on appeal', errors={'small-a': rate_limited()})
+        text = [chunk async for chunk in llm.stream('chat', messages())]
+        self.assertEqual(text, ['Held', 'on', 'appeal'])
+        self.assertEqual(provider.models, ['small-a', 'small-b'])
+
+    async def test_summary_without_content(self):
+        self.provide(text=None)
+        completion = await summarize_text('The court held that the appeal succeeds.')
+        self.assertEqual((completion.text, completion.model), ('', 'small-a'))
@@ -0,0 +1,36 @@
+import atexit
+import logging
+import os
+import queue
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.log import BackgroundFileHandler
+
+
+class BackgroundFileHandlerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'app.log')
+
+    def test_close_is_idempotent_and_unregisters_the_exit_hook(self):
+        with mock.patch.object(atexit, 'unregister', wraps=atexit.unregister) as unregister:
+            handler = BackgroundFileHandler(self.path)
+            handler.handle(logging.makeLogRecord({'msg': 'written'}))
+            handler.close()
+            handler.close()
+        unregister.assert_called_once_with(handler.close)
+        self.assertIsNone(handler.listener)
+        with open(self.path) as f:
+            self.assertIn('written', f.read())
+
+    def test_full_queue_drops_records(self):
+        handler = BackgroundFileHandler(self.path)
+        self.addCleanup(handler.close)
+        with mock.patch.object(handler.queue, 'put_nowait', side_effect=queue.Full):
+            for _ in range(2):
+                handler.handle(logging.makeLogRecord({'msg': 'x'}))
+        self.assertEqual(handler.dropped, 2)
@@ -0,0 +1,61 @@
+import asyncio
+import contextvars
+import threading
+
+from django.test import SimpleTestCase
+
+from core.metrics import finish_request, start_request, timed
+
+
+class RequestTimingsTests(SimpleTestCase):
+    def setUp(self):
+        self.timings, token = start_request()
+        self.addCleanup(finish_request, token)
+
+    def test_nested_blocks_count_once(self):
+        with timed('serialize'):
+            with timed('serialize'):
+                pass
+            with timed('db'):
+                pass
+        self.assertEqual(self.timings.phases['serialize'][1], 1)
+        self.assertEqual(self.timings.phases['db'][1], 1)
+
+    def test_outside_a_request(self):
+        def work():
+            with timed('db'):
+                pass
+
+        contextvars.Context().run(work)
+        self.assertEqual(self.timings.phases, {})
+
+    def test_concurrent_tasks_are_each_counted(self):
+        async def call():
+            with timed('llm'):
+                await asyncio.sleep(0.01)
+
+        async def main():
+            with timed('view'):
+                await asyncio.gather(call(), call(), call())
+
+        asyncio.run(main())
+        self.assertEqual(self.timings.phases['llm'][1], 3)
+        self.assertEqual(self.timings.phases['view'][1], 1)
+
+    def test_threads_share_the_totals(self):
+        def work():
+            for _ in range(1000):
+                self.timings.add('db', 0.001)
+
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(work,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.timings.totals()['db'][1], 8000)
+
+    def test_server_timing(self):
+        self.timings.add('db', 0.002)
+        self.timings.add('db', 0.003)
+        header = self.timings.server_timing()
+        self.assertTrue(header.startswith('db;dur=5.0;desc="2x", total;dur='))
@@ -0,0 +1,93 @@
+import random
+
+from django.test import SimpleTestCase
+
+from core import ot
+
+
+def random_operation(rng, text):
+    """A random valid operation on ``text``"""
+    op = []
+    position = 0
+    while position < len(text):
+        length = rng.randint(1, len(text) - position)
+        choice = rng.random()
+        if choice < 0.3:
+            op.append(-length)
+        else:
+            op.append(length)
+        position += length
+        if rng.random() < 0.4:
+            op.append(rng.choice(['a', 'bc', 'xyz', '\N{SECTION SIGN}']))
+    if not text or rng.random() < 0.3:
+        op.insert(rng.randint(0, len(op)), 'ins')
+    return ot.parse(op)
+
+
+class ParseTests(SimpleTestCase):
+    def test_merges_components(self):
+        self.assertEqual(ot.parse([2, 3, 'a', 'b', -1, -2, 4]), [5, 'ab', -3, 4])
+
+    def test_rejects_invalid_components(self):
+        for value in ('text', [0], [''], [True], [1.5], [None], [[1]]):
+            with self.subTest(value=value), self.assertRaises(ot.OperationError):
+                ot.parse(value)
+
+
+class ApplyTests(SimpleTestCase):
+    def test_apply(self):
+        self.assertEqual(ot.apply([5, -6, ' there'], 'hello world'), 'hello there')
+        self.assertEqual(ot.apply(['Oh, ', 11], 'hello world'), 'Oh, hello world')
+        self.assertEqual(ot.apply(['new'], ''), 'new')
+
+    def test_lengths_count_code_points(self):
+        self.assertEqual(ot.apply([1, -1, 'e'], '\N{GRINNING FACE}\N{GRINNING FACE}'), '\N{GRINNING FACE}e')
+
+    def test_wrong_length(self):
+        with self.assertRaises(ot.OperationError):
+            ot.apply([3], 'hello')
+
+
+class TransformTests(SimpleTestCase):
+    def assertConverges(self, a, b, text):
+        a_prime, b_prime = ot.transform(a, b)
+        self.assertEqual(ot.apply(b_prime, ot.apply(a, text)), ot.apply(a_prime, ot.apply(b, text)))
+
+    def test_concurrent_inserts_put_a_first(self):
+        a_prime, b_prime = ot.transform(['A', 3], ['B', 3])
+        self.assertEqual(ot.apply(b_prime, ot.apply(['A', 3], 'abc')), 'ABabc')
+        self.assertEqual(ot.apply(a_prime, ot.apply(['B', 3], 'abc')), 'ABabc')
+
+    def test_overlapping_deletes(self):
+        self.assertConverges([1, -3, 2], [2, -3, 1], 'abcdef')
+        a_prime, _ = ot.transform([-6], [-6])
+        self.assertEqual(a_prime, [])
+
+    def test_insert_inside_deleted_range(self):
+        a, b = [2, 'X', 2], [1, -2, 1]
+        a_prime, b_prime = ot.transform(a, b)
+        self.assertEqual(ot.apply(b_prime, ot.apply(a, 'abcd')), 'aXd')
+        self.assertConverges(a, b, 'abcd')
+
+    def test_random_operations_converge(self):
+        rng = random.Random(47)
+        for _ in range(500):
+            text = ''.join(rng.choice('abcdef ') for _ in range(rng.randint(0, 20)))
+            a, b = random_operation(rng, text), random_operation(rng, text)
+            self.assertConverges(a, b, text)
+
+    def test_different_base_lengths(self):
+        with self.assertRaises(ot.OperationError):
+            ot.transform([3], [4])
+
+
+class TransformIndexTests(SimpleTestCase):
+    def test_transform_index(self):
+        op = [2, 'XY', -3, 5]
+        self.assertEqual(ot.transform_index(op, 0), 0)
+        # Inserts at a position push it along
+        self.assertEqual(ot.transform_index(op, 2), 4)
+        # Positions in a deleted range move to its start
+        self.assertEqual(ot.transform_index(op, 4), 4)
+        self.assertEqual(ot.transform_index(op, 5), 4)
+        self.assertEqual(ot.transform_index(op, 10), 9)
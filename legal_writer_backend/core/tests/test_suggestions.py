@@ -0,0 +1,157 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import suggestions
+from core.models import Document, Project
+
+PREFIX = 'The appellant contends that'
+
+
+class FakeModel:
+    """Stands in for ``stream_completion``; each call yields its words once ``release`` is set"""
+
+    def __init__(self, text=' the contract was void.'):
+        self.text = text
+        self.calls = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def stream(self, prefix, suffix=''):
+        self.calls.append(prefix)
+        await self.release.wait()
+        for word in self.text.split(' ')[1:]:
+            await asyncio.sleep(0)
+            yield f' {word}'
+
+
+async def lines(stream):
+    return [json.loads(line) async for line in stream]
+
+
+@override_settings(SUGGEST_PREFETCH_ACCEPTED=True)
+class SuggestionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.model = FakeModel()
+        patcher = mock.patch('core.suggestions.stream_completion', self.model.stream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.editor = suggestions.Editor()
+
+    async def test_streams_then_serves_from_cache(self):
+        events = await lines(suggestions.suggest(self.editor, PREFIX))
+        self.assertEqual([event['event'] for event in events], ['delta'] * 4 + ['done'])
+        self.assertEqual(events[-1], {'event': 'done', 'suggestion': ' the contract was void.', 'source': 'model'})
+
+        events = await lines(suggestions.suggest(suggestions.Editor(), PREFIX))
+        self.assertEqual(events, [{'event': 'done', 'suggestion': ' the contract was void.', 'source': 'cache'}])
+        self.assertEqual(self.model.calls.count(PREFIX), 1)
+
+    async def test_newer_text_cancels_the_running_generation(self):
+        self.model.release.clear()
+        first = asyncio.ensure_future(lines(suggestions.suggest(self.editor, PREFIX)))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(lines(suggestions.suggest(self.editor, PREFIX + ' the')))
+        await asyncio.sleep(0)
+        self.model.release.set()
+
+        self.assertEqual(await first, [{'event': 'cancelled'}])
+        self.assertEqual((await second)[-1]['event'], 'done')
+        self.assertIsNone(await cache.aget(suggestions.cache_key(PREFIX)))
+
+    async def test_cancelled_before_it_starts(self):
+        generation = self.editor.start(PREFIX, '')
+        generation.cancel()
+        self.assertEqual([part async for part in generation.follow()], [])
+        self.assertTrue(generation.cancelled)
+        self.assertEqual(self.model.calls, [])
+
+    async def test_same_text_follows_one_generation(self):
+        self.model.release.clear()
+        first = asyncio.ensure_future(lines(suggestions.suggest(self.editor, PREFIX)))
+        second = asyncio.ensure_future(lines(suggestions.suggest(self.editor, PREFIX)))
+        await asyncio.sleep(0)
+        self.model.release.set()
+
+        self.assertEqual(await first, await second)
+        self.assertEqual(self.model.calls.count(PREFIX), 1)
+
+    async def test_prefetch(self):
+        self.assertTrue(await suggestions.prefetch(self.editor, PREFIX))
+        events = await lines(suggestions.suggest(self.editor, PREFIX))
+        self.assertEqual(events[-1]['suggestion'], ' the contract was void.')
+        self.assertEqual(self.model.calls.count(PREFIX), 1)
+
+        # Already cached
+        self.assertFalse(await suggestions.prefetch(suggestions.Editor(), PREFIX))
+
+    async def test_next_suggestion_is_prefetched(self):
+        await lines(suggestions.suggest(self.editor, PREFIX))
+        accepted = PREFIX + ' the contract was void.'
+        await self.editor.generation.task
+        self.assertEqual(self.model.calls, [PREFIX, accepted])
+
+        events = await lines(suggestions.suggest(self.editor, accepted))
+        self.assertEqual(events[-1]['source'], 'cache')
+
+    async def test_typing_through_the_suggestion(self):
+        await lines(suggestions.suggest(self.editor, PREFIX))
+        events = await lines(suggestions.suggest(self.editor, PREFIX + ' the con'))
+        self.assertEqual(events, [{'event': 'done', 'suggestion': 'tract was void.', 'source': 'typed'}])
+        self.assertFalse(await suggestions.prefetch(self.editor, PREFIX + ' the con'))
+
+    async def test_typing_something_else_cancels_the_prefetch(self):
+        self.model.release.clear()
+        self.assertTrue(await suggestions.prefetch(self.editor, PREFIX))
+        prefetched = self.editor.generation
+        asyncio.ensure_future(lines(suggestions.suggest(self.editor, 'Something else')))
+        await asyncio.sleep(0)
+        self.model.release.set()
+        await prefetched.task
+        self.assertTrue(prefetched.cancelled)
+
+    async def test_model_error(self):
+        async def failing(prefix, suffix=''):
+            raise RuntimeError('Provider down')
+            yield
+
+        with mock.patch('core.suggestions.stream_completion', failing):
+            events = await lines(suggestions.suggest(self.editor, PREFIX))
+        self.assertEqual(events, [{'event': 'error', 'error': 'Suggestions are unavailable right now'}])
+
+
+@override_settings(OPENAI_API_KEY='test')
+class SuggestViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.owner = User.objects.create_user('owner')
+        project = Project.objects.create(title='Smith v Jones', owner=self.owner)
+        self.document = Document.objects.create(project=project, title='Heads', content='Text')
+        self.url = f'/api/documents/{self.document.pk}/suggest/'
+
+    def test_not_available_under_wsgi(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(self.url, {'prefix': PREFIX}, format='json')
+        self.assertEqual(response.status_code, 501)
+
+    async def test_prefetch_under_asgi(self):
+        model = FakeModel()
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.owner)}'}
+        with mock.patch('core.suggestions.stream_completion', model.stream):
+            response = await AsyncClient().post(
+                self.url, {'prefix': PREFIX, 'prefetch': True}, content_type='application/json', headers=headers,
+            )
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(json.loads(response.content), {'prefetching': True})
+            await suggestions.get_editor(self.owner.pk, self.document.pk).generation.task
+        self.assertEqual(model.calls, [PREFIX])
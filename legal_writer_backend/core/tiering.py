@@ -0,0 +1,286 @@
+"""
+Tiered storage for resource files.
+
+Uploads land on fast local disk (the HOT tier). ``tier_resources`` moves
+files that the policy marks as cold (files of archived projects, and files
+nobody has read for ``TIERING_COLD_AFTER_DAYS``) to a cheaper backend
+(the COLD tier) and frees the local copy. The file keeps its name, and an
+empty placeholder stays on disk so the name is never given to another
+upload. Code that needs the file on disk calls ``local_path``, which
+fetches a cold file back first, and the file then counts as hot again.
+
+Two cold backends are provided: ``CompressedDirectoryStorage`` (gzip files
+under ``COLD_STORAGE_ROOT``, e.g. a mounted archive volume) and
+``S3Storage`` for S3-compatible object stores (needs ``boto3``; point
+``COLD_STORAGE_ENDPOINT_URL`` at MinIO or another stand-in for local use).
+Extracted content and chunks stay in the database either way, so listing,
+search and chat never need the file.
+"""
+import abc
+import datetime
+import gzip
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.module_loading import import_string
+
+from .http import FILE_CHUNK_SIZE
+from .metrics import timed
+from .models import Project, Resource
+
+logger = logging.getLogger(__name__)
+
+
+class ColdStorage(abc.ABC):
+    """Where cold files are kept. Names are the FileField names of the resources."""
+
+    @abc.abstractmethod
+    def put(self, name, f):
+        """Store the contents of the readable file ``f`` under ``name``, replacing any previous copy"""
+
+    @abc.abstractmethod
+    def get(self, name, dest):
+        """Write the file stored under ``name`` to the writable file ``dest``"""
+
+    @abc.abstractmethod
+    def open(self, name):
+        """Open the file stored under ``name`` for streaming reads"""
+
+    @abc.abstractmethod
+    def delete(self, name):
+        """Delete the file stored under ``name``, if there is one"""
+
+    @abc.abstractmethod
+    def exists(self, name):
+        """Whether a file is stored under ``name``"""
+
+
+class CompressedDirectoryStorage(ColdStorage):
+    """Gzip-compressed copies in a local directory"""
+
+    def __init__(self, root=None, compresslevel=6):
+        self.root = root or settings.COLD_STORAGE_ROOT
+        self.compresslevel = compresslevel
+
+    def path(self, name):
+        return safe_join(self.root, name + '.gz')
+
+    def put(self, name, f):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{uuid.uuid4().hex}.part'
+        try:
+            with open(partial, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=self.compresslevel, mtime=0) as out:
+                shutil.copyfileobj(f, out, FILE_CHUNK_SIZE)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def get(self, name, dest):
+        with self.open(name) as f:
+            shutil.copyfileobj(f, dest, FILE_CHUNK_SIZE)
+
+    def open(self, name):
+        return gzip.open(self.path(name), 'rb')
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+
+class S3Storage(ColdStorage):
+    """Objects in an S3-compatible bucket, stored as they are"""
+
+    def __init__(self, bucket=None, prefix=None, endpoint_url=None, **client_options):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise ImproperlyConfigured("S3Storage needs boto3 (pip install boto3)")
+
+        self.bucket = bucket or settings.COLD_STORAGE_BUCKET
+        if not self.bucket:
+            raise ImproperlyConfigured("COLD_STORAGE_BUCKET must be set to use S3Storage")
+        self.prefix = settings.COLD_STORAGE_PREFIX if prefix is None else prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or settings.COLD_STORAGE_ENDPOINT_URL or None, **client_options)
+        self.ClientError = ClientError
+
+    def key(self, name):
+        return self.prefix + name
+
+    def _is_missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def put(self, name, f):
+        # Multipart for large files, without reading them into memory
+        self.client.upload_fileobj(f, self.bucket, self.key(name))
+
+    def get(self, name, dest):
+        try:
+            self.client.download_fileobj(self.bucket, self.key(name), dest)
+        except self.ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(f"{name} is not in cold storage")
+            raise
+
+    def open(self, name):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key(name))['Body']
+        except self.ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(f"{name} is not in cold storage")
+            raise
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except self.ClientError as e:
+            if self._is_missing(e):
+                return False
+            raise
+        return True
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_cold_storage():
+    """The configured cold backend, built once per process and configuration"""
+    backend = settings.COLD_STORAGE_BACKEND
+    cache_key = repr(backend)
+    with _backends_lock:
+        if cache_key not in _backends:
+            if isinstance(backend, str):
+                _backends[cache_key] = import_string(backend)()
+            else:
+                _backends[cache_key] = import_string(backend['class'])(**backend.get('options', {}))
+        return _backends[cache_key]
+
+
+class TieringPolicy:
+    """
+    Decides which hot files move to cold storage: files of archived projects
+    and files not read for ``cold_after_days``. Files of active projects in
+    use stay on fast disk.
+    """
+
+    def __init__(self, cold_after_days=None, archived_projects=True):
+        self.cold_after_days = settings.TIERING_COLD_AFTER_DAYS if cold_after_days is None else cold_after_days
+        self.archived_projects = archived_projects
+
+    def cold_candidates(self, now=None):
+        """Hot resources the policy would move to cold storage"""
+        cutoff = (now or timezone.now()) - datetime.timedelta(days=self.cold_after_days)
+        rule = Q(last_accessed__lt=cutoff) | Q(last_accessed__isnull=True, uploaded_at__lt=cutoff)
+        if self.archived_projects:
+            rule |= Q(project__status=Project.ARCHIVED)
+        return (
+            Resource.objects.filter(storage_tier=Resource.HOT).exclude(file='')
+            .exclude(project__status=Project.DELETED)
+            .filter(rule)
+        )
+
+
+def record_access(resource, now=None):
+    """Note that a resource's file was read, at most once per TIERING_ACCESS_RESOLUTION"""
+    now = now or timezone.now()
+    threshold = now - datetime.timedelta(seconds=settings.TIERING_ACCESS_RESOLUTION)
+    if resource.last_accessed and resource.last_accessed >= threshold:
+        return
+    # update() rather than save(): reading a file must not change updated_at,
+    # which the resource's ETags are built from
+    Resource.objects.filter(pk=resource.pk).update(last_accessed=now)
+    resource.last_accessed = now
+
+
+def _on_disk(resource, path):
+    """Whether the file's content is on local disk, rather than just its placeholder"""
+    return os.path.exists(path) and (os.path.getsize(path) > 0 or not resource.file_size)
+
+
+def demote(resource):
+    """Move a resource's file to cold storage; returns whether it moved"""
+    if resource.storage_tier != Resource.HOT or not resource.file:
+        return False
+    path = resource.file.path
+    if not _on_disk(resource, path):
+        return False
+
+    cold = get_cold_storage()
+    with timed('tiering'):
+        # Files never change in place, so a copy left by an earlier demotion is current
+        if not cold.exists(resource.file.name):
+            with open(path, 'rb') as f:
+                cold.put(resource.file.name, f)
+    # Skip the move if the file was read while it was being copied
+    moved = Resource.objects.filter(
+        pk=resource.pk, storage_tier=Resource.HOT, last_accessed=resource.last_accessed,
+    ).update(storage_tier=Resource.COLD)
+    if moved:
+        # Replaced by an empty placeholder rather than deleted, so storage
+        # never hands the name to another upload. Replaced, not truncated:
+        # readers that have the file open keep seeing its content.
+        placeholder = f'{path}.{uuid.uuid4().hex}.part'
+        open(placeholder, 'wb').close()
+        os.replace(placeholder, path)
+        resource.storage_tier = Resource.COLD
+    return bool(moved)
+
+
+def local_path(resource):
+    """
+    Path of the resource's file on fast disk, fetching it back from cold
+    storage first when needed. Raises FileNotFoundError when there is no
+    copy anywhere.
+    """
+    record_access(resource)
+    path = resource.file.path
+    if _on_disk(resource, path):
+        return path
+
+    # Cold, or demoted since this instance was loaded
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.{uuid.uuid4().hex}.part'
+    try:
+        with timed('tiering'), open(partial, 'wb') as dest:
+            get_cold_storage().get(resource.file.name, dest)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    # The cold copy is kept, so a later demotion finds it already in place
+    Resource.objects.filter(pk=resource.pk).update(storage_tier=Resource.HOT)
+    resource.storage_tier = Resource.HOT
+    logger.info(f"Fetched {resource.file.name} back from cold storage")
+    return path
+
+
+def open_file(resource):
+    """
+    Open a resource's file for reading wherever it is, without moving it
+    between tiers; returns ``(file, size)``. Used for bulk reads such as
+    exports, which shouldn't warm up a whole project.
+    """
+    path = resource.file.path
+    if _on_disk(resource, path):
+        return open(path, 'rb'), os.path.getsize(path)
+    return get_cold_storage().open(resource.file.name), resource.file_size
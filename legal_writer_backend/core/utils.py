@@ -1,10 +1,14 @@
 import os
+import hashlib
+import pymupdf
 import pymupdf4llm
 import magic
 import openai
 import re
 from django.conf import settings
 from asgiref.sync import sync_to_async
+from .metrics import timed_function
+from .ocr import ocr_pages, scanned_pages
 
 # Configure OpenAI with API key
 openai.api_key = settings.OPENAI_API_KEY
@@ -15,6 +19,19 @@ def get_file_type(file_path):
     file_type = mime.from_file(file_path)
     return file_type
 
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Hash a file's contents without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def text_sha256(text):
+    """Hash a text value, e.g. extracted content"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+@timed_function('format')
 def format_markdown_text(text):
     """Format markdown text for better readability"""
     # Remove multiple consecutive blank lines
@@ -70,8 +87,13 @@ def format_markdown_text(text):
     
     return text.strip()
 
-def extract_text_from_pdf(file_path):
-    """Extract text content from a PDF file using pymupdf4llm"""
+# Marks page boundaries while a whole document is formatted at once; not
+# whitespace, so formatting never strips it
+PAGE_BREAK = '\x00'
+
+@timed_function('extract')
+def extract_pdf_pages(file_path):
+    """Extract each page of a PDF as formatted markdown, OCR'ing scanned pages"""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
@@ -81,25 +103,64 @@ def extract_text_from_pdf(file_path):
         raise ValueError(f"File is not a PDF: {file_type}")
 
     try:
-        # Convert PDF to markdown using pymupdf4llm
-        md_text = pymupdf4llm.to_markdown(file_path)
-        
-        # Format the markdown text for better readability
-        formatted_text = format_markdown_text(md_text)
-        
-        return formatted_text
+        with pymupdf.open(file_path) as doc:
+            page_count = doc.page_count
+            scanned = set(scanned_pages(doc))
+
+        # Convert PDF to markdown using pymupdf4llm; scanned pages go through OCR
+        pages = dict.fromkeys(range(page_count), '')
+        text_pages = [number for number in pages if number not in scanned]
+        if text_pages:
+            chunks = pymupdf4llm.to_markdown(file_path, pages=text_pages, page_chunks=True)
+            for chunk in chunks:
+                # One-based; the key was renamed in later pymupdf4llm releases
+                metadata = chunk['metadata']
+                pages[metadata.get('page_number', metadata.get('page')) - 1] = chunk['text']
+        if scanned:
+            pages.update(ocr_pages(file_path, sorted(scanned)))
+
+        # Format the document as a whole, so heading levels stay consistent
+        # across pages, then split it back into pages
+        formatted_text = format_markdown_text(f'\n\n{PAGE_BREAK}\n\n'.join(pages.values()))
+        return [page.strip() for page in formatted_text.split(PAGE_BREAK)]
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-async def summarize_text(text: str) -> str:
-    """Generate a summary of the text using gpt-4o-mini model"""
+def extract_text_from_pdf(file_path):
+    """Extract text content from a PDF file using pymupdf4llm"""
+    return '\n\n'.join(page for page in extract_pdf_pages(file_path) if page)
+
+# Sentences of the extractive summary used when no model is available
+LEAD_SUMMARY_CHARS = 1500
+
+def lead_summary(text, max_chars=LEAD_SUMMARY_CHARS):
+    """The opening sentences of a text, as a stand-in summary"""
+    body = re.sub(r'^\s*#.*$', '', text, flags=re.MULTILINE)
+    plain = ' '.join(re.sub(r'[>*|`_]+', ' ', body).split())
+    sentences = re.split(r'(?<=[.!?])\s+', plain)
+    summary = ''
+    for sentence in sentences:
+        if summary and len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f'{summary} {sentence}'.strip()
+    return summary[:max_chars]
+
+@timed_function('summarize')
+async def summarize_text(text: str):
+    """
+    Generate a summary of the text on the model routed for summaries;
+    returns the ``Completion`` (``model`` is ``llm.LOCAL_MODEL`` when every
+    model was throttled and the opening sentences stand in for it)
+    """
+    from . import llm
+
     if not text:
         raise ValueError("No text provided for summarization")
 
     try:
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4o-mini",
-            messages=[
+        completion = await llm.complete(
+            'summarize',
+            [
                 {
                     "role": "system", 
                     "content": "You are a legal document summarizer. Create a clear, concise summary of the provided text in simple paragraph format. Do not use any special formatting, bullets, numbering, or markdown. Focus on the key points and important details, presenting them in a flowing narrative."
@@ -109,9 +170,11 @@ async def summarize_text(text: str) -> str:
                     "content": f"Please summarize the following text in a clear paragraph format:\n\n{text}"
                 }
             ],
+            fallback=lambda: lead_summary(text),
             max_tokens=500,
             temperature=0.3,
         )
-        return response.choices[0].message.content.strip()
+        # The API returns no content for e.g. a filtered answer
+        return completion._replace(text=(completion.text or '').strip())
     except Exception as e:
         raise Exception(f"Error generating summary: {str(e)}")
@@ -4,86 +4,293 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils.decorators import sync_and_async_middleware
 from asgiref.sync import sync_to_async
-from .models import Project, Document, Note, Resource, ChatSession, ChatContext
-from .serializers import ProjectSerializer, DocumentSerializer, NoteSerializer, ResourceSerializer, ChatSessionSerializer, ChatContextSerializer
+from .models import Project, Document, Note, Resource, Citation, ChatSession, ChatContext
+from .serializers import ProjectSerializer, DocumentSerializer, NoteSerializer, ResourceSerializer, ChunkSerializer, ChatSessionSerializer, ChatContextSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import serializers
+from rest_framework.exceptions import APIException
 import logging
-import json
 from rest_framework import status
+from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from rest_framework.renderers import JSONRenderer
+import os
+from .metrics import registry, timed
+from .contexts import assemble_contexts, estimate_tokens, format_context, iter_available_contexts, load_context_contents
+from .access import accessible_project_ids, can_access_project
+from .extractors import is_supported
+from .tiering import local_path
+from . import llm, suggestions
+from .http import (
+    conditional_response, content_response, file_download_response, is_asgi, latest_timestamp,
+    make_etag, set_validators, streaming_content,
+)
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+class ConditionalRetrieveMixin:
+    """
+    Answer detail requests with ETag/Last-Modified validators so clients that
+    already hold the current version get a 304 instead of the full payload.
+    """
+    # Large fields that are only loaded once we know the client needs them
+    deferred_fields = ()
+
+    def get_validators(self, instance):
+        """Return the (etag, last_modified) pair for an instance"""
+        return make_etag(instance.pk, instance.updated_at), instance.updated_at
+
+    def get_conditional_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.deferred_fields:
+            queryset = queryset.defer(*self.deferred_fields)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_conditional_object()
+        etag, last_modified = self.get_validators(instance)
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if self.deferred_fields:
+            instance.refresh_from_db(fields=self.deferred_fields)
+        serializer = self.get_serializer(instance)
+        return set_validators(Response(serializer.data), etag, last_modified)
+
+class ProjectScopedMixin:
+    """
+    Scope querysets and writes to the requesting user's projects, using the
+    request-scoped membership resolver instead of joining through
+    ``project__owner`` on every query.
+    """
+    # Lookup from the model to its project id
+    project_lookup = 'project_id'
+
+    def scope_to_projects(self, queryset):
+        project_id = self.request.query_params.get('project')
+        if project_id:
+            if not can_access_project(self.request, project_id):
+                return queryset.none()
+            return queryset.filter(**{self.project_lookup: project_id})
+        # Listings cover active projects only; a row fetched by id may be in an archived one
+        include_archived = self.action != 'list'
+        return queryset.filter(**{
+            f'{self.project_lookup}__in': accessible_project_ids(self.request, include_archived=include_archived)
+        })
+
+    def get_validated_project_id(self, serializer):
+        project = serializer.validated_data.get('project')
+        return project.pk if project else None
+
+    def check_project_access(self, serializer):
+        project_id = self.get_validated_project_id(serializer)
+        if project_id is not None and not can_access_project(self.request, project_id):
+            raise serializers.ValidationError({
+                "project": "Invalid project or unauthorized access"
+            })
+
+    def perform_create(self, serializer):
+        self.check_project_access(serializer)
+        serializer.save()
+
+    def perform_update(self, serializer):
+        self.check_project_access(serializer)
+        serializer.save()
+
+class StreamingListMixin:
+    """
+    Stream JSON list responses instead of building them in memory.
+
+    Rows are read with ``.iterator()`` and serialized a batch at a time, so
+    memory stays flat however many rows match and the first bytes go out
+    as soon as the first batch is read, under WSGI and ASGI. Other formats (e.g. the browsable
+    API) and paginated lists fall back to the regular response.
+    """
+    stream_chunk_size = 100
+
+    def list(self, request, *args, **kwargs):
+        if getattr(request.accepted_renderer, 'format', None) != 'json' or self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Under ASGI each batch is read in a thread; a plain generator would
+        # be read to the end before anything was sent
+        return StreamingHttpResponse(streaming_content(request, self.stream_json(queryset)), content_type='application/json')
+
+    def stream_json(self, queryset):
+        renderer = JSONRenderer()
+        serializer = self.get_serializer()
+        separator = b'['
+        batch = []
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            batch.append(renderer.render(serializer.to_representation(instance)))
+            if len(batch) >= self.stream_chunk_size:
+                yield separator + b','.join(batch)
+                separator, batch = b',', []
+        if batch:
+            yield separator + b','.join(batch)
+            separator = b','
+        yield b']' if separator == b',' else b'[]'
+
 class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Project.objects.filter(owner=self.request.user)
+        queryset = Project.objects.filter(owner=self.request.user)
+        if self.action == 'list':
+            # Archived projects are listed on request only, e.g. ``?status=ARCHIVED``
+            project_status = self.request.query_params.get('status', Project.ACTIVE).upper()
+            if project_status not in (Project.ACTIVE, Project.ARCHIVED):
+                raise serializers.ValidationError({
+                    'status': f"Must be {Project.ACTIVE} or {Project.ARCHIVED}"
+                })
+            queryset = queryset.filter(status=project_status)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    def perform_destroy(self, instance):
+        # Soft delete: purge_projects removes the rows and files later
+        instance.soft_delete()
+
     @action(detail=True, methods=['GET'])
     def available_contexts(self, request, pk=None):
         """
-        Get available contexts (notes, documents, resources) for a project
+        List the notes, documents and resources of a project that can be used
+        as chat context: ids, titles, sizes and token estimates only. Content
+        is fetched separately through ``context_content``.
+        """
+        project = self.get_object()
+        return Response(list(iter_available_contexts(project)))
+
+    @action(detail=True, methods=['GET'])
+    def context_content(self, request, pk=None):
+        """
+        Fetch the content of selected contexts, e.g. ``?ids=note_1,doc_4``.
+        """
+        project = self.get_object()
+        ids = [value for value in request.query_params.get('ids', '').split(',') if value]
+        if not ids:
+            return Response(
+                {'ids': 'At least one context id is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(load_context_contents(ids, project=project))
+
+    @action(detail=True, methods=['GET'])
+    def search(self, request, pk=None):
+        """
+        Semantic search over the project's resources, documents and notes,
+        e.g. ``?q=duty of care&k=10&types=resource,doc``. Returns the best
+        matching chunks with their source and character offsets.
         """
+        from .embeddings import KINDS, search_project
+
+        project = self.get_object()
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'q': 'A search query is required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            project = self.get_object()
-            
-            # Get all notes, documents, and resources for the project
-            notes = Note.objects.filter(project=project).values('id', 'title', 'content')
-            documents = Document.objects.filter(project=project).values('id', 'title', 'content')
-            resources = Resource.objects.filter(project=project).values('id', 'title', 'content_extracted')
+            k = min(max(int(request.query_params.get('k', 10)), 1), 100)
+        except ValueError:
+            return Response({'k': 'Must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = [kind for kind in request.query_params.get('types', '').split(',') if kind]
+        if any(kind not in KINDS for kind in kinds):
+            return Response({'types': f"Must be among: {', '.join(KINDS)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Format the response
-            contexts = []
-            
-            for note in notes:
-                contexts.append({
-                    'id': f"note_{note['id']}",
-                    'type': 'NOTE',
-                    'title': note['title'],
-                    'content': note['content']
-                })
-                
-            for doc in documents:
-                contexts.append({
-                    'id': f"doc_{doc['id']}",
-                    'type': 'DOCUMENT',
-                    'title': doc['title'],
-                    'content': doc['content']
-                })
-                
-            for resource in resources:
-                contexts.append({
-                    'id': f"resource_{resource['id']}",
-                    'type': 'RESOURCE',
-                    'title': resource['title'],
-                    'content': resource['content_extracted']
-                })
+        return Response(search_project(project.pk, query, k=k, kinds=kinds))
 
-            return Response(contexts)
-            
-        except Exception as e:
+    @action(detail=True, methods=['GET'])
+    def citations(self, request, pk=None):
+        """
+        Cases, statutes and paragraphs cited in the project's resources.
+        ``?q=donoghue&kind=CASE`` lists matching citations by how often they
+        are cited; ``?key=<key>`` lists where one citation occurs.
+        """
+        from .citations import lookup, occurrences
+
+        project = self.get_object()
+        key = request.query_params.get('key', '').strip()
+        if key:
+            return Response(occurrences(project.pk, key))
+        kind = request.query_params.get('kind', '').upper() or None
+        if kind and kind not in dict(Citation.KIND_CHOICES):
             return Response(
-                {'error': str(e)},
+                {'kind': f"Must be among: {', '.join(dict(Citation.KIND_CHOICES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(lookup(project.pk, request.query_params.get('q', '').strip(), kind=kind))
+
+    @action(detail=True, methods=['GET'])
+    def export(self, request, pk=None):
+        """
+        Download the project, its rows and its files as an archive,
+        ``?archive=zip`` (default), ``tar`` or ``tar.gz``. The archive is
+        streamed as it is built.
+        """
+        from .archives import ARCHIVE_FORMATS, archive_filename, iter_export
+
+        project = self.get_object()
+        archive_format = request.query_params.get('archive', 'zip')
+        if archive_format not in ARCHIVE_FORMATS:
+            return Response(
+                {'archive': f"Must be one of: {', '.join(ARCHIVE_FORMATS)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        response = StreamingHttpResponse(
+            streaming_content(request, iter_export(project, archive_format)),
+            content_type=ARCHIVE_FORMATS[archive_format],
+        )
+        response['Content-Disposition'] = content_disposition_header(True, archive_filename(project, archive_format))
+        return response
+
+    @action(detail=False, methods=['POST'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_archive(self, request):
+        """Create a new project from an archive made by ``export``, uploaded as ``archive``"""
+        from .archives import ArchiveError, import_project
 
-class DocumentViewSet(viewsets.ModelViewSet):
+        upload = request.FILES.get('archive')
+        if not upload:
+            return Response({'archive': 'An archive file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            project = import_project(upload, request.user)
+        except ArchiveError as e:
+            return Response({'archive': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Not the full serializer: that would load everything just imported
+        return Response({'id': project.pk, 'title': project.title}, status=status.HTTP_201_CREATED)
+
+class DocumentInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The document is open for collaborative editing; change its content through the editor.'
+    default_code = 'document_in_use'
+
+
+class DocumentViewSet(ProjectScopedMixin, StreamingListMixin, ConditionalRetrieveMixin, viewsets.ModelViewSet):
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    deferred_fields = ('content',)
 
     def get_queryset(self):
-        project_id = self.request.query_params.get('project')
-        queryset = Document.objects.filter(project__owner=self.request.user)
-        if project_id:
-            queryset = queryset.filter(project_id=project_id)
-        return queryset
+        return self.scope_to_projects(Document.objects.all())
+
+    def perform_update(self, serializer):
+        from .collab import open_room_content
+
+        # The room's next save would silently overwrite changed content
+        room_content = open_room_content(serializer.instance.pk)
+        content = serializer.validated_data.get('content')
+        if room_content is not None and content is not None and content != room_content:
+            raise DocumentInUse()
+        super().perform_update(serializer)
 
     def get_serializer_context(self):
         # Pass request to serializer for additional validation
@@ -92,20 +299,9 @@ class DocumentViewSet(viewsets.ModelViewSet):
         return context
 
     def create(self, request, *args, **kwargs):
-        # Detailed logging for document creation
-        logger.info(f"Document creation request received")
-        logger.info(f"Request user: {request.user}")
-        
-        # Log raw request data
-        try:
-            request_body = json.loads(request.body.decode('utf-8'))
-            logger.info(f"Request body: {request_body}")
-        except Exception as e:
-            logger.error(f"Error parsing request body: {e}")
-            request_body = request.data
-
-        # Log request data
-        logger.info(f"Request data: {request.data}")
+        # Log sizes rather than bodies: documents can be very large
+        logger.info("Document creation request from %s", request.user)
+        logger.debug("Document creation payload: %s bytes", request.META.get('CONTENT_LENGTH'))
 
         try:
             # Validate project ownership
@@ -118,11 +314,8 @@ class DocumentViewSet(viewsets.ModelViewSet):
                     status=400
                 )
 
-            try:
-                project = Project.objects.get(id=project_id, owner=request.user)
-                logger.info(f"Project found: {project}")
-            except Project.DoesNotExist:
-                logger.error(f"Project not found or unauthorized: {project_id}")
+            if not can_access_project(request, project_id):
+                logger.error("Project not found or unauthorized: %s", project_id)
                 return Response(
                     {"project": "Invalid project or unauthorized access"}, 
                     status=403
@@ -134,16 +327,16 @@ class DocumentViewSet(viewsets.ModelViewSet):
             try:
                 # Validate serializer
                 serializer.is_valid(raise_exception=True)
-                logger.info("Serializer validation passed")
+                logger.debug("Serializer validation passed")
             except serializers.ValidationError as e:
-                logger.error(f"Validation error: {e}")
+                logger.error("Validation error: %s", e.detail)
                 return Response(e.detail, status=400)
 
             # Create the document
             self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
             
-            logger.info(f"Document created successfully: {serializer.data}")
+            logger.info("Document created successfully: id=%s, %d chars", serializer.instance.pk, len(serializer.instance.content))
             return Response(serializer.data, status=201, headers=headers)
 
         except Exception as e:
@@ -154,44 +347,31 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 status=500
             )
 
-    def perform_create(self, serializer):
-        # Validate project ownership
-        project_id = self.request.data.get('project')
-        try:
-            project = Project.objects.get(id=project_id, owner=self.request.user)
-            serializer.save(project=project)
-        except Project.DoesNotExist:
-            raise serializers.ValidationError({
-                "project": "Invalid project or unauthorized access"
-            })
-
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(ProjectScopedMixin, StreamingListMixin, ConditionalRetrieveMixin, viewsets.ModelViewSet):
     serializer_class = NoteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    deferred_fields = ('content',)
 
     def get_queryset(self):
-        project_id = self.request.query_params.get('project')
-        queryset = Note.objects.filter(project__owner=self.request.user)
-        if project_id:
-            queryset = queryset.filter(project_id=project_id)
-        return queryset
+        return self.scope_to_projects(Note.objects.all())
 
-class ResourceViewSet(viewsets.ModelViewSet):
+class ResourceViewSet(ProjectScopedMixin, StreamingListMixin, ConditionalRetrieveMixin, viewsets.ModelViewSet):
     serializer_class = ResourceSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    deferred_fields = ('content_extracted', 'summary')
+    content_fields = ('content_extracted', 'summary')
+
+    def get_validators(self, instance):
+        etag = make_etag(instance.pk, instance.updated_at, instance.last_extracted, instance.last_summarized)
+        last_modified = latest_timestamp(instance.updated_at, instance.last_extracted, instance.last_summarized)
+        return etag, last_modified
 
     def get_queryset(self):
-        project_id = self.request.query_params.get('project')
-        queryset = Resource.objects.filter(project__owner=self.request.user)
-        if project_id:
-            queryset = queryset.filter(project_id=project_id)
-        return queryset
+        return self.scope_to_projects(Resource.objects.all())
 
     def perform_create(self, serializer):
-        # Get the project and verify ownership
-        project_id = self.request.data.get('project')
-        project = Project.objects.get(id=project_id, owner=self.request.user)
+        self.check_project_access(serializer)
         
         # Get the file size from the uploaded file
         file = self.request.FILES.get('file')
@@ -201,89 +381,208 @@ class ResourceViewSet(viewsets.ModelViewSet):
             file_size = 0
 
         # Save the resource
-        resource = serializer.save(project=project, file_size=file_size)
+        resource = serializer.save(file_size=file_size)
         
-        # Extract content if it's a PDF
-        if resource.file_type == 'PDF':
+        # Extract content if there is an extractor for the file's type
+        if resource.file and is_supported(resource.file.path):
             resource.extract_content()
 
-    @action(detail=True, methods=['post'])
-    def extract(self, request, pk=None):
-        """Endpoint to manually trigger content extraction"""
-        resource = self.get_object()
-        resource.extract_content()
-        return Response({
-            'status': 'success',
-            'content_extracted': bool(resource.content_extracted),
-            'extraction_error': resource.extraction_error or None,
-            'last_extracted': resource.last_extracted
-        })
+    @action(detail=True, methods=['get'])
+    def content(self, request, pk=None):
+        """
+        Serve extracted content (or ``?field=summary``) as markdown, supporting
+        conditional requests, byte ranges and gzip/brotli compression.
+        """
+        field = request.query_params.get('field', 'content_extracted')
+        if field not in self.content_fields:
+            return Response(
+                {'field': f"Must be one of: {', '.join(self.content_fields)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-    @action(detail=True, methods=['post'])
-    def summarize(self, request, pk=None):
-        """Endpoint to manually trigger content summarization"""
-        resource = self.get_object()
-        
-        # Run the async summarization in a sync context
-        async def async_summarize():
-            await resource.summarize()
-            return {
-                'status': 'success',
-                'summary': resource.summary or None,
-                'summary_error': resource.summary_error or None,
-                'last_summarized': resource.last_summarized
-            }
-        
-        from asgiref.sync import async_to_sync
-        result = async_to_sync(async_summarize)()
-        return Response(result)
+        resource = self.get_conditional_object()
+        etag, last_modified = self.get_validators(resource)
+        etag = make_etag(etag, field)
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        payload = (getattr(resource, field) or '').encode('utf-8')
+        return content_response(request, payload, 'text/markdown; charset=utf-8', etag, last_modified)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Serve the uploaded file to its owner, with Range support"""
+        resource = self.get_conditional_object()
+        if not resource.file:
+            raise Http404('File not found')
+
+        etag = make_etag(resource.pk, resource.file.name, resource.file_size)
+        last_modified = resource.uploaded_at
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            path = local_path(resource)
+        except FileNotFoundError:
+            raise Http404('File not found')
+        return file_download_response(
+            request,
+            path,
+            os.path.basename(resource.file.name),
+            etag,
+            last_modified,
+            as_attachment=request.query_params.get('inline') is None,
+        )
+
+    @action(detail=True, methods=['get'])
+    def chunks(self, request, pk=None):
+        """
+        List a resource's chunks in order. Narrow with ``?positions=``,
+        ``?pages=`` or ``?chars=`` (``a-b`` ranges) and ``?heading=``; pass
+        ``?content=0`` for metadata only.
+        """
+        from .chunks import filter_chunks
+
+        resource = self.get_conditional_object()
+        etag, last_modified = self.get_validators(resource)
+        etag = make_etag(etag, 'chunks', request.GET.urlencode())
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        include_content = request.query_params.get('content') not in ('0', 'false')
+        queryset = resource.chunks.all()
+        if not include_content:
+            queryset = queryset.defer('content')
+        try:
+            queryset = filter_chunks(queryset, request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ChunkSerializer(queryset, many=True, include_content=include_content)
+        return set_validators(Response(serializer.data), etag, last_modified)
+
+    @action(detail=True, methods=['get'], url_path=r'pages/(?P<number>\d+)')
+    def pages(self, request, pk=None, number=None):
+        """Extract a single page on demand, without converting the whole PDF"""
+        from .pages import get_page
+        from .utils import get_file_type
+
+        resource = self.get_conditional_object()
+        if not resource.file:
+            raise Http404('File not found')
+        try:
+            file_path = local_path(resource)
+        except FileNotFoundError:
+            raise Http404('File not found')
+
+        file_type = get_file_type(file_path)
+        if not file_type.lower().startswith('application/pdf'):
+            return Response(
+                {'error': f'Unsupported file type: {file_type}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        etag = make_etag(resource.pk, resource.file.name, resource.file_size, number)
+        not_modified = conditional_response(request, etag, resource.uploaded_at)
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            content, page_count = get_page(file_path, int(number))
+        except IndexError as e:
+            raise Http404(str(e))
+        except Exception as e:
+            logger.error(f"Error extracting page {number} of resource {resource.pk}: {str(e)}")
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        response = Response({
+            'page': int(number),
+            'page_count': page_count,
+            'content': content,
+        })
+        return set_validators(response, etag, resource.uploaded_at)
 
-class ChatSessionViewSet(viewsets.ModelViewSet):
+class ChatSessionViewSet(ProjectScopedMixin, viewsets.ModelViewSet):
     serializer_class = ChatSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        project_id = self.request.query_params.get('project')
-        queryset = ChatSession.objects.filter(project__owner=self.request.user)
-        if project_id:
-            queryset = queryset.filter(project_id=project_id)
-        return queryset
+        return self.scope_to_projects(ChatSession.objects.all())
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
-class ChatContextViewSet(viewsets.ModelViewSet):
+class ChatContextViewSet(ProjectScopedMixin, viewsets.ModelViewSet):
     serializer_class = ChatContextSerializer
     permission_classes = [permissions.IsAuthenticated]
+    project_lookup = 'chat_session__project_id'
 
     def get_queryset(self):
         chat_session_id = self.request.query_params.get('chat_session')
-        queryset = ChatContext.objects.filter(chat_session__project__owner=self.request.user)
+        queryset = self.scope_to_projects(ChatContext.objects.all())
         if chat_session_id:
             queryset = queryset.filter(chat_session_id=chat_session_id)
         return queryset
 
+    def get_validated_project_id(self, serializer):
+        chat_session = serializer.validated_data.get('chat_session')
+        return chat_session.project_id if chat_session else None
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import APIException
 from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 import openai
 import logging
+import asyncio
+import hmac
+import json
 import time
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+prompt_tokens = registry.histogram(
+    'legal_writer_chat_prompt_tokens',
+    'Estimated chat prompt tokens reused across turns (prefix) and new, and those the provider served from its cache',
+    ('part',),
+    buckets=(100, 500, 1000, 5000, 10000, 25000, 50000, 100000, 200000, 500000),
+)
+
 def retry_on_rate_limit(max_retries=3, initial_delay=1):
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                delay = initial_delay
+                for attempt in range(max_retries):
+                    try:
+                        return await func(*args, **kwargs)
+                    except openai.error.RateLimitError as e:
+                        if attempt == max_retries - 1:  # Last attempt
+                            raise  # Re-raise the exception if we're out of retries
+                        logger.warning(f"Rate limit hit, attempt {attempt + 1}/{max_retries}. Waiting {delay} seconds...")
+                        await asyncio.sleep(delay)
+                        delay *= 2  # Exponential backoff
+                return await func(*args, **kwargs)  # Final attempt
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             delay = initial_delay
@@ -300,32 +599,251 @@ def retry_on_rate_limit(max_retries=3, initial_delay=1):
         return wrapper
     return decorator
 
-class ChatView(APIView):
-    permission_classes = [IsAuthenticated]
+class AsyncAPIView(View):
+    """
+    Base class for async JSON endpoints.
+
+    DRF's APIView only runs synchronously, which ties up a worker thread for
+    the whole of a slow LLM call. These views run on the event loop under
+    ASGI; the configured DRF authenticators run in a worker thread since they
+    touch the database, and handlers use the async ORM.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like APIView, CSRF is enforced by SessionAuthentication only
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def authenticate(self, request):
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        return drf_request.user
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await sync_to_async(self.authenticate)(request)
+        except APIException as e:
+            # AuthenticationFailed, or PermissionDenied on a failed CSRF check
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detail, status=e.status_code)
+        if not user or not user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        request.user = user
+
+        if request.content_type == 'application/json':
+            try:
+                request.data = json.loads(request.body or b'{}')
+            except ValueError as e:
+                return JsonResponse({'detail': f'JSON parse error - {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(request.data, dict):
+                return JsonResponse({'detail': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            request.data = request.POST
+
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get_resource(self, request, pk):
+        """Fetch a resource in one of the requesting user's projects, or None"""
+        project_ids = await sync_to_async(accessible_project_ids)(request, include_archived=True)
+        try:
+            return await Resource.objects.aget(pk=pk, project_id__in=project_ids)
+        except Resource.DoesNotExist:
+            return None
+
+def not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+class ResourceExtractView(AsyncAPIView):
+    """Report (GET) or trigger (POST) content extraction for a resource"""
+
+    def extraction_status(self, resource):
+        return {
+            'status': 'success',
+            'content_extracted': bool(resource.content_extracted),
+            'extraction_error': resource.extraction_error or None,
+            'last_extracted': resource.last_extracted
+        }
+
+    async def get(self, request, pk):
+        resource = await self.get_resource(request, pk)
+        if resource is None:
+            return not_found()
+        return JsonResponse(self.extraction_status(resource))
+
+    async def post(self, request, pk):
+        resource = await self.get_resource(request, pk)
+        if resource is None:
+            return not_found()
+        await resource.aextract_content()
+        return JsonResponse(self.extraction_status(resource))
+
+class ResourceSummarizeView(AsyncAPIView):
+    """Endpoint to manually trigger content summarization"""
+
+    async def post(self, request, pk):
+        resource = await self.get_resource(request, pk)
+        if resource is None:
+            return not_found()
+        await resource.summarize()
+        return JsonResponse({
+            'status': 'success',
+            'summary': resource.summary or None,
+            'summary_error': resource.summary_error or None,
+            'last_summarized': resource.last_summarized
+        })
+
+class ProjectBatchView(AsyncAPIView):
+    """
+    Run a Resource operation over every resource in a project, at most
+    BATCH_CONCURRENCY at a time, streaming one NDJSON progress line per
+    resource as it finishes. Resources whose content hash hasn't changed
+    are reported as skipped.
+    """
+    # Name of an async Resource method that returns whether it did any work
+    operation = None
+    # Resource field where the operation records its own failures
+    error_field = None
+
+    async def post(self, request, pk):
+        if not await sync_to_async(can_access_project)(request, pk):
+            return not_found()
+
+        # Each resource is loaded by its task, so at most BATCH_CONCURRENCY
+        # extracted texts are in memory at once
+        resource_ids = [
+            resource_id async for resource_id in
+            Resource.objects.filter(project_id=pk).order_by('pk').values_list('pk', flat=True)
+        ]
+        return StreamingHttpResponse(self.progress(resource_ids), content_type='application/x-ndjson')
+
+    async def run(self, resource_id, semaphore):
+        async with semaphore:
+            try:
+                resource = await Resource.objects.aget(pk=resource_id)
+            except Resource.DoesNotExist:
+                return resource_id, 'error', 'Resource no longer exists'
+            try:
+                changed = await getattr(resource, self.operation)()
+                return resource_id, 'done' if changed else 'skipped', getattr(resource, self.error_field) or None
+            except Exception as e:
+                logger.error(f"Batch {self.operation} failed for resource {resource_id}: {str(e)}")
+                return resource_id, 'error', str(e)
+
+    async def progress(self, resource_ids):
+        semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+        counts = {'done': 0, 'skipped': 0, 'error': 0}
+        yield json.dumps({'event': 'start', 'total': len(resource_ids)}) + '\n'
+
+        tasks = [asyncio.ensure_future(self.run(resource_id, semaphore)) for resource_id in resource_ids]
+        try:
+            for completed, task in enumerate(asyncio.as_completed(tasks), 1):
+                resource_id, state, error = await task
+                counts[state] += 1
+                yield json.dumps({
+                    'event': 'progress',
+                    'resource': resource_id,
+                    'status': state,
+                    'error': error,
+                    'completed': completed,
+                    'total': len(resource_ids),
+                }) + '\n'
+        finally:
+            # The client went away; don't keep spending LLM calls on it
+            for task in tasks:
+                task.cancel()
+
+        yield json.dumps({'event': 'complete', 'total': len(resource_ids), **counts}) + '\n'
+
+class ProjectReextractView(ProjectBatchView):
+    operation = 'aextract_if_changed'
+    error_field = 'extraction_error'
+
+class ProjectSummarizeView(ProjectBatchView):
+    operation = 'summarize_if_changed'
+    error_field = 'summary_error'
+
+class DocumentSuggestView(AsyncAPIView):
+    """
+    Stream an inline suggestion for the text before the cursor as NDJSON
+    (``delta`` lines, then ``done``, ``cancelled`` or ``error``). With
+    ``prefetch`` set, only warm the cache and return at once. Needs the
+    ASGI server (see ``core.suggestions``).
+    """
+
+    async def post(self, request, pk):
+        if not is_asgi(request):
+            return JsonResponse(
+                {'error': 'Inline suggestions are only available under ASGI'}, status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        project_ids = await sync_to_async(accessible_project_ids)(request, include_archived=True)
+        if not await Document.objects.filter(pk=pk, project_id__in=project_ids).aexists():
+            return not_found()
+
+        prefix = request.data.get('prefix')
+        suffix = request.data.get('suffix') or ''
+        if not isinstance(prefix, str) or not prefix.strip() or not isinstance(suffix, str):
+            return JsonResponse({'error': 'prefix is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not settings.OPENAI_API_KEY:
+            return JsonResponse({'error': 'OpenAI API key not configured'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        editor = suggestions.get_editor(request.user.pk, pk)
+        if request.data.get('prefetch'):
+            started = await suggestions.prefetch(editor, prefix, suffix)
+            return JsonResponse({'prefetching': started}, status=status.HTTP_202_ACCEPTED)
+        response = StreamingHttpResponse(suggestions.suggest(editor, prefix, suffix), content_type='application/x-ndjson')
+        # Lines must reach the editor as they're produced
+        response['Cache-Control'] = 'no-store'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class ChatView(AsyncAPIView):
 
     @retry_on_rate_limit(max_retries=3, initial_delay=1)
-    def _call_openai(self, messages):
-        return openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=messages,
+    async def _call_openai(self, messages):
+        # The router fails over between models; this only retries once
+        # every one of them is throttled
+        return await llm.complete(
+            'chat',
+            messages,
             temperature=0.7,
             max_tokens=2000,
             presence_penalty=0.6
         )
 
-    def post(self, request):
+    def prompt_stats(self, prefix_chars, new_chars, context_cache, usage):
+        """
+        How much of the prompt is the prefix reused across turns on the same
+        contexts, and how much is new, as estimated here and as the provider
+        reports it (``cached_tokens`` when it has prompt caching)
+        """
+        stats = {
+            'context_cache': context_cache,
+            'prefix_tokens': estimate_tokens(prefix_chars),
+            'new_tokens': estimate_tokens(new_chars),
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'cached_tokens': (usage.get('prompt_tokens_details') or {}).get('cached_tokens'),
+        }
+        for part in ('prefix_tokens', 'new_tokens', 'cached_tokens'):
+            if stats[part] is not None:
+                prompt_tokens.observe(stats[part], part=part[:-len('_tokens')])
+        return stats
+
+    async def post(self, request):
         message = request.data.get('message')
         contexts = request.data.get('contexts', [])
 
         if not message:
-            return Response(
+            return JsonResponse(
                 {'error': 'Message is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         if not settings.OPENAI_API_KEY:
             logger.error("OpenAI API key not configured")
-            return Response(
+            return JsonResponse(
                 {'error': 'OpenAI API key not configured'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
@@ -334,74 +852,101 @@ class ChatView(APIView):
             # Configure OpenAI
             openai.api_key = settings.OPENAI_API_KEY
 
-            # Format the context information for the LLM
-            context_text = ""
-            for ctx in contexts:
-                context_text += f"\nContext ({ctx['type']} - {ctx['title']}):\n{ctx['content']}\n"
-
-            # Prepare the messages for the LLM
-            messages = []
-            
-            # Add system message with context if available
-            if context_text:
-                messages.append({
-                    "role": "system",
-                    "content": f"You are a helpful legal writing assistant. Use the following context to help answer the user's questions:{context_text}"
-                })
+            # Contexts picked from available_contexts carry only an id. Their
+            # text is assembled server-side and cached per context and
+            # version, so repeated turns don't reload unchanged contexts
+            selected = [ctx['id'] for ctx in contexts if ctx.get('content') is None and ctx.get('id')]
+            inline = [ctx for ctx in contexts if ctx.get('content') is not None]
+            context_text, context_cached = '', False
+            if selected:
+                project_ids = await sync_to_async(accessible_project_ids)(request, include_archived=True)
+                with timed('context'):
+                    context_text, context_cached = await sync_to_async(assemble_contexts)(
+                        selected, project_id__in=project_ids,
+                    )
+            # Contexts sent with their content change more often, so they go
+            # after the cached ones to keep the stable part of the prompt first
+            inline_text = ''.join(format_context(ctx) for ctx in inline)
+
+            # Stable parts first (instructions, then contexts) and the new
+            # message last, so providers can reuse their cached prompt prefix
+            if context_text or inline_text:
+                system_content = f"You are a helpful legal writing assistant. Use the following context to help answer the user's questions:{context_text}{inline_text}"
             else:
-                messages.append({
-                    "role": "system",
-                    "content": "You are a helpful legal writing assistant."
-                })
+                system_content = "You are a helpful legal writing assistant."
+            messages = [
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": message},
+            ]
 
-            # Add the user's message
-            messages.append({
-                "role": "user",
-                "content": message
-            })
-
-            logger.info(f"Sending request to OpenAI with {len(messages)} messages")
+            logger.info("Sending request to OpenAI with %d messages (%d chars)", len(messages), sum(len(m['content']) for m in messages))
             
             # Call OpenAI API with retry logic
-            response = self._call_openai(messages)
-
-            logger.info("Successfully received response from OpenAI")
-            logger.info(f"Response: {response}")
+            completion = await self._call_openai(messages)
+
+            usage = completion.usage
+            prompt_stats = self.prompt_stats(
+                len(system_content) - len(inline_text),
+                len(inline_text) + len(message),
+                ('hit' if context_cached else 'miss') if selected else 'none',
+                usage,
+            )
+            logger.info("Successfully received response from OpenAI", extra={
+                'openai_response_id': completion.response_id,
+                'openai_usage': usage,
+                'llm_model': completion.model,
+                'llm_tier': completion.tier,
+                'prompt_stats': prompt_stats,
+            })
 
             # Extract the message content
-            if response and response.choices and len(response.choices) > 0:
-                message_content = response.choices[0].message.content
-                return Response({
-                    'content': message_content
+            if completion.text is not None:
+                return JsonResponse({
+                    'content': completion.text,
+                    'model': completion.model,
+                    'prompt_stats': prompt_stats,
                 })
             else:
                 logger.error("Invalid response format from OpenAI")
-                return Response(
+                return JsonResponse(
                     {'error': 'Invalid response from OpenAI'},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
         except openai.error.RateLimitError as e:
             logger.warning(f"OpenAI rate limit exceeded after retries: {str(e)}")
-            return Response(
+            return JsonResponse(
                 {'error': 'Our AI service is currently experiencing high demand. Please try again in a few minutes.'},
                 status=status.HTTP_429_TOO_MANY_REQUESTS
             )
         except openai.error.AuthenticationError as e:
             logger.error(f"OpenAI authentication error: {str(e)}")
-            return Response(
+            return JsonResponse(
                 {'error': 'Failed to authenticate with AI service'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         except openai.error.APIError as e:
             logger.error(f"OpenAI API error: {str(e)}")
-            return Response(
+            return JsonResponse(
                 {'error': 'AI service error occurred'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         except Exception as e:
             logger.error(f"Unexpected error in chat endpoint: {str(e)}")
-            return Response(
+            return JsonResponse(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+def has_metrics_token(request):
+    if not settings.METRICS_TOKEN:
+        return False
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), settings.METRICS_TOKEN.encode())
+
+def metrics_view(request):
+    """Expose request metrics in the Prometheus text format"""
+    if not (request.user.is_staff or has_metrics_token(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')